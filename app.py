@@ -1,11 +1,33 @@
 import os
-import shutil
-import subprocess
-import tempfile
-import base64
 from pathlib import Path
 import streamlit as st
 
+from music_tools.batch import describe_status, format_duration, get_batch_status, submit_batch
+from music_tools.cache import get_download_cache, get_separation_cache
+from music_tools.formats import TranscodeError, get_format, get_transcode, output_name
+from music_tools.jobs import JobStore
+from music_tools.media_server import (
+    get_media_server,
+    get_player_mode,
+    get_public_media_url,
+    media_server_needed,
+)
+from music_tools.metrics import get_stage_totals
+from music_tools.mixdown import MIX_DIR, MixError, mix_base_name, preset_gains, render_mix
+from music_tools.pipeline import validate_and_create_path
+from music_tools.separation import AUTO_MODEL, MODELS, get_default_model
+from music_tools.player import (
+    audio_mime_type,
+    create_download_links_html,
+    encode_file_data_uri,
+    encode_peaks_json,
+    file_cache_key,
+    player_height,
+    render_player_html,
+)
+from music_tools.uploads import create_upload_dir, spool_upload
+from music_tools.worker import ensure_worker_running
+
 # ─── Page Configuration ─────────────────────────────────────────────
 st.set_page_config(
     page_title="Music Tools Suite", 
@@ -95,704 +117,352 @@ footer {visibility: hidden;}
 
 # ─── Helper Functions ─────────────────────────────────────────────
 
-def download_audio(youtube_url: str, output_dir: str) -> str:
-    """Download YouTube audio and convert to MP3"""
-    output_template = os.path.join(output_dir, "%(title)s.%(ext)s")
-    cmd = [
-        "yt-dlp", "-x", "--audio-format", "mp3", "--audio-quality", "0",
-        "-o", output_template, youtube_url
-    ]
-    subprocess.run(cmd, check=True)
-    
-    for fname in os.listdir(output_dir):
-        if fname.endswith(".mp3"):
-            return os.path.join(output_dir, fname)
-    raise FileNotFoundError("MP3 not found after download")
-
-def separate_stems(input_audio_path: str, output_dir: str) -> str:
-    """Separate audio into stems using Demucs"""
-    cmd = ["demucs", "--out", output_dir, input_audio_path]
-    subprocess.run(cmd, check=True)
-    
-    # Find the stems folder in Demucs output structure
-    for item in os.listdir(output_dir):
-        full_path = os.path.join(output_dir, item)
-        if os.path.isdir(full_path):
-            for song_item in os.listdir(full_path):
-                song_path = os.path.join(full_path, song_item)
-                if os.path.isdir(song_path):
-                    wav_files = [f for f in os.listdir(song_path) if f.endswith('.wav')]
-                    if wav_files:
-                        return song_path
-    raise FileNotFoundError("Stems not found in expected structure")
-
-def convert_stems_to_mp3(stems_folder: str, output_dir: str, base_name: str) -> list[str]:
-    """Convert WAV stems to MP3"""
-    mp3_files = []
-    wav_files = [f for f in os.listdir(stems_folder) if f.endswith('.wav')]
-    
-    for file in wav_files:
-        wav_path = os.path.join(stems_folder, file)
-        stem_name = os.path.splitext(file)[0]
-        mp3_filename = f"{base_name}_{stem_name}.mp3"
-        mp3_path = os.path.join(output_dir, mp3_filename)
-        
-        cmd = ["ffmpeg", "-i", wav_path, "-acodec", "libmp3lame", "-b:a", "320k", "-y", mp3_path]
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            if os.path.exists(mp3_path):
-                mp3_files.append(mp3_path)
-        except subprocess.CalledProcessError:
-            continue
-    return mp3_files
-
-def validate_and_create_path(path_str: str) -> tuple[bool, str]:
-    """Validate and create directory if needed"""
-    try:
-        path = Path(path_str)
-        if not path.exists():
-            path.mkdir(parents=True, exist_ok=True)
-            return True, f"Created directory: {path}"
-        elif not path.is_dir():
-            return False, f"Path exists but is not a directory: {path}"
-        else:
-            return True, f"Using existing directory: {path}"
-    except Exception as e:
-        return False, f"Error with path: {e}"
-
-def get_stem_icon(stem_name):
-    """Get appropriate icon for stem type"""
-    stem_name_lower = stem_name.lower()
-    if 'vocal' in stem_name_lower:
-        return "🎤"
-    elif 'drum' in stem_name_lower:
-        return "🥁"
-    elif 'bass' in stem_name_lower:
-        return "🎸"
-    elif 'other' in stem_name_lower:
-        return "🎵"
+JOB_STATUS_ICONS = {
+    "queued": "🕒",
+    "running": "⚙️",
+    "done": "✅",
+    "failed": "❌",
+    "cancelled": "🚫",
+}
+
+@st.cache_resource
+def get_job_store():
+    """Job queue shared by every session of this app"""
+    return JobStore()
+
+def track_job(job_id):
+    """Remember a job in this session and in the URL so it survives reloads"""
+    st.session_state.job_ids.append(job_id)
+    st.query_params["jobs"] = ",".join(st.session_state.job_ids)
+
+def untrack_job(job_id):
+    """Stop showing a job in this session"""
+    st.session_state.job_ids.remove(job_id)
+    if st.session_state.job_ids:
+        st.query_params["jobs"] = ",".join(st.session_state.job_ids)
     else:
-        return "🎶"
-
-def create_audio_player_html(stems_data):
-    """Create HTML audio player with synchronized playback"""
-    audio_elements = []
-    for i, (name, b64_data) in enumerate(stems_data.items()):
-        audio_elements.append(f"""
-            <audio id="audio_{i}" preload="auto">
-                <source src="data:audio/mpeg;base64,{b64_data}" type="audio/mpeg">
-            </audio>
-        """)
+        del st.query_params["jobs"]
+
+def submit_job(kind, params):
+    """Queue a job for the background worker"""
+    store = get_job_store()
+    ensure_worker_running(store)
+    job_id = store.submit(kind, params)
+    track_job(job_id)
+    return job_id
+
+def apply_job_result(job):
+    """Copy a finished job's output into the session, once"""
+    if job.id in st.session_state.applied_jobs or job.status != "done":
+        return False
+    st.session_state.applied_jobs.add(job.id)
+    if job.kind == "download":
+        st.session_state.downloaded_mp3 = job.result["mp3_path"]
+    elif job.kind == "separate":
+        st.session_state.separated_stems = job.result["stems"]
+    return True
+
+def job_label(job):
+    if job.kind == "download":
+        return job.params["url"]
+    return os.path.basename(job.params["input_path"])
+
+# Download formats offered next to the original files; converted on first request
+DOWNLOAD_FORMATS = {
+    "Original": None,
+    "MP3": "mp3",
+    "FLAC (lossless)": "flac",
+    "Opus (smallest)": "opus",
+    "AAC (.m4a)": "aac",
+}
+
+def model_selector(key):
+    """Separation model picker showing each model's cost; returns a model name or auto"""
+    options = [AUTO_MODEL, *MODELS]
+    choice = st.selectbox(
+        "Separation model", options, index=options.index(get_default_model()), key=key,
+        format_func=lambda name: "Auto" if name == AUTO_MODEL else MODELS[name].label,
+    )
+    if choice == AUTO_MODEL:
+        st.caption("Fine-tuned quality when the machine has room, the fast model while the queue "
+                   "is busy or few CPUs are available")
+    else:
+        profile = MODELS[choice]
+        st.caption(f"{profile.description} · {len(profile.sources)} stems · estimated "
+                   f"~{profile.cost:g}× the CPU time of htdemucs and ~{profile.memory_mb / 1024:.1f} GB RAM "
+                   "(unmeasured)")
+    return choice
+
+# Two-stem modes keep one stem plus everything else mixed into its accompaniment
+STEM_MODES = {
+    "All stems": None,
+    "Vocals + accompaniment (karaoke)": "vocals",
+    "Drums + everything else": "drums",
+    "Bass + everything else": "bass",
+}
+
+def stem_mode_selector(key):
+    """Which stems a separation keeps; returns None for all of them or the stem to split off"""
+    choice = st.selectbox("Stems", list(STEM_MODES), key=key)
+    if STEM_MODES[choice]:
+        st.caption("Only two stems are encoded and saved, so conversion takes about half as long "
+                   "and the stems use about half the disk space")
+    return STEM_MODES[choice]
+
+def render_download_buttons(files, zip_name=None, key="download"):
+    """Download buttons that read files from disk only when clicked"""
+    files = [path for path in files if os.path.exists(path)]
+    if not files:
+        return
+    choice = st.selectbox("Format", list(DOWNLOAD_FORMATS), key=f"{key}_format")
+    fmt = get_format(DOWNLOAD_FORMATS[choice]) if DOWNLOAD_FORMATS[choice] else None
+    if get_player_mode() == "inline":
+        # Media server not exposed to the browser: let Streamlit host the files
+        cols = st.columns(min(len(files), 4))
+        for i, path in enumerate(files):
+            file_name = output_name(path, fmt) if fmt else os.path.basename(path)
+            try:
+                data_path = get_transcode(path, fmt) if fmt else path
+            except TranscodeError as e:
+                st.error(f"❌ Could not convert `{os.path.basename(path)}`: {e}")
+                continue
+            with cols[i % len(cols)], open(data_path, "rb") as f:
+                st.download_button(
+                    f"📁 {file_name}",
+                    data=f,
+                    file_name=file_name,
+                    mime=fmt.content_type if fmt else audio_mime_type(path),
+                    key=f"{key}_{i}"
+                )
+        return
     
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-                         .player-container {{
-                 font-family: Arial, sans-serif;
-                 background: #1e1e1e;
-                 padding: 20px;
-                 border-radius: 10px;
-                 color: white;
-                 outline: none;
-                 border: 2px solid transparent;
-                 transition: border-color 0.3s ease;
-             }}
-             .player-container:focus {{
-                 border-color: #4CAF50;
-                 box-shadow: 0 0 15px rgba(76, 175, 80, 0.3);
-             }}
-             .keyboard-hint {{
-                 position: absolute;
-                 top: 10px;
-                 right: 10px;
-                 background: rgba(76, 175, 80, 0.8);
-                 color: white;
-                 padding: 5px 10px;
-                 border-radius: 15px;
-                 font-size: 12px;
-                 opacity: 0;
-                 transition: opacity 0.3s ease;
-             }}
-             .player-container:focus .keyboard-hint {{
-                 opacity: 1;
-             }}
-            .master-controls {{
-                text-align: center;
-                margin-bottom: 30px;
-                padding: 20px;
-                background: #2d2d2d;
-                border-radius: 8px;
-            }}
-            .master-controls button {{
-                background: #4CAF50;
-                color: white;
-                border: none;
-                padding: 10px 20px;
-                margin: 0 5px;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 16px;
-            }}
-            .master-controls button:hover {{ background: #45a049; }}
-            .master-controls button.stop {{ background: #f44336; }}
-            .master-controls button.stop:hover {{ background: #da190b; }}
-            .stems-container {{
-                display: flex;
-                flex-direction: column;
-                gap: 15px;
-                margin-top: 20px;
-            }}
-            .stem-control {{
-                background: #2d2d2d;
-                padding: 20px;
-                border-radius: 12px;
-                border: 2px solid #444;
-                display: flex;
-                align-items: center;
-                gap: 20px;
-                transition: border-color 0.3s ease;
-            }}
-            .stem-control:hover {{ border-color: #4CAF50; }}
-            .stem-icon {{
-                font-size: 32px;
-                min-width: 50px;
-                text-align: center;
-            }}
-            .stem-info {{
-                flex: 1;
-                min-width: 0;
-            }}
-            .stem-name {{
-                font-weight: bold;
-                margin-bottom: 8px;
-                color: #4CAF50;
-                font-size: 18px;
-            }}
-            .stem-controls {{
-                display: flex;
-                flex-direction: column;
-                gap: 12px;
-                min-width: 250px;
-            }}
-            .control-row {{
-                display: flex;
-                align-items: center;
-                gap: 10px;
-            }}
-            .control-label {{
-                width: 70px;
-                font-size: 13px;
-                color: #ccc;
-                font-weight: 500;
-            }}
-            input[type="range"] {{
-                flex: 1;
-                height: 6px;
-                -webkit-appearance: none;
-                background: #444;
-                border-radius: 3px;
-                outline: none;
-            }}
-            input[type="range"]::-webkit-slider-thumb {{
-                -webkit-appearance: none;
-                width: 18px;
-                height: 18px;
-                background: #4CAF50;
-                border-radius: 50%;
-                cursor: pointer;
-            }}
-            .volume-value {{
-                min-width: 50px;
-                text-align: right;
-                font-size: 13px;
-                color: #4CAF50;
-                font-weight: 500;
-            }}
-            .control-buttons {{
-                display: flex;
-                gap: 10px;
-                margin: 8px 0 0 0;
-            }}
-            .control-buttons button {{
-                flex: 1;
-                padding: 8px 12px;
-                border: none;
-                border-radius: 6px;
-                cursor: pointer;
-                font-size: 13px;
-                font-weight: 500;
-                transition: all 0.2s ease;
-            }}
-            .mute-btn {{ background: #ff9800; color: white; }}
-            .mute-btn.active {{ background: #f44336; }}
-            .solo-btn {{ background: #2196F3; color: white; }}
-            .solo-btn.active {{ background: #4CAF50; }}
-            .time-display {{
-                text-align: center;
-                margin: 15px 0;
-                font-family: monospace;
-                font-size: 18px;
-                color: #4CAF50;
-            }}
-            .progress-bar {{
-                width: 100%;
-                height: 8px;
-                background: #444;
-                border-radius: 4px;
-                overflow: hidden;
-                margin: 10px 0;
-                cursor: pointer;
-            }}
-                         .progress-fill {{
-                 height: 100%;
-                 background: #4CAF50;
-                 width: 0%;
-                 transition: width 0.1s;
-             }}
-             .stem-progress {{
-                 margin-top: 8px;
-             }}
-             .progress-bar-small {{
-                 width: 100%;
-                 height: 4px;
-                 background: #444;
-                 border-radius: 2px;
-                 overflow: hidden;
-             }}
-             .progress-fill-small {{
-                 height: 100%;
-                 background: #4CAF50;
-                 width: 0%;
-                 transition: width 0.1s;
-             }}
-             .fullscreen-btn {{
-                 background: #9C27B0;
-                 color: white;
-                 margin-left: 10px;
-             }}
-             .fullscreen-btn:hover {{
-                 background: #7B1FA2;
-             }}
-        </style>
-    </head>
-    <body>
-                 <div class="player-container" tabindex="0">
-             <div class="keyboard-hint">⌨️ Keyboard controls active</div>
-             {''.join(audio_elements)}
-            
-            <div class="master-controls">
-                <h3>Master Controls</h3>
-                <button onclick="playAll()">▶️ Play</button>
-                <button onclick="pauseAll()">⏸️ Pause</button>
-                <button onclick="stopAll()" class="stop">⏹️ Stop</button>
-                <button onclick="toggleFullscreen()" class="fullscreen-btn">🔳 Fullscreen</button>
-                
-                <div class="control-row" style="max-width: 350px; margin: 15px auto; gap: 15px;">
-                    <span class="control-label" style="width: 80px;">Master:</span>
-                    <input type="range" id="masterVolume" min="0" max="100" value="100" 
-                           oninput="setMasterVolume(this.value)">
-                    <span class="volume-value" id="masterVolumeValue">100%</span>
-                </div>
-                
-                <div class="time-display">
-                    <span id="currentTime">00:00</span> / <span id="totalTime">00:00</span>
-                </div>
-                
-                <div class="progress-bar" onclick="seekTo(event)">
-                    <div class="progress-fill" id="progressFill"></div>
-                </div>
-            </div>
-            
-            <div class="stems-container">
-    """
+    media_server = get_media_server()
+    format_query = f"format={fmt.spec}" if fmt else ""
+    links = [(f"📁 {output_name(path, fmt) if fmt else os.path.basename(path)}",
+              f"{media_server.register(path)}?download=1&{format_query}".rstrip("&"))
+             for path in files]
+    if zip_name and len(files) > 1:
+        zip_url = media_server.register_bundle(files, zip_name)
+        links.append(("📦 Download all (ZIP)", f"{zip_url}?{format_query}" if fmt else zip_url))
+    rows = (len(links) + 2) // 3
+    st.components.v1.html(
+        create_download_links_html(links, media_server.port, get_public_media_url()),
+        height=rows * 48 + 8,
+    )
+
+def render_job_result(job):
+    """Show output files and download buttons for a finished job"""
+    if job.kind == "download":
+        mp3_path = job.result["mp3_path"]
+        st.success(f"✅ MP3 saved: `{mp3_path}`")
+        render_download_buttons([mp3_path], key=f"download_{job.id}")
+        render_timings(job.result.get("timings"))
+    elif job.kind == "separate":
+        stem_mp3_files = job.result["stems"]
+        for stem_name, error in job.result.get("failures", {}).items():
+            st.error(f"❌ Could not convert `{stem_name}`: {error}")
+        st.success(f"✅ {len(stem_mp3_files)} stem files saved to: `{job.result['save_dir']}`")
+        if job.result.get("model"):
+            st.caption(f"Separated with `{job.result['model']}`")
+        
+        # Show individual stem files
+        for stem_file in stem_mp3_files:
+            st.success(f"   • {os.path.basename(stem_file)}")
+        
+        # Provide download buttons
+        st.subheader("Download Individual Stems")
+        base_name = os.path.splitext(os.path.basename(job.params["input_path"]))[0]
+        render_download_buttons(stem_mp3_files, zip_name=f"{base_name}_stems.zip",
+                                key=f"stem_download_{job.id}")
+        render_timings(job.result.get("timings"))
+
+@st.fragment(run_every="2s")
+def jobs_panel(kind):
+    """Poll and display this session's jobs of one kind"""
+    store = get_job_store()
+    jobs = [job for job in store.get_many(st.session_state.job_ids) if job.kind == kind]
+    if not jobs:
+        return
     
-    for i, name in enumerate(stems_data.keys()):
-        icon = get_stem_icon(name)
-        clean_name = name.replace('_', ' ').title()
-        html_content += f"""
-                <div class="stem-control">
-                    <div class="stem-icon">{icon}</div>
-                    <div class="stem-info">
-                        <div class="stem-name">{clean_name}</div>
-                    </div>
-                    <div class="stem-controls">
-                        <div class="control-row">
-                            <span class="control-label">Volume:</span>
-                            <input type="range" id="volume_{i}" min="0" max="100" value="100" 
-                                   oninput="setStemVolume({i}, this.value)">
-                            <span class="volume-value" id="volumeValue_{i}">100%</span>
-                        </div>
-                        <div class="control-buttons">
-                            <button class="mute-btn" id="muteBtn_{i}" onclick="toggleMute({i})">
-                                🔇 Mute
-                            </button>
-                            <button class="solo-btn" id="soloBtn_{i}" onclick="toggleSolo({i})">
-                                🎯 Solo
-                            </button>
-                        </div>
-                        <div class="stem-progress">
-                            <div class="progress-bar-small">
-                                <div class="progress-fill-small" id="stemProgress_{i}"></div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-        """
+    if any(not job.finished for job in jobs):
+        ensure_worker_running(store)
     
-        html_content += f"""
-            </div>
-        </div>
+    for job in jobs:
+        if apply_job_result(job):
+            st.rerun()  # refresh the rest of the page with the new output
         
-        <script>
-            const audioElements = [{', '.join([f'document.getElementById("audio_{i}")' for i in range(len(stems_data))])}];
-            let isPlaying = false;
-            let soloedTrack = -1;
-            const mutedTracks = new Set();
-            
-            audioElements.forEach((audio, i) => {{
-                audio.addEventListener('loadedmetadata', () => {{
-                    if (i === 0) updateTimeDisplay();
-                }});
-                audio.addEventListener('timeupdate', () => {{
-                    updateStemProgress(i);
-                    if (i === 0) {{
-                        updateTimeDisplay();
-                        updateProgressBar();
-                    }}
-                }});
-            }});
-            
-            function playAll() {{
-                const currentTime = audioElements[0].currentTime;
-                audioElements.forEach(audio => {{
-                    audio.currentTime = currentTime;
-                    audio.play();
-                }});
-                isPlaying = true;
-            }}
-            
-            function pauseAll() {{
-                audioElements.forEach(audio => audio.pause());
-                isPlaying = false;
-            }}
-            
-            function stopAll() {{
-                audioElements.forEach(audio => {{
-                    audio.pause();
-                    audio.currentTime = 0;
-                }});
-                isPlaying = false;
-                updateTimeDisplay();
-                updateProgressBar();
-            }}
-            
-            function setMasterVolume(value) {{
-                const volume = value / 100;
-                audioElements.forEach((audio, i) => {{
-                    if (!mutedTracks.has(i) && (soloedTrack === -1 || soloedTrack === i)) {{
-                        const stemVolume = document.getElementById(`volume_${{i}}`).value / 100;
-                        audio.volume = volume * stemVolume;
-                    }}
-                }});
-                document.getElementById('masterVolumeValue').textContent = value + '%';
-            }}
-            
-            function setStemVolume(index, value) {{
-                const volume = value / 100;
-                const masterVolume = document.getElementById('masterVolume').value / 100;
-                if (!mutedTracks.has(index) && (soloedTrack === -1 || soloedTrack === index)) {{
-                    audioElements[index].volume = volume * masterVolume;
-                }}
-                document.getElementById(`volumeValue_${{index}}`).textContent = value + '%';
-            }}
-            
-            function toggleMute(index) {{
-                const btn = document.getElementById(`muteBtn_${{index}}`);
-                if (mutedTracks.has(index)) {{
-                    mutedTracks.delete(index);
-                    btn.classList.remove('active');
-                    btn.textContent = '🔇 Mute';
-                    if (soloedTrack === -1 || soloedTrack === index) {{
-                        const stemVolume = document.getElementById(`volume_${{index}}`).value / 100;
-                        const masterVolume = document.getElementById('masterVolume').value / 100;
-                        audioElements[index].volume = stemVolume * masterVolume;
-                    }}
-                }} else {{
-                    mutedTracks.add(index);
-                    btn.classList.add('active');
-                    btn.textContent = '🔊 Unmute';
-                    audioElements[index].volume = 0;
-                }}
-            }}
-            
-            function toggleSolo(index) {{
-                const btn = document.getElementById(`soloBtn_${{index}}`);
-                if (soloedTrack === index) {{
-                    soloedTrack = -1;
-                    btn.classList.remove('active');
-                    btn.textContent = '🎯 Solo';
-                    audioElements.forEach((audio, i) => {{
-                        if (!mutedTracks.has(i)) {{
-                            const stemVolume = document.getElementById(`volume_${{i}}`).value / 100;
-                            const masterVolume = document.getElementById('masterVolume').value / 100;
-                            audio.volume = stemVolume * masterVolume;
-                        }}
-                    }});
-                }} else {{
-                    if (soloedTrack !== -1) {{
-                        const prevBtn = document.getElementById(`soloBtn_${{soloedTrack}}`);
-                        prevBtn.classList.remove('active');
-                        prevBtn.textContent = '🎯 Solo';
-                    }}
-                    soloedTrack = index;
-                    btn.classList.add('active');
-                    btn.textContent = '🔇 Unsolo';
-                    audioElements.forEach((audio, i) => {{
-                        if (i === index && !mutedTracks.has(i)) {{
-                            const stemVolume = document.getElementById(`volume_${{i}}`).value / 100;
-                            const masterVolume = document.getElementById('masterVolume').value / 100;
-                            audio.volume = stemVolume * masterVolume;
-                        }} else {{
-                            audio.volume = 0;
-                        }}
-                    }});
-                }}
-            }}
-            
-            function updateTimeDisplay() {{
-                if (audioElements[0]) {{
-                    const current = audioElements[0].currentTime;
-                    const total = audioElements[0].duration || 0;
-                    document.getElementById('currentTime').textContent = formatTime(current);
-                    document.getElementById('totalTime').textContent = formatTime(total);
-                }}
-            }}
-            
-            function updateProgressBar() {{
-                if (audioElements[0]) {{
-                    const current = audioElements[0].currentTime;
-                    const total = audioElements[0].duration || 0;
-                    const progress = total > 0 ? (current / total) * 100 : 0;
-                    document.getElementById('progressFill').style.width = progress + '%';
-                }}
-            }}
-            
-            function updateStemProgress(index) {{
-                if (audioElements[index]) {{
-                    const current = audioElements[index].currentTime;
-                    const total = audioElements[index].duration || 0;
-                    const progress = total > 0 ? (current / total) * 100 : 0;
-                    const progressElement = document.getElementById(`stemProgress_${{index}}`);
-                    if (progressElement) {{
-                        progressElement.style.width = progress + '%';
-                    }}
-                }}
-            }}
-            
-            function seekTo(event) {{
-                if (audioElements[0] && audioElements[0].duration) {{
-                    const progressBar = event.currentTarget;
-                    const rect = progressBar.getBoundingClientRect();
-                    const clickX = event.clientX - rect.left;
-                    const percentage = clickX / rect.width;
-                    const newTime = percentage * audioElements[0].duration;
-                    audioElements.forEach(audio => {{
-                        audio.currentTime = newTime;
-                    }});
-                }}
-            }}
-            
-            function formatTime(seconds) {{
-                const mins = Math.floor(seconds / 60);
-                const secs = Math.floor(seconds % 60);
-                return `${{mins.toString().padStart(2, '0')}}:${{secs.toString().padStart(2, '0')}}`;
-            }}
-            
-            function toggleFullscreen() {{
-                const container = document.querySelector('.player-container');
-                if (!document.fullscreenElement) {{
-                    container.requestFullscreen().catch(err => {{
-                        console.log('Error attempting to enable fullscreen:', err);
-                    }});
-                }} else {{
-                    document.exitFullscreen();
-                }}
-            }}
-            
-            // Handle fullscreen changes
-            document.addEventListener('fullscreenchange', () => {{
-                const container = document.querySelector('.player-container');
-                if (document.fullscreenElement) {{
-                    container.style.padding = '40px';
-                    container.style.height = '100vh';
-                    container.style.overflowY = 'auto';
-                }} else {{
-                    container.style.padding = '20px';
-                    container.style.height = 'auto';
-                    container.style.overflowY = 'visible';
-                }}
-            }});
-            
-            // Keyboard Controls
-            document.addEventListener('keydown', (event) => {{
-                const key = event.key.toLowerCase();
-                const ctrlKey = event.ctrlKey || event.metaKey;
-                
-                // Don't interfere if user is typing in an input field
-                if (event.target.tagName === 'INPUT' || event.target.tagName === 'TEXTAREA') {{
-                    return;
-                }}
-                
-                switch(key) {{
-                    case ' ':
-                    case 'spacebar':
-                        event.preventDefault();
-                        if (isPlaying) {{
-                            pauseAll();
-                        }} else {{
-                            playAll();
-                        }}
-                        break;
-                        
-                    case 's':
-                    case 'escape':
-                        event.preventDefault();
-                        stopAll();
-                        break;
-                        
-                    case 'f':
-                        if (!ctrlKey) {{
-                            event.preventDefault();
-                            toggleFullscreen();
-                        }}
-                        break;
-                        
-                    case 'arrowleft':
-                        event.preventDefault();
-                        seekRelative(-10);
-                        break;
-                        
-                    case 'arrowright':
-                        event.preventDefault();
-                        seekRelative(10);
-                        break;
-                        
-                    case 'arrowup':
-                        event.preventDefault();
-                        adjustMasterVolume(5);
-                        break;
-                        
-                    case 'arrowdown':
-                        event.preventDefault();
-                        adjustMasterVolume(-5);
-                        break;
-                        
-                    case 'm':
-                        event.preventDefault();
-                        toggleMasterMute();
-                        break;
-                        
-                    case '1':
-                    case '2':
-                    case '3':
-                    case '4':
-                    case '5':
-                    case '6':
-                    case '7':
-                    case '8':
-                    case '9':
-                        event.preventDefault();
-                        const stemIndex = parseInt(key) - 1;
-                        if (stemIndex < audioElements.length) {{
-                            toggleSolo(stemIndex);
-                        }}
-                        break;
-                        
-                    case '!':
-                    case '@':
-                    case '#':
-                    case '$':
-                    case '%':
-                    case '^':
-                    case '&':
-                    case '*':
-                    case '(':
-                        event.preventDefault();
-                        const shiftKeys = {{'!': 0, '@': 1, '#': 2, '$': 3, '%': 4, '^': 5, '&': 6, '*': 7, '(': 8}};
-                        const muteIndex = shiftKeys[key];
-                        if (muteIndex < audioElements.length) {{
-                            toggleMute(muteIndex);
-                        }}
-                        break;
-                }}
-            }});
-            
-            // Helper functions for keyboard controls
-            function seekRelative(seconds) {{
-                if (audioElements[0] && audioElements[0].duration) {{
-                    const newTime = Math.max(0, Math.min(audioElements[0].duration, audioElements[0].currentTime + seconds));
-                    audioElements.forEach(audio => {{
-                        audio.currentTime = newTime;
-                    }});
-                }}
-            }}
-            
-            function adjustMasterVolume(delta) {{
-                const masterVolumeSlider = document.getElementById('masterVolume');
-                const currentValue = parseInt(masterVolumeSlider.value);
-                const newValue = Math.max(0, Math.min(100, currentValue + delta));
-                masterVolumeSlider.value = newValue;
-                setMasterVolume(newValue);
-            }}
-            
-            let masterMuted = false;
-            let previousMasterVolume = 100;
-            
-            function toggleMasterMute() {{
-                const masterVolumeSlider = document.getElementById('masterVolume');
-                
-                if (masterMuted) {{
-                    masterVolumeSlider.value = previousMasterVolume;
-                    setMasterVolume(previousMasterVolume);
-                    masterMuted = false;
-                }} else {{
-                    previousMasterVolume = masterVolumeSlider.value;
-                    masterVolumeSlider.value = 0;
-                    setMasterVolume(0);
-                    masterMuted = true;
-                }}
-            }}
-            
-            // Initialize player focus
-            const playerContainer = document.querySelector('.player-container');
-            
-            setTimeout(() => {{
-                playerContainer.focus();
-            }}, 100);
-            
-            playerContainer.addEventListener('click', () => {{
-                playerContainer.focus();
-            }});
-            
-            setTimeout(() => {{
-                playerContainer.style.borderColor = '#4CAF50';
-                setTimeout(() => {{
-                    if (document.activeElement !== playerContainer) {{
-                        playerContainer.style.borderColor = 'transparent';
-                    }}
-                }}, 3000);
-            }}, 500);
+        icon = JOB_STATUS_ICONS.get(job.status, "⏳")
+        with st.container(border=True):
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"{icon} **{job_label(job)}** · `{job.id}`")
+            with col2:
+                if not job.finished:
+                    if st.button("✖️ Cancel", key=f"cancel_{job.id}", disabled=job.cancel_requested):
+                        store.request_cancel(job.id)
+                        st.rerun(scope="fragment")
+                elif st.button("🗑️ Dismiss", key=f"dismiss_{job.id}"):
+                    untrack_job(job.id)
+                    st.rerun(scope="fragment")
             
-            updateTimeDisplay();
-        </script>
-    </body>
-    </html>
-    """
-    return html_content
+            if job.status == "done":
+                render_job_result(job)
+            elif job.status == "failed":
+                st.error(job.error)
+            elif job.status == "cancelled":
+                st.warning("Job cancelled.")
+            else:
+                st.progress(job.progress, text=job.message)
+
+def track_batch(batch_id):
+    """Remember a batch in this session and in the URL so it survives reloads"""
+    st.session_state.batch_ids.append(batch_id)
+    st.query_params["batches"] = ",".join(st.session_state.batch_ids)
+
+def untrack_batch(batch_id):
+    st.session_state.batch_ids.remove(batch_id)
+    if st.session_state.batch_ids:
+        st.query_params["batches"] = ",".join(st.session_state.batch_ids)
+    else:
+        del st.query_params["batches"]
+
+@st.fragment(run_every="2s")
+def batches_panel():
+    """Poll and display aggregate progress of this session's batches"""
+    store = get_job_store()
+    for batch_id in list(st.session_state.batch_ids):
+        status = get_batch_status(store, batch_id)
+        if status is None:
+            continue
+        if not status.finished:
+            ensure_worker_running(store)
+        with st.container(border=True):
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"📦 **Batch** · `{batch_id}` · {status.total} tracks")
+            with col2:
+                if not status.finished:
+                    if st.button("✖️ Cancel", key=f"cancel_batch_{batch_id}"):
+                        store.cancel_batch(batch_id)
+                        st.rerun(scope="fragment")
+                elif st.button("🗑️ Dismiss", key=f"dismiss_batch_{batch_id}"):
+                    untrack_batch(batch_id)
+                    st.rerun(scope="fragment")
+            st.progress(status.progress, text=describe_status(status))
+            if status.finished:
+                st.caption(f"Finished in {format_duration(status.elapsed)}")
+            for job in store.list_jobs(("failed",), batch_id=batch_id):
+                st.error(f"{job_label(job)}: {job.error}")
+
+def render_timings(timings):
+    """Collapsible per-stage breakdown of where a job spent its time"""
+    if not timings:
+        return
+    with st.expander("⏱️ Stage Timings", expanded=False):
+        rows = [{
+            "Stage": "\u2003" * t["depth"] + ("└ " if t["depth"] else "") + t["name"],
+            "Wall (s)": round(t["wall"], 2),
+            "CPU (s)": round(t["cpu"], 2),
+            "Peak RSS (MB)": round(t["peak_rss"] / 1024 / 1024),
+            "Read (MB)": round(t["read_bytes"] / 1024 / 1024, 1),
+            "Written (MB)": round(t["write_bytes"] / 1024 / 1024, 1),
+            "": "✅" if t["ok"] else "❌",
+        } for t in sorted(timings, key=lambda t: t["started"])]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+def render_stage_totals():
+    """Totals per pipeline stage across all runs, as exported on /metrics"""
+    totals = get_stage_totals()
+    if not totals:
+        return
+    with st.expander("⏱️ Pipeline Stage Totals", expanded=False):
+        st.dataframe([{
+            "Stage": row["name"],
+            "Runs": row["runs"],
+            "Failures": row["failures"],
+            "Avg wall (s)": round(row["wall"] / row["runs"], 2),
+            "Avg CPU (s)": round(row["cpu"] / row["runs"], 2),
+            "Max RSS (MB)": round(row["peak_rss"] / 1024 / 1024),
+        } for row in totals], hide_index=True, use_container_width=True)
+        st.caption("Prometheus metrics: `/metrics` on the media server port")
+
+# Practice mixes offered by the export panel; "Custom" starts with every stem at 100%
+MIX_PRESET_LABELS = {
+    "Custom": None,
+    "Karaoke (no vocals)": "karaoke",
+    "Drumless": "drumless",
+    "Bassless": "bassless",
+    "A cappella (vocals only)": "a-cappella",
+}
+
+def render_mix_export(stem_files):
+    """Render the stems with chosen levels into one lossless file"""
+    with st.expander("🎚️ Export Mix", expanded=False):
+        st.caption("Set a level for each stem (0% leaves it out) and render them into a single "
+                   "track, e.g. a karaoke or drumless practice mix. Peaks are limited so the mix never clips.")
+        choice = st.selectbox("Preset", list(MIX_PRESET_LABELS), key="mix_preset")
+        preset = MIX_PRESET_LABELS[choice]
+        defaults = preset_gains(preset, stem_files) if preset else {path: 1.0 for path in stem_files}
+        gains = {}
+        cols = st.columns(min(len(stem_files), 4))
+        for i, path in enumerate(stem_files):
+            with cols[i % len(cols)]:
+                # Keyed by preset, so picking another preset resets the sliders to its levels
+                level = st.slider(Path(path).stem, 0, 150, int(defaults[path] * 100), step=5,
+                                  format="%d%%", key=f"mix_gain_{choice}_{i}")
+                gains[path] = level / 100
+
+        mix_dir = os.path.join(os.path.dirname(stem_files[0]), MIX_DIR)
+        if st.button("🎛️ Render Mix", key="render_mix"):
+            output = os.path.join(mix_dir, f"{mix_base_name(stem_files)}_{preset or 'custom'}.flac")
+            with st.spinner("Mixing stems..."):
+                try:
+                    result = render_mix(gains, output, "flac")
+                except (MixError, OSError) as e:
+                    st.error(f"❌ Could not render the mix: {e}")
+                else:
+                    st.session_state.mix_path = result.path
+                    if result.gain_reduction_db >= 0.1:
+                        st.info(f"🔉 The limiter lowered the loudest peaks by {result.gain_reduction_db:.1f} dB")
+
+        # Only offer a mix of the stems that are loaded now
+        mix_path = st.session_state.get("mix_path")
+        if mix_path and os.path.dirname(mix_path) == mix_dir and os.path.exists(mix_path):
+            st.success(f"✅ Mix saved: `{mix_path}`")
+            render_download_buttons([mix_path], key="mix_download")
+
+def render_cache_stats(title, cache):
+    """Show hit/miss counters and size of an on-disk cache"""
+    if not cache:
+        return
+    with st.expander(title, expanded=False):
+        stats = cache.stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Hits", stats["hits"])
+        c2.metric("Misses", stats["misses"])
+        c3.metric("Entries", stats["entries"])
+        c4.metric("Size", f"{stats['size_bytes'] / 1024 / 1024:.0f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        st.caption(f"Cache folder: `{stats['root']}`")
+
+def get_session_upload_dir():
+    """Private temporary folder for this session's uploads"""
+    if 'upload_dir' not in st.session_state:
+        st.session_state.upload_dir = create_upload_dir()
+    return st.session_state.upload_dir
+
+def save_upload_once(uploaded_file):
+    """Spool an uploaded file to the session folder the first time it is seen"""
+    return spool_upload(uploaded_file, get_session_upload_dir())
 
 # Initialize session state
+if 'job_ids' not in st.session_state:
+    # Restore jobs from the URL so a page reload keeps following them
+    st.session_state.job_ids = [j for j in st.query_params.get("jobs", "").split(",") if j]
+if 'batch_ids' not in st.session_state:
+    st.session_state.batch_ids = [b for b in st.query_params.get("batches", "").split(",") if b]
+if 'applied_jobs' not in st.session_state:
+    # Finished jobs whose output has already been loaded into this session
+    st.session_state.applied_jobs = set()
 if 'downloaded_mp3' not in st.session_state:
     st.session_state.downloaded_mp3 = None
 if 'separated_stems' not in st.session_state:
@@ -804,6 +474,11 @@ if 'fullscreen_player' not in st.session_state:
 
 # ─── Main Application ─────────────────────────────────────────────
 
+# Start the media server up front so /metrics is scrapeable before any stems are played;
+# inline mode leaves its port closed unless /metrics was asked for
+if media_server_needed():
+    get_media_server()
+
 st.title("🎵 Music Tools Suite")
 st.markdown("**YouTube → MP3 → Stems → Player**")
 
@@ -836,37 +511,11 @@ if st.button("🚀 Download MP3", type="primary"):
             st.error(path_msg)
         else:
             st.info(path_msg)
-            
-            # Download process
-            with tempfile.TemporaryDirectory() as tmpdir:
-                try:
-                    with st.spinner("Downloading and converting to MP3..."):
-                        mp3_path = download_audio(youtube_url, tmpdir)
-                    
-                    # Save to local directory
-                    mp3_filename = os.path.basename(mp3_path)
-                    local_mp3_path = os.path.join(mp3_save_path, mp3_filename)
-                    shutil.copy2(mp3_path, local_mp3_path)
-                    
-                    # Update session state
-                    st.session_state.downloaded_mp3 = local_mp3_path
-                    st.session_state.default_folder = mp3_save_path
-                    
-                    st.success(f"✅ MP3 saved: `{local_mp3_path}`")
-                    
-                    # Provide download button
-                    with open(mp3_path, "rb") as f:
-                        st.download_button(
-                            "📁 Download MP3 File",
-                            data=f.read(),
-                            file_name=mp3_filename,
-                            mime="audio/mpeg"
-                        )
-                    
-                except subprocess.CalledProcessError:
-                    st.error("Error downloading from YouTube. Check the URL and try again.")
-                except Exception as e:
-                    st.error(f"Unexpected error: {e}")
+            st.session_state.default_folder = mp3_save_path
+            submit_job("download", {"url": youtube_url.strip(), "save_dir": mp3_save_path})
+
+jobs_panel("download")
+render_cache_stats("🗄️ Download Cache", get_download_cache())
 
 # Show quick action if MP3 was just downloaded
 if st.session_state.downloaded_mp3:
@@ -884,7 +533,7 @@ if st.session_state.downloaded_mp3:
 st.markdown("""
 <div class="section-header">
     <h2>🎛️ 2. Separate MP3 to Stems</h2>
-    <p>Use AI to separate audio into individual tracks: vocals, drums, bass, other</p>
+    <p>Use AI to separate audio into individual tracks: vocals, drums, bass, other (plus guitar and piano with the 6-stem model)</p>
 </div>
 """, unsafe_allow_html=True)
 
@@ -904,15 +553,13 @@ if source_option.startswith("Use downloaded MP3") and st.session_state.downloade
 elif source_option == "Upload existing MP3 file":
     uploaded_mp3 = st.file_uploader("Choose MP3 file", type=['mp3'], key="mp3_upload")
     if uploaded_mp3:
-        # Save uploaded file temporarily
-        temp_mp3_path = os.path.join(tempfile.gettempdir(), uploaded_mp3.name)
-        with open(temp_mp3_path, "wb") as f:
-            f.write(uploaded_mp3.read())
-        mp3_to_separate = temp_mp3_path
+        mp3_to_separate = save_upload_once(uploaded_mp3)
         st.success(f"Loaded: `{uploaded_mp3.name}`")
 
 # Stems save path
 stems_save_path = st.text_input("Save stems folder", value=st.session_state.default_folder, key="stems_path")
+separation_model = model_selector("separation_model")
+separation_stems = stem_mode_selector("separation_stems")
 
 if mp3_to_separate and st.button("🚀 Separate to Stems", type="primary"):
     # Validate stems save path
@@ -921,53 +568,45 @@ if mp3_to_separate and st.button("🚀 Separate to Stems", type="primary"):
         st.error(path_msg)
     else:
         st.info(path_msg)
-        
-        # Separation process
-        with tempfile.TemporaryDirectory() as tmpdir:
+        st.session_state.default_folder = stems_save_path
+        submit_job("separate", {"input_path": mp3_to_separate, "save_dir": stems_save_path,
+                                "model": separation_model, "two_stems": separation_stems})
+
+jobs_panel("separate")
+
+render_cache_stats("🗄️ Separation Cache", get_separation_cache())
+render_stage_totals()
+
+# Batch processing
+with st.expander("📦 Batch Processing", expanded=bool(st.session_state.batch_ids)):
+    st.caption("Download and separate many tracks at once. Downloads and separations run in parallel, "
+               "each with its own pool of worker processes.")
+    batch_sources = st.text_area(
+        "Sources (one per line)",
+        placeholder="https://www.youtube.com/playlist?list=...\n/path/to/music/folder\n/path/to/tracklist.txt",
+        key="batch_sources",
+    )
+    batch_save_path = st.text_input("Batch output folder", value=st.session_state.default_folder, key="batch_path")
+    batch_model = model_selector("batch_model")
+    batch_stems = stem_mode_selector("batch_stems")
+    if st.button("🚀 Start Batch", type="primary"):
+        sources = [line.strip() for line in batch_sources.splitlines() if line.strip()]
+        path_valid, path_msg = validate_and_create_path(batch_save_path)
+        if not sources:
+            st.error("Please enter at least one URL, playlist, folder or file list.")
+        elif not path_valid:
+            st.error(path_msg)
+        else:
+            store = get_job_store()
             try:
-                with st.spinner("Separating stems with AI (this may take several minutes)..."):
-                    stems_folder = separate_stems(mp3_to_separate, tmpdir)
-                
-                st.success("✅ Stem separation complete!")
-                
-                # Convert stems to MP3
-                with st.spinner("Converting stems to MP3..."):
-                    base_name = os.path.splitext(os.path.basename(mp3_to_separate))[0]
-                    stem_mp3_files = convert_stems_to_mp3(stems_folder, stems_save_path, base_name)
-                
-                if stem_mp3_files:
-                    st.session_state.separated_stems = stem_mp3_files
-                    st.session_state.default_folder = stems_save_path
-                    st.success(f"✅ {len(stem_mp3_files)} stem files saved to: `{stems_save_path}`")
-                    
-                    # Show individual stem files
-                    for stem_file in stem_mp3_files:
-                        st.success(f"   • {os.path.basename(stem_file)}")
-                    
-                    # Provide download buttons
-                    st.subheader("Download Individual Stems")
-                    cols = st.columns(min(len(stem_mp3_files), 4))
-                    
-                    for i, stem_file in enumerate(stem_mp3_files):
-                        with open(stem_file, "rb") as f:
-                            stem_bytes = f.read()
-                        
-                        col_idx = i % len(cols)
-                        with cols[col_idx]:
-                            st.download_button(
-                                f"📁 {os.path.basename(stem_file)}",
-                                data=stem_bytes,
-                                file_name=os.path.basename(stem_file),
-                                mime="audio/mpeg",
-                                key=f"stem_download_{i}"
-                            )
-                else:
-                    st.error("❌ No stem files were created!")
-                    
-            except subprocess.CalledProcessError:
-                st.error("Error running Demucs. Make sure Demucs is installed.")
+                batch_id, count = submit_batch(store, sources, batch_save_path, batch_model, batch_stems)
             except Exception as e:
-                st.error(f"Unexpected error during separation: {e}")
+                st.error(f"❌ Could not start batch: {e}")
+            else:
+                ensure_worker_running(store)
+                track_batch(batch_id)
+                st.success(f"Queued {count} tracks. Stems are saved to `{os.path.join(batch_save_path, 'stems')}`")
+    batches_panel()
 
 # Show quick action if stems were just separated
 if st.session_state.separated_stems:
@@ -1022,7 +661,8 @@ elif stem_source_option == "Upload stem files":
     )
     
     if uploaded_stems and len(uploaded_stems) >= 2:
-        stems_to_play = uploaded_stems
+        # From here on uploads are handled exactly like separated stems on disk
+        stems_to_play = [save_upload_once(uploaded_file) for uploaded_file in uploaded_stems]
         st.success(f"Loaded {len(uploaded_stems)} stem files")
         
         # Show uploaded files
@@ -1036,23 +676,25 @@ elif stem_source_option == "Upload stem files":
 if stems_to_play:
     st.subheader("🎛️ Professional Stem Player")
     
-    # Prepare stems data
+    # Prepare stems data (memoized, so reruns that don't change the stems are cheap)
     stems_data = {}
+    source_keys = []
+    peaks = {}
+    streaming = get_player_mode() == "stream"
+    media_server = get_media_server() if streaming else None
     
     with st.spinner("Preparing audio player..."):
-        if isinstance(stems_to_play[0], str):  # File paths (from separation)
-            for file_path in stems_to_play:
-                stem_name = Path(file_path).stem
-                with open(file_path, "rb") as f:
-                    file_bytes = f.read()
-                    audio_base64 = base64.b64encode(file_bytes).decode()
-                    stems_data[stem_name] = audio_base64
-        else:  # Uploaded files
-            for uploaded_file in stems_to_play:
-                stem_name = Path(uploaded_file.name).stem
-                file_bytes = uploaded_file.read()
-                audio_base64 = base64.b64encode(file_bytes).decode()
-                stems_data[stem_name] = audio_base64
+        for file_path in stems_to_play:
+            stem_name = Path(file_path).stem
+            source_keys.append(file_cache_key(file_path))
+            # Precomputed by separation jobs; extracted here once for uploads and older results
+            stem_peaks = encode_peaks_json(file_path)
+            if stem_peaks:
+                peaks[stem_name] = stem_peaks
+            if streaming:
+                stems_data[stem_name] = media_server.register(file_path)
+            else:
+                stems_data[stem_name] = encode_file_data_uri(file_path)
     
     # Display the player
     if stems_data:
@@ -1070,9 +712,15 @@ if stems_to_play:
             st.write(f"**Current:** {'Expanded' if st.session_state.fullscreen_player else 'Compact'} View")
         
         # Create and display player
-        player_html = create_audio_player_html(stems_data)
-        player_height = 900 if st.session_state.fullscreen_player else 600
-        st.components.v1.html(player_html, height=player_height, scrolling=True)
+        player_html = render_player_html(
+            stems_data,
+            source_keys,
+            media_port=media_server.port if media_server else None,
+            media_base=get_public_media_url(),
+            peaks=peaks,
+        )
+        st.components.v1.html(player_html, height=player_height(len(stems_data), st.session_state.fullscreen_player),
+                              scrolling=True)
         
         st.markdown("""
         ---
@@ -1083,8 +731,8 @@ if stems_to_play:
         - **Individual Volume**: Fine-tune each stem independently
         - **🔇 Mute**: Silence specific stems (red when active)
         - **🎯 Solo**: Isolate individual stems (green when active)
-        - **Progress Bars**: Master progress + individual stem progress indicators
-        - **Seek Control**: Click master progress bar to seek to any position
+        - **Progress Bars**: Master progress bar + a waveform lane per stem that fills in as it plays
+        - **Seek Control**: Click the master progress bar or any waveform to seek to that position
         - **View Options**: Switch between Compact and Expanded player views
         """)
         
@@ -1116,6 +764,8 @@ if stems_to_play:
                 - Shortcuts won't work while typing in input fields
                 - Press `Esc` to exit fullscreen mode
                 """)
+        
+        render_mix_export(stems_to_play)
 
 else:
     st.info("👆 Upload stem files or separate MP3 above to start mixing!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: yt-dlp subprocess per URL vs the shared in-process downloader
+Serves synthetic WAV files from a local HTTP server (no network needed) and
+downloads them to MP3 with each backend.
+
+Usage: python benchmarks/bench_download.py [--items 8] [--seconds 10] [--concurrency N]
+"""
+
+import argparse
+import functools
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_transcode import write_sine_wav
+from music_tools.downloader import DOWNLOAD_BACKEND_ENV, get_download_concurrency
+from music_tools.pipeline import download_many
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # yt-dlp probes URLs and hangs up mid-response
+
+def serve_directory(directory):
+    """Start a local HTTP stand-in for the media host and return its base URL"""
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = QuietServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_subprocess(urls, out_dir):
+    for url in urls:
+        subprocess.run(
+            ["yt-dlp", "-q", "-x", "--audio-format", "mp3", "--audio-quality", "0",
+             "-o", os.path.join(out_dir, "%(title)s.%(ext)s"), url],
+            check=True,
+        )
+
+def run_inprocess(urls, out_dir, concurrency):
+    os.environ[DOWNLOAD_BACKEND_ENV] = "inprocess"
+    _, failures = download_many(urls, out_dir, cache=None, max_workers=concurrency)
+    if failures:
+        raise RuntimeError(f"{len(failures)} downloads failed: {failures}")
+
+def timed(func, *args):
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        func(*args, out_dir)
+        elapsed = time.perf_counter() - start
+        produced = len([f for f in os.listdir(out_dir) if f.endswith(".mp3")])
+    return elapsed, produced
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=8, help="number of synthetic tracks")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of each track")
+    parser.add_argument("--concurrency", type=int, default=None, help="simultaneous in-process downloads")
+    args = parser.parse_args()
+
+    concurrency = args.concurrency or get_download_concurrency()
+
+    with tempfile.TemporaryDirectory() as media_dir:
+        print(f"🔧 Generating {args.items} tracks of {args.seconds:.0f}s...")
+        for i in range(args.items):
+            write_sine_wav(os.path.join(media_dir, f"track{i}.wav"), args.seconds, 110 * (i + 1))
+        server, base_url = serve_directory(media_dir)
+        urls = [f"{base_url}/track{i}.wav" for i in range(args.items)]
+        try:
+            results = [
+                ("Subprocess per URL", timed(run_subprocess, urls)),
+                ("In-process, serial", timed(lambda u, o: run_inprocess(u, o, 1), urls)),
+                (f"In-process, {concurrency} concurrent", timed(lambda u, o: run_inprocess(u, o, concurrency), urls)),
+            ]
+        finally:
+            server.shutdown()
+
+    baseline = results[0][1][0]
+    for label, (elapsed, produced) in results:
+        print(f"{label:<28} {elapsed:7.2f}s  {elapsed / args.items * 1000:7.0f} ms/item  "
+              f"{baseline / elapsed:5.2f}x  ({produced}/{args.items} files)")
+
+if __name__ == "__main__":
+    main()
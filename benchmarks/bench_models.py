@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput and memory of each separation model
+Separates a synthetic four-stem song with every model in MODELS through the
+demucs CLI (one process per run, so each peak RSS is the model's own) and
+prints wall time, CPU time relative to htdemucs and peak memory next to the
+estimated profile the auto policy and the UI quote. Use the output (and
+the machine --save records) to replace the estimates in MODELS.
+
+Usage: python benchmarks/bench_models.py [--seconds 240] [--models htdemucs htdemucs_ft] [--save models.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import bench_scratch, machine_info, make_fixture, measure
+
+from music_tools.pipeline import separate_stems
+from music_tools.separation import DEFAULT_MODEL, MODELS, SEPARATION_BACKEND_ENV
+
+def measure_model(model, song, repeat):
+    """Best wall and CPU time and the largest peak RSS of separating song with model"""
+    return measure(lambda out_dir: separate_stems(song, out_dir, model=model), repeat)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=240, help="length of the synthetic song")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS),
+                        help="models to run")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per model (best is reported)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    if shutil.which("demucs") is None:
+        sys.exit("❌ The demucs CLI is not installed")
+
+    results = {}
+    with bench_scratch({SEPARATION_BACKEND_ENV: "subprocess"}) as scratch:
+        print(f"🔧 Generating a {args.seconds:g}s four-stem fixture...")
+        _, song = make_fixture(scratch, args.seconds)
+        # htdemucs is the unit of the relative cost, so it always runs first
+        models = [DEFAULT_MODEL] + [name for name in args.models if name != DEFAULT_MODEL]
+        for name in models:
+            print(f"⚙️ {name}...", flush=True)
+            results[name] = measure_model(name, song, args.repeat)
+
+    unit = results[DEFAULT_MODEL]["cpu_seconds"]
+    print(f"\n{'model':<14}{'wall':>9}{'realtime':>10}{'cost':>7}{'estimate':>9}{'peak MB':>9}{'estimate':>9}")
+    for name, r in results.items():
+        profile = MODELS[name]
+        r["realtime_factor"] = args.seconds / max(r["seconds"], 1e-9)
+        r["cost"] = r["cpu_seconds"] / max(unit, 1e-9)
+        print(f"{name:<14}{r['seconds']:>8.1f}s{r['realtime_factor']:>9.2f}x{r['cost']:>6.1f}x"
+              f"{profile.cost:>8.1f}x{r['peak_rss_mb']:>9.0f}{profile.memory_mb:>9}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"machine": machine_info(), "audio_seconds": args.seconds, "results": results},
+                      f, indent=2)
+        print(f"💾 Results saved to {args.save}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Benchmark: audio pipeline throughput with regression thresholds
+Generates synthetic multi-track songs offline at several lengths and times
+separate_stems, convert_stems_to_mp3, waveform peak extraction, a karaoke
+mixdown, player HTML generation (inline base64 and streamed URLs) and the full
+separate-to-MP3 run. Results can be saved as
+JSON and compared against a saved baseline; the exit status is 1 when any
+case is slower than its threshold allows.
+
+Usage: python benchmarks/bench_pipeline.py [--lengths 15 60 180] [--save results.json]
+       python benchmarks/bench_pipeline.py --baseline baseline.json [--max-regression 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import wave
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from music_tools import player
+from music_tools.cache import CACHE_DIR_ENV
+from music_tools.cpu import get_cpu_quota
+from music_tools.metrics import METRICS_LOG_ENV, collect_spans, span
+from music_tools.mixdown import preset_gains, render_mix
+from music_tools.pipeline import (
+    convert_stems_to_mp3,
+    separate_stems,
+    separate_to_mp3,
+)
+from music_tools.separation import get_separation_backend
+from music_tools.waveform import compute_peaks
+
+SAMPLE_RATE = 44100
+BLOCK_SECONDS = 10
+RESULTS_VERSION = 1
+
+# ─── Synthetic Fixtures ─────────────────────────────────────────────
+
+def synth_block(name, start, frames, rng):
+    """One block of a synthetic stem as (frames, 2) float32"""
+    t = (start + np.arange(frames)) / SAMPLE_RATE
+    if name == "drums":
+        # Noise bursts on every beat at 120 BPM
+        mono = 0.4 * rng.standard_normal(frames) * np.exp(-(t % 0.5) * 30)
+    elif name == "bass":
+        mono = 0.3 * np.sin(2 * np.pi * 55 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t))
+    elif name == "vocals":
+        # Vibrato around A3
+        mono = 0.25 * np.sin(2 * np.pi * 220 * t + 4 * np.sin(2 * np.pi * 5 * t))
+    else:
+        mono = 0.1 * sum(np.sin(2 * np.pi * f * t) for f in (261.6, 329.6, 392.0))
+    pan = {"drums": 0.5, "bass": 0.5, "vocals": 0.5, "other": 0.3}[name]
+    return np.stack([mono * (1 - pan) * 2, mono * pan * 2], axis=1).astype(np.float32) * 0.5
+
+def make_fixture(folder, seconds, seed=0):
+    """Write drums/bass/vocals/other WAV stems, their mix as WAV, and the mix as MP3"""
+    names = ["drums", "bass", "vocals", "other"]
+    stems_dir = os.path.join(folder, "stems")
+    os.makedirs(stems_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    writers = {}
+    for name in names + ["mix"]:
+        path = os.path.join(stems_dir if name != "mix" else folder, f"{name}.wav")
+        writer = wave.open(path, "wb")
+        writer.setnchannels(2)
+        writer.setsampwidth(2)
+        writer.setframerate(SAMPLE_RATE)
+        writers[name] = writer
+    total = int(seconds * SAMPLE_RATE)
+    block = BLOCK_SECONDS * SAMPLE_RATE
+    # Written block by block so long fixtures never sit in memory whole
+    for start in range(0, total, block):
+        frames = min(block, total - start)
+        mix = np.zeros((frames, 2), dtype=np.float32)
+        for name in names:
+            data = synth_block(name, start, frames, rng)
+            mix += data
+            writers[name].writeframes((np.clip(data, -1, 1) * 32767).astype("<i2").tobytes())
+        writers["mix"].writeframes((np.clip(mix, -1, 1) * 32767).astype("<i2").tobytes())
+    for writer in writers.values():
+        writer.close()
+
+    mix_mp3 = os.path.join(folder, "song.mp3")
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", os.path.join(folder, "mix.wav"),
+                    "-b:a", "192k", "-y", mix_mp3], check=True)
+    return stems_dir, mix_mp3
+
+# ─── Measurement ─────────────────────────────────────────────
+
+@contextmanager
+def bench_scratch(env=None):
+    """Scratch folder for a benchmark run, removed afterwards; env adds settings for the run"""
+    scratch = tempfile.mkdtemp(prefix="music_tools_bench_")
+    # Keep benchmark runs out of the real cache, metrics log and stage totals
+    os.environ[CACHE_DIR_ENV] = os.path.join(scratch, "cache")
+    os.environ[METRICS_LOG_ENV] = "off"
+    os.environ.update(env or {})
+    try:
+        yield scratch
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def measure(fn, repeat=1):
+    """Run fn(out_dir) repeat times, each in a fresh folder, and summarize the runs
+
+    Times are the best run's, peak memory the largest seen in any span (tool
+    runs record their own) and output_bytes what the last run left in out_dir.
+    """
+    walls, cpus, peaks = [], [], []
+    output_bytes = 0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as out_dir, collect_spans() as spans:
+            with span("bench"):
+                fn(out_dir)
+            output_bytes = sum(os.path.getsize(os.path.join(root, f))
+                               for root, _, files in os.walk(out_dir) for f in files)
+        walls.append(spans[-1].wall)
+        cpus.append(spans[-1].cpu)
+        peaks.append(max(s.peak_rss for s in spans))
+    return {
+        "seconds": min(walls),
+        "median_seconds": statistics.median(walls),
+        "cpu_seconds": min(cpus),
+        "peak_rss_mb": max(peaks) / 1024 / 1024,
+        "output_bytes": output_bytes,
+    }
+
+# ─── Cases ─────────────────────────────────────────────
+
+def case_transcode(fixture, out_dir):
+    convert_stems_to_mp3(fixture["stems_dir"], out_dir, "bench")
+
+def case_peaks(fixture, out_dir):
+    for path in fixture["stem_mp3s"]:
+        compute_peaks(path)
+
+def case_mixdown(fixture, out_dir):
+    gains = preset_gains("karaoke", fixture["stem_mp3s"])
+    render_mix(gains, os.path.join(out_dir, "karaoke.mp3"), "mp3")
+
+def case_player_inline(fixture, out_dir):
+    # Fresh memo cache so every run pays for the base64 encoding
+    player.player_cache = player.LRUCache(player.player_cache.max_bytes)
+    stems = {os.path.basename(p): player.encode_file_data_uri(p) for p in fixture["stem_mp3s"]}
+    player.create_audio_player_html(stems)
+
+def case_player_stream(fixture, out_dir):
+    stems = {os.path.basename(p): f"/media/token/{os.path.basename(p)}" for p in fixture["stem_mp3s"]}
+    player.create_audio_player_html(stems, media_port=8502)
+
+def case_separate(fixture, out_dir):
+    separate_stems(fixture["song"], out_dir)
+
+def case_end_to_end(fixture, out_dir):
+    separate_to_mp3(fixture["song"], out_dir, "bench")
+
+def separation_available():
+    if get_separation_backend() == "inprocess":
+        return True
+    return shutil.which("demucs") is not None
+
+# name -> (function, needs Demucs)
+CASES = {
+    "transcode": (case_transcode, False),
+    "peaks": (case_peaks, False),
+    "mixdown": (case_mixdown, False),
+    "player_inline": (case_player_inline, False),
+    "player_stream": (case_player_stream, False),
+    "separate": (case_separate, True),
+    "end_to_end": (case_end_to_end, True),
+}
+
+def run_case(fn, fixture, repeat):
+    """Run a case repeat times and summarize wall time, CPU time and peak memory"""
+    result = measure(lambda out_dir: fn(fixture, out_dir), repeat)
+    result["audio_seconds"] = fixture["seconds"]
+    result["realtime_factor"] = fixture["seconds"] / max(result["seconds"], 1e-9)
+    return result
+
+# ─── Results ─────────────────────────────────────────────
+
+def machine_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": get_cpu_quota(),
+        "separation_backend": get_separation_backend(),
+    }
+
+def parse_thresholds(values):
+    """CASE=FRACTION pairs, e.g. transcode=0.3 or transcode@60s=0.3"""
+    thresholds = {}
+    for value in values:
+        name, _, fraction = value.partition("=")
+        try:
+            thresholds[name] = float(fraction)
+        except ValueError:
+            sys.exit(f"❌ Invalid threshold {value!r}; expected CASE=FRACTION")
+    return thresholds
+
+def compare(results, baseline, max_regression, thresholds, min_delta):
+    """Print each case against the baseline and return the names that regressed"""
+    regressions = []
+    print(f"\n{'case':<24}{'baseline':>10}{'current':>10}{'change':>9}  limit")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        case = key.split("@")[0]
+        limit = thresholds.get(key, thresholds.get(case, max_regression))
+        change = current["seconds"] / max(previous["seconds"], 1e-9) - 1
+        # Sub-millisecond cases jitter by large fractions; also require an absolute slowdown
+        failed = change > limit and current["seconds"] - previous["seconds"] > min_delta
+        if failed:
+            regressions.append(key)
+        print(f"{key:<24}{previous['seconds']:>9.3f}s{current['seconds']:>9.3f}s{change:>+8.0%}  "
+              f"+{limit:.0%} {'❌' if failed else '✅'}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lengths", type=float, nargs="+", default=[15, 60, 180],
+                        help="track lengths in seconds")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES),
+                        help="cases to run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is compared)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed slowdown vs the baseline, as a fraction (default 0.2 = 20%%)")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="slowdowns smaller than this many seconds never count as regressions")
+    parser.add_argument("--threshold", action="append", default=[], metavar="CASE=FRACTION",
+                        help="per-case allowed slowdown, e.g. separate=0.4 or transcode@60s=0.1")
+    args = parser.parse_args()
+    thresholds = parse_thresholds(args.threshold)
+
+    cases = [name for name in args.cases if not CASES[name][1] or separation_available()]
+    skipped = sorted(set(args.cases) - set(cases))
+    if skipped:
+        print(f"⚠️ Skipping {', '.join(skipped)}: Demucs is not installed")
+
+    results = {}
+    with bench_scratch() as scratch:
+        for seconds in args.lengths:
+            folder = os.path.join(scratch, f"{seconds:g}s")
+            print(f"🔧 Generating a {seconds:g}s four-stem fixture...")
+            stems_dir, song = make_fixture(folder, seconds)
+            stem_mp3s_dir = os.path.join(folder, "mp3")
+            os.makedirs(stem_mp3s_dir)
+            fixture = {
+                "seconds": seconds,
+                "stems_dir": stems_dir,
+                "song": song,
+                "stem_mp3s": convert_stems_to_mp3(stems_dir, stem_mp3s_dir, "fixture"),
+            }
+            for name in cases:
+                key = f"{name}@{seconds:g}s"
+                results[key] = run_case(CASES[name][0], fixture, args.repeat)
+                r = results[key]
+                print(f"  {key:<24}{r['seconds']:8.3f}s  cpu {r['cpu_seconds']:7.2f}s  "
+                      f"{r['realtime_factor']:7.1f}x realtime  peak {r['peak_rss_mb']:6.0f} MB")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"version": RESULTS_VERSION, "machine": machine_info(), "results": results},
+                      f, indent=2)
+        print(f"💾 Results saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("version") != RESULTS_VERSION:
+            sys.exit(f"❌ {args.baseline} was written by an incompatible benchmark version")
+        regressions = compare(results, baseline["results"], args.max_regression, thresholds,
+                              args.min_delta)
+        if regressions:
+            print(f"❌ {len(regressions)} case(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+if __name__ == "__main__":
+    main()
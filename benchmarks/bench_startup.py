@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold-start time of the command-line entry points
+Runs each command in a fresh interpreter, reports the best wall-clock time
+and checks that no heavy module (torch, demucs, streamlit, numpy) was imported.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("torch", "demucs", "streamlit", "numpy")
+
+# (label, module run with runpy, argv)
+COMMANDS = [
+    ("python (baseline)", None, []),
+    ("music_tools --help", "music_tools", ["--help"]),
+    ("music_tools download --help", "music_tools", ["download", "--help"]),
+    ("music_tools.batch --help", "music_tools.batch", ["--help"]),
+    ("music_tools.worker --help", "music_tools.worker", ["--help"]),
+]
+
+# Runs a module like `python -m` and reports which heavy modules it pulled in
+PROBE = """
+import runpy, sys
+module, argv, heavy = sys.argv[1], sys.argv[2:], {heavy!r}
+if module != "-":
+    sys.argv = [module] + argv
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit:
+        pass
+print("HEAVY:" + ",".join(m for m in heavy if m in sys.modules), file=sys.stderr)
+"""
+
+def time_command(module, argv):
+    """Run one command in a fresh interpreter and return (seconds, heavy modules loaded)"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES), module or "-"] + argv,
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - start
+    heavy = ""
+    for line in result.stderr.splitlines():
+        if line.startswith("HEAVY:"):
+            heavy = line[len("HEAVY:"):]
+    return elapsed, heavy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per command (best is reported)")
+    args = parser.parse_args()
+
+    failed = False
+    for label, module, argv in COMMANDS:
+        runs = [time_command(module, argv) for _ in range(args.repeat)]
+        best = min(elapsed for elapsed, _ in runs)
+        heavy = runs[-1][1]
+        status = f"❌ imported {heavy}" if heavy else "✅"
+        failed |= bool(heavy)
+        print(f"{label:<32} {best * 1000:8.1f} ms  {status}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: separation throughput by concurrent jobs × threads per job
+Separates copies of a synthetic song through the demucs CLI with every
+combination of concurrent separations and thread caps that fits the CPU
+quota (and one step past it, to show what oversubscription costs), then
+reports songs per minute for each and the settings of the fastest.
+
+Usage: python benchmarks/bench_threads.py [--seconds 60] [--songs 4] [--max-oversubscription 2]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import bench_scratch, make_fixture, measure
+
+from music_tools.cpu import SEPARATION_THREADS_ENV, get_cpu_quota, limit_threads
+from music_tools.pipeline import separate_stems
+from music_tools.separation import DEFAULT_MODEL, SEPARATION_BACKEND_ENV
+from music_tools.worker import JOB_WORKERS_ENV
+
+def plan_configs(cpus, max_oversubscription):
+    """(jobs, threads) pairs using up to max_oversubscription × the CPU quota"""
+    sizes = sorted({1, 2, 4, 8, 16, cpus} | {n for n in range(1, cpus + 1) if cpus % n == 0})
+    return [(jobs, threads) for jobs in sizes for threads in sizes
+            if jobs * threads <= cpus * max_oversubscription and jobs <= cpus]
+
+def run_config(songs, jobs, threads, model):
+    """Separate every song with jobs at a time, each capped at threads; returns (wall, cpu)"""
+    limit_threads(threads)
+
+    def separate_all(out_dir):
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(lambda song: separate_stems(song, out_dir, model=model), songs))
+
+    result = measure(separate_all)
+    return result["seconds"], result["cpu_seconds"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60, help="length of each synthetic song")
+    parser.add_argument("--songs", type=int, default=4, help="songs separated per configuration")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="separation model")
+    parser.add_argument("--max-oversubscription", type=float, default=2.0,
+                        help="largest jobs × threads tried, as a multiple of the CPU quota")
+    args = parser.parse_args()
+
+    if shutil.which("demucs") is None:
+        sys.exit("❌ The demucs CLI is not installed")
+
+    cpus = get_cpu_quota()
+    results = {}
+    # One demucs process per job, like the worker pool; each inherits the thread cap
+    with bench_scratch({SEPARATION_BACKEND_ENV: "subprocess"}) as scratch:
+        print(f"🔧 Generating a {args.seconds:g}s fixture ({cpus} CPUs available)...")
+        _, song = make_fixture(scratch, args.seconds)
+        songs = []
+        for i in range(args.songs):
+            songs.append(os.path.join(scratch, f"song_{i}.mp3"))
+            shutil.copy(song, songs[-1])
+
+        print(f"\n{'jobs':>5}{'threads':>9}{'wall':>9}{'cpu':>9}{'songs/min':>11}")
+        for jobs, threads in plan_configs(cpus, args.max_oversubscription):
+            wall, cpu = run_config(songs, jobs, threads, args.model)
+            results[(jobs, threads)] = len(songs) / wall * 60
+            flag = " (oversubscribed)" if jobs * threads > cpus else ""
+            print(f"{jobs:>5}{threads:>9}{wall:>8.1f}s{cpu:>8.1f}s{results[(jobs, threads)]:>11.2f}{flag}",
+                  flush=True)
+
+    (jobs, threads), best = max(results.items(), key=lambda item: item[1])
+    print(f"\n🏆 Best: {jobs} job(s) × {threads} thread(s) = {best:.2f} songs/min")
+    print(f"   {JOB_WORKERS_ENV}={jobs} {SEPARATION_THREADS_ENV}={threads}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serial vs parallel stem transcoding
+Generates synthetic WAV stems and times convert_stems_to_mp3 with one
+worker and with the default worker pool.
+
+Usage: python benchmarks/bench_transcode.py [--stems 4] [--seconds 60] [--workers N]
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_tools.pipeline import convert_stems_to_mp3, get_transcode_workers
+
+SAMPLE_RATE = 44100
+
+def write_sine_wav(path, seconds, frequency):
+    """Write a stereo 16-bit sine wave"""
+    frames = int(seconds * SAMPLE_RATE)
+    step = 2 * math.pi * frequency / SAMPLE_RATE
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        chunk = SAMPLE_RATE
+        for start in range(0, frames, chunk):
+            samples = []
+            for n in range(start, min(start + chunk, frames)):
+                value = int(12000 * math.sin(step * n))
+                samples.extend((value, value))
+            wav.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+def time_conversion(stems_dir, workers):
+    """Convert all stems once and return the wall-clock time"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        convert_stems_to_mp3(stems_dir, out_dir, "bench", max_workers=workers)
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stems", type=int, default=4, help="number of synthetic stems")
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of each stem")
+    parser.add_argument("--workers", type=int, default=None, help="parallel worker count")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode (best is reported)")
+    args = parser.parse_args()
+
+    workers = args.workers or get_transcode_workers()
+
+    with tempfile.TemporaryDirectory() as stems_dir:
+        print(f"🔧 Generating {args.stems} stems of {args.seconds:.0f}s...")
+        for i in range(args.stems):
+            write_sine_wav(os.path.join(stems_dir, f"stem{i}.wav"), args.seconds, 110 * (i + 1))
+
+        serial = min(time_conversion(stems_dir, 1) for _ in range(args.repeat))
+        parallel = min(time_conversion(stems_dir, workers) for _ in range(args.repeat))
+
+    print(f"Serial   (1 worker):  {serial:7.2f}s")
+    print(f"Parallel ({workers} workers): {parallel:7.2f}s")
+    print(f"Speedup: {serial / parallel:.2f}x")
+
+if __name__ == "__main__":
+    main()
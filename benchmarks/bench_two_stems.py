@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: CPU time and disk space saved by two-stem separation
+Generates a synthetic four-stem song and compares a full separation with a
+vocals + accompaniment one: MP3 conversion of the WAV stems (always), and
+the whole separate-to-MP3 run when Demucs is installed. Reports wall time,
+CPU time and the bytes of stems kept per song.
+
+Usage: python benchmarks/bench_two_stems.py [--seconds 180] [--stem vocals] [--repeat 3]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import bench_scratch, make_fixture, measure, separation_available
+
+from music_tools.mixdown import render_mix
+from music_tools.pipeline import convert_stems_to_mp3, separate_to_mp3
+
+def make_two_stem_folder(stems_dir, folder, stem):
+    """<stem>.wav plus no_<stem>.wav summed from the other stems, as Demucs writes them"""
+    os.makedirs(folder)
+    shutil.copy(os.path.join(stems_dir, f"{stem}.wav"), folder)
+    others = {os.path.join(stems_dir, f): 1.0 for f in os.listdir(stems_dir) if f != f"{stem}.wav"}
+    render_mix(others, os.path.join(folder, f"no_{stem}.wav"), "wav", limit=False)
+
+def report(name, full, two):
+    print(f"{name:<22}{'wall':>9}{'cpu':>9}{'stems MB':>10}")
+    for label, r in (("all stems", full), ("two stems", two)):
+        print(f"  {label:<20}{r['seconds']:>8.2f}s{r['cpu_seconds']:>8.2f}s"
+              f"{r['output_bytes'] / 1024 / 1024:>10.1f}")
+    saved = {key: 1 - two[key] / max(full[key], 1e-9)
+             for key in ("seconds", "cpu_seconds", "output_bytes")}
+    print(f"  {'saved':<20}{saved['seconds']:>9.0%}{saved['cpu_seconds']:>9.0%}{saved['output_bytes']:>10.0%}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=180, help="length of the synthetic song")
+    parser.add_argument("--stem", default="vocals", choices=["drums", "bass", "other", "vocals"],
+                        help="stem kept apart from the accompaniment")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode (best is reported)")
+    args = parser.parse_args()
+
+    with bench_scratch() as scratch:
+        print(f"🔧 Generating a {args.seconds:g}s four-stem fixture...\n")
+        stems_dir, song = make_fixture(scratch, args.seconds)
+        two_dir = os.path.join(scratch, "two_stems")
+        make_two_stem_folder(stems_dir, two_dir, args.stem)
+
+        report("MP3 conversion",
+               measure(lambda out: convert_stems_to_mp3(stems_dir, out, "bench"), args.repeat),
+               measure(lambda out: convert_stems_to_mp3(two_dir, out, "bench"), args.repeat))
+        if separation_available():
+            report("separate to MP3",
+                   measure(lambda out: separate_to_mp3(song, out, "bench"), args.repeat),
+                   measure(lambda out: separate_to_mp3(song, out, "bench", two_stems=args.stem),
+                           args.repeat))
+        else:
+            print("⚠️ Skipping separate to MP3: Demucs is not installed")
+
+if __name__ == "__main__":
+    main()
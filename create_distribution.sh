@@ -19,6 +19,7 @@ mkdir -p "$PYTHON_DIST"
 
 # Copy essential files for Python distribution
 cp app.py "$PYTHON_DIST/"
+cp -r music_tools "$PYTHON_DIST/"
 cp requirements.txt "$PYTHON_DIST/"
 cp install.py "$PYTHON_DIST/"
 cp README.md "$PYTHON_DIST/"
@@ -39,6 +40,7 @@ mkdir -p "$DOCKER_DIST"
 
 # Copy all Docker-related files
 cp app.py "$DOCKER_DIST/"
+cp -r music_tools "$DOCKER_DIST/"
 cp requirements.txt "$DOCKER_DIST/"
 cp Dockerfile "$DOCKER_DIST/"
 cp docker-compose.yml "$DOCKER_DIST/"
@@ -65,6 +67,8 @@ mkdir -p "$SOURCE_DIST"
 
 # Copy all source files (except .git and dist)
 cp app.py "$SOURCE_DIST/"
+cp -r music_tools "$SOURCE_DIST/"
+cp -r benchmarks "$SOURCE_DIST/"
 cp requirements.txt "$SOURCE_DIST/"
 cp install.py "$SOURCE_DIST/"
 cp Dockerfile "$SOURCE_DIST/"
@@ -0,0 +1,26 @@
+"""
+Music Tools Suite - processing pipeline
+YouTube download, stem separation and transcoding helpers shared by the
+Streamlit app and the command-line tools.
+"""
+
+import importlib
+
+__all__ = [
+    "DownloadResult",
+    "SeparationResult",
+    "StemConversionError",
+    "convert_stems_to_mp3",
+    "download_audio",
+    "get_cpu_quota",
+    "separate_stems",
+    "separate_to_mp3",
+    "validate_and_create_path",
+]
+
+def __getattr__(name):
+    # Loaded on first use so importing a submodule (e.g. the CLI) stays cheap
+    if name in __all__:
+        module = "cpu" if name == "get_cpu_quota" else "pipeline"
+        return getattr(importlib.import_module(f"music_tools.{module}"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,5 @@
+import sys
+
+from music_tools.cli import main
+
+sys.exit(main())
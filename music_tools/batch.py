@@ -0,0 +1,235 @@
+"""
+Batch processing
+Queues a whole folder, file list or playlist for download and separation and
+reports aggregate progress.
+
+Usage: python -m music_tools.batch SOURCE [SOURCE ...] --out DIR [--model NAME] [--two-stems STEM] [--wait]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from music_tools.jobs import (
+    CANCELLED, DONE, FAILED, QUEUED, RUNNING, Job, JobStore,
+)
+from music_tools.progress import format_duration
+from music_tools.separation import AUTO_MODEL, MODELS
+
+# ─── Input Discovery ─────────────────────────────────────────────
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".m4a", ".ogg")
+LIST_EXTENSIONS = (".txt", ".m3u", ".m3u8")
+
+def is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+def is_playlist_url(url: str) -> bool:
+    return "list=" in url or "/playlist" in url
+
+def expand_playlist(url: str) -> list[str]:
+    """List the video URLs of a playlist without downloading anything"""
+    result = subprocess.run(
+        ["yt-dlp", "--flat-playlist", "--print", "url", url],
+        check=True, capture_output=True, text=True,
+    )
+    return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+def read_source_list(path: str) -> list[str]:
+    """Read one source per line, skipping blanks and comments; relative paths are resolved against the list"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    sources = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not is_url(line) and not os.path.isabs(line):
+                line = os.path.join(base_dir, line)
+            sources.append(line)
+    return sources
+
+def collect_inputs(sources: list[str]) -> tuple[list[str], list[str]]:
+    """Expand folders, lists and playlists into (urls, local audio files)"""
+    urls: list[str] = []
+    files: list[str] = []
+    pending = list(sources)
+    while pending:
+        source = pending.pop(0).strip()
+        if not source:
+            continue
+        if is_url(source):
+            urls.extend(expand_playlist(source) if is_playlist_url(source) else [source])
+        elif os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    files.append(os.path.join(source, name))
+        elif source.lower().endswith(LIST_EXTENSIONS) and os.path.isfile(source):
+            pending[:0] = read_source_list(source)
+        elif source.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(source):
+            files.append(os.path.abspath(source))
+        else:
+            raise ValueError(f"Not a URL, audio file, folder or list: {source}")
+    # Keep the first occurrence of each input
+    return list(dict.fromkeys(urls)), list(dict.fromkeys(files))
+
+def submit_batch(store: JobStore, sources: list[str], save_dir: str,
+                 model: Optional[str] = None, two_stems: Optional[str] = None) -> tuple[str, int]:
+    """Queue every input of a batch and return (batch ID, number of items)
+
+    model is a separation model name or "auto"; None uses the configured default.
+    two_stems (e.g. "vocals") keeps only that stem and its accompaniment.
+    """
+    urls, files = collect_inputs(sources)
+    if not urls and not files:
+        raise ValueError("No audio files or URLs found")
+    batch_id = uuid.uuid4().hex[:12]
+    downloads_dir = os.path.join(save_dir, "downloads")
+    stems_dir = os.path.join(save_dir, "stems")
+    if urls:
+        os.makedirs(downloads_dir, exist_ok=True)
+    for url in urls:
+        store.submit("download", {"url": url, "save_dir": downloads_dir, "stems_dir": stems_dir,
+                                  "model": model, "two_stems": two_stems},
+                     batch_id=batch_id)
+    for path in files:
+        track_name = os.path.splitext(os.path.basename(path))[0]
+        store.submit("separate", {"input_path": path, "save_dir": os.path.join(stems_dir, track_name),
+                                  "model": model, "two_stems": two_stems},
+                     batch_id=batch_id)
+    return batch_id, len(urls) + len(files)
+
+# ─── Progress ─────────────────────────────────────────────
+
+# Share of an item's work done by the download stage when it has one
+DOWNLOAD_WEIGHT = 0.2
+
+@dataclass
+class BatchStatus:
+    """Aggregate progress of a batch"""
+    batch_id: str
+    total: int
+    done: int
+    failed: int
+    cancelled: int
+    running: int
+    queued: int
+    progress: float
+    elapsed: float
+    throughput: float  # tracks per minute, counting partial progress
+    eta: Optional[float]  # seconds
+
+    @property
+    def finished(self) -> bool:
+        return self.done + self.failed + self.cancelled == self.total
+
+def _item_state(root: Job, child: Optional[Job]) -> tuple[str, float]:
+    """Status and progress of one batch item (a download followed by its separation)"""
+    if root.kind != "download":
+        return root.status, 1.0 if root.finished else root.progress
+    if root.status != DONE:
+        return root.status, DOWNLOAD_WEIGHT * root.progress
+    if child is None:
+        # Download finished, separation about to be queued
+        return RUNNING, DOWNLOAD_WEIGHT
+    progress = 1.0 if child.finished else child.progress
+    return child.status, DOWNLOAD_WEIGHT + (1 - DOWNLOAD_WEIGHT) * progress
+
+def get_batch_status(store: JobStore, batch_id: str) -> Optional[BatchStatus]:
+    """Summarize the jobs of a batch, or None if the batch is unknown"""
+    jobs = store.list_jobs(batch_id=batch_id)
+    if not jobs:
+        return None
+    children = {job.parent_id: job for job in jobs if job.parent_id}
+    counts = {DONE: 0, FAILED: 0, CANCELLED: 0, RUNNING: 0, QUEUED: 0}
+    total_progress = 0.0
+    roots = [job for job in jobs if not job.parent_id]
+    for root in roots:
+        status, progress = _item_state(root, children.get(root.id))
+        counts[status] += 1
+        total_progress += progress
+
+    started = min(job.created for job in jobs)
+    last_update = max(job.updated for job in jobs)
+    finished = counts[DONE] + counts[FAILED] + counts[CANCELLED]
+    end = last_update if finished == len(roots) else time.time()
+    elapsed = max(end - started, 1e-6)
+    # Partial progress counts too, so the rate is meaningful before the first track completes
+    throughput = total_progress / elapsed * 60
+    remaining = len(roots) - total_progress
+    eta = remaining / total_progress * elapsed if total_progress > 0 else None
+    return BatchStatus(
+        batch_id=batch_id,
+        total=len(roots),
+        done=counts[DONE],
+        failed=counts[FAILED],
+        cancelled=counts[CANCELLED],
+        running=counts[RUNNING],
+        queued=counts[QUEUED],
+        progress=total_progress / len(roots),
+        elapsed=elapsed,
+        throughput=throughput,
+        eta=eta if finished < len(roots) else 0.0,
+    )
+
+def describe_status(status: BatchStatus) -> str:
+    return (f"{status.done}/{status.total} done, {status.failed} failed, "
+            f"{status.running} running, {status.queued} queued | "
+            f"{status.throughput:.2f} tracks/min | ETA {format_duration(status.eta)}")
+
+# ─── CLI ─────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Download and separate many tracks at once")
+    parser.add_argument("sources", nargs="+",
+                        help="YouTube URLs or playlists, audio files, folders, or .txt/.m3u lists")
+    parser.add_argument("--out", required=True, help="folder for downloads and stems")
+    parser.add_argument("--model", choices=[AUTO_MODEL, *MODELS], default=None,
+                        help="separation model (default: MUSIC_TOOLS_SEPARATION_MODEL or htdemucs)")
+    parser.add_argument("--two-stems", metavar="STEM", default=None,
+                        help="only keep STEM and its accompaniment (e.g. vocals for karaoke)")
+    parser.add_argument("--wait", action="store_true", help="wait for the batch and print progress")
+    parser.add_argument("--no-worker", action="store_true",
+                        help="only queue jobs; don't start a background worker")
+    args = parser.parse_args()
+
+    from music_tools.worker import ensure_worker_running
+
+    store = JobStore()
+    os.makedirs(args.out, exist_ok=True)
+    try:
+        batch_id, count = submit_batch(store, args.sources, os.path.abspath(args.out), args.model,
+                                       args.two_stems)
+    except (ValueError, subprocess.CalledProcessError) as e:
+        sys.exit(f"❌ {e}")
+    print(f"📦 Batch {batch_id}: {count} tracks queued")
+    if not args.no_worker:
+        ensure_worker_running(store)
+    if not args.wait:
+        return
+
+    try:
+        while True:
+            status = get_batch_status(store, batch_id)
+            print(f"\r{describe_status(status):<100}", end="", flush=True)
+            if status.finished:
+                break
+            if not args.no_worker:
+                ensure_worker_running(store)
+            time.sleep(2)
+    except KeyboardInterrupt:
+        store.cancel_batch(batch_id)
+        print("\n🛑 Batch cancelled")
+        sys.exit(130)
+    print()
+    for job in store.list_jobs((FAILED,), batch_id=batch_id):
+        print(f"❌ {job.params.get('url') or job.params.get('input_path')}: {job.error}")
+    sys.exit(1 if status.failed else 0)
+
+if __name__ == "__main__":
+    main()
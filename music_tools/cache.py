@@ -0,0 +1,323 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from music_tools.config import get_float_env, get_int_env
+
+# ─── Configuration ─────────────────────────────────────────────
+
+CACHE_DIR_ENV = "MUSIC_TOOLS_CACHE_DIR"
+CACHE_MAX_MB_ENV = "MUSIC_TOOLS_CACHE_MAX_MB"
+DOWNLOAD_CACHE_MAX_MB_ENV = "MUSIC_TOOLS_DOWNLOAD_CACHE_MAX_MB"
+DOWNLOAD_CACHE_MAX_DAYS_ENV = "MUSIC_TOOLS_DOWNLOAD_CACHE_MAX_DAYS"
+
+DEFAULT_CACHE_DIR = str(Path.home() / ".cache" / "music_tools")
+DEFAULT_CACHE_MAX_MB = 5000
+DEFAULT_DOWNLOAD_CACHE_MAX_MB = 2000
+DEFAULT_DOWNLOAD_CACHE_MAX_DAYS = 30
+
+HASH_CHUNK_SIZE = 1024 * 1024
+META_FILE = "meta.json"
+
+# ─── Helpers ─────────────────────────────────────────────
+
+def get_cache_root() -> str:
+    """Root folder for cached results and other persistent state"""
+    return os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def dir_size(path: str) -> int:
+    """Total size in bytes of the files under a directory"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+# Linux FICLONE ioctl: copy-on-write clone on btrfs, XFS and similar
+FICLONE = 0x40049409
+
+def reflink(src: str, dst: str) -> bool:
+    """Clone src to dst sharing data blocks; False when the filesystem can't"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError as e:
+        if os.path.exists(dst):
+            os.remove(dst)
+        if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+            return False
+        raise
+    shutil.copystat(src, dst)
+    return True
+
+def link_or_copy(src: str, dst: str):
+    """Place a file at dst with a reflink or hard link when possible, copying otherwise"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    if reflink(src, dst):
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+# ─── Derived Files ─────────────────────────────────────────────
+
+def is_current(target: str, source_path: str) -> bool:
+    """Whether a file derived from source_path (a transcode, its peaks) is newer than it"""
+    try:
+        return os.path.getmtime(target) >= os.path.getmtime(source_path)
+    except OSError:
+        return False
+
+_target_locks: dict[str, threading.Lock] = {}
+_target_locks_lock = threading.Lock()
+
+def target_lock(target: str) -> threading.Lock:
+    """Lock held while a derived file is written, so concurrent requests build it once"""
+    with _target_locks_lock:
+        return _target_locks.setdefault(target, threading.Lock())
+
+# ─── On-Disk Entry Cache ─────────────────────────────────────────────
+
+class EntryCache:
+    """Folder-per-key cache with shared hit/miss counters and LRU/age eviction"""
+
+    namespace = "entries"
+
+    def __init__(self, root: str, max_bytes: int, max_age: float = 0):
+        self.root = os.path.join(root, self.namespace)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.root, exist_ok=True)
+        # Counters live on disk so the app and background workers share them
+        self._counters_path = os.path.join(self.root, "counters.sqlite3")
+        with self._counters() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _counters(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._counters_path, timeout=30, isolation_level=None)
+
+    def _bump(self, name: str, amount: int = 1):
+        with self._counters() as conn:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, amount),
+            )
+
+    def counters(self) -> dict[str, int]:
+        with self._counters() as conn:
+            rows = conn.execute("SELECT name, value FROM counters").fetchall()
+        return {"hits": 0, "misses": 0, "evictions": 0, **dict(rows)}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Return the entry folder for a key (counting a hit or miss), or None"""
+        entry = self._entry_path(key)
+        meta_path = os.path.join(entry, META_FILE)
+        if os.path.exists(meta_path) and not self._expired(os.path.getmtime(meta_path)):
+            # Touch the entry so eviction is least-recently-used
+            try:
+                os.utime(meta_path)
+            except OSError:
+                pass
+            self._bump("hits")
+            return entry
+        self._bump("misses")
+        return None
+
+    def _store(self, key: str, fill: Callable[[str], None], info: Optional[dict] = None) -> str:
+        """Build an entry with fill(staging_dir), move it into place and return its folder"""
+        entry = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+        # Build the entry next to its final location, then rename into place
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(entry))
+        try:
+            fill(staging)
+            meta = dict(info or {}, key=key, size=dir_size(staging), created=time.time())
+            with open(os.path.join(staging, META_FILE), "w") as f:
+                json.dump(meta, f)
+            meta_path = os.path.join(entry, META_FILE)
+            if os.path.exists(meta_path) and self._expired(os.path.getmtime(meta_path)):
+                # Refreshing an expired entry
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Another job stored the same key first; keep theirs
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.evict(keep=key)
+        return entry
+
+    def _expired(self, last_used: float) -> bool:
+        return self.max_age > 0 and time.time() - last_used > self.max_age
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """List (last_used, size, path) for every complete entry"""
+        entries = []
+        for prefix in os.listdir(self.root):
+            prefix_path = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for name in os.listdir(prefix_path):
+                if name.startswith("."):
+                    continue  # entry still being written
+                meta_path = os.path.join(prefix_path, name, META_FILE)
+                try:
+                    with open(meta_path) as f:
+                        size = json.load(f).get("size", 0)
+                    entries.append((os.path.getmtime(meta_path), size, os.path.join(prefix_path, name)))
+                except (OSError, ValueError):
+                    continue
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove expired entries, then least-recently-used ones until the cache fits its size limit"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for last_used, size, path in entries:
+            if total <= self.max_bytes and not self._expired(last_used):
+                break
+            if keep and os.path.basename(path) == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            self._bump("evictions", removed)
+        return removed
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size of the cache"""
+        entries = self._entries()
+        return {
+            **self.counters(),
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "root": self.root,
+        }
+
+# ─── Content-Addressed Separation Cache ─────────────────────────────────────────────
+
+class SeparationCache(EntryCache):
+    """On-disk cache of separated stems keyed by audio hash, model and settings"""
+
+    namespace = "separation"
+
+    def make_key(self, input_audio_path: str, model: str, params: dict) -> str:
+        """Build the cache key for an input file and separation settings"""
+        payload = json.dumps(
+            {"audio": hash_file(input_audio_path), "model": model, "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached stems folder for a key, or None on a miss"""
+        entry = self._lookup(key)
+        return os.path.join(entry, "stems") if entry else None
+
+    def put(self, key: str, stems_folder: str, info: Optional[dict] = None) -> str:
+        """Store a stems folder and return the cached copy's path"""
+        entry = self._store(
+            key, lambda staging: shutil.copytree(stems_folder, os.path.join(staging, "stems")), info
+        )
+        return os.path.join(entry, "stems")
+
+# ─── Download Cache ─────────────────────────────────────────────
+
+class DownloadCache(EntryCache):
+    """On-disk cache of downloaded MP3s keyed by video ID and audio format/quality"""
+
+    namespace = "downloads"
+
+    def make_key(self, video_id: str, audio_format: str, quality: str) -> str:
+        """Build the cache key for a video and output settings"""
+        payload = json.dumps({"video": video_id, "format": audio_format, "quality": quality},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached audio file for a key, or None on a miss"""
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        with open(os.path.join(entry, META_FILE)) as f:
+            path = os.path.join(entry, json.load(f)["file"])
+        return path if os.path.exists(path) else None
+
+    def put(self, key: str, audio_path: str, info: Optional[dict] = None) -> str:
+        """Store an audio file (hard-linked when possible) and return the cached copy's path"""
+        name = os.path.basename(audio_path)
+        entry = self._store(
+            key, lambda staging: link_or_copy(audio_path, os.path.join(staging, name)),
+            dict(info or {}, file=name),
+        )
+        return os.path.join(entry, name)
+
+_cache: Optional[SeparationCache] = None
+_download_cache: Optional[DownloadCache] = None
+_cache_lock = threading.Lock()
+
+def get_separation_cache() -> Optional[SeparationCache]:
+    """Get the process-wide separation cache, or None when disabled"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = get_int_env(CACHE_MAX_MB_ENV, DEFAULT_CACHE_MAX_MB, minimum=0)
+            try:
+                _cache = SeparationCache(get_cache_root(), max_mb * 1024 * 1024)
+            except OSError:
+                _cache = SeparationCache(tempfile.gettempdir(), 0)
+        return _cache if _cache.enabled else None
+
+def get_download_cache() -> Optional[DownloadCache]:
+    """Get the process-wide download cache, or None when disabled"""
+    global _download_cache
+    with _cache_lock:
+        if _download_cache is None:
+            max_mb = get_float_env(DOWNLOAD_CACHE_MAX_MB_ENV, DEFAULT_DOWNLOAD_CACHE_MAX_MB)
+            max_days = get_float_env(DOWNLOAD_CACHE_MAX_DAYS_ENV, DEFAULT_DOWNLOAD_CACHE_MAX_DAYS)
+            try:
+                _download_cache = DownloadCache(get_cache_root(), int(max_mb * 1024 * 1024),
+                                                max_age=max_days * 86400)
+            except OSError:
+                _download_cache = DownloadCache(tempfile.gettempdir(), 0)
+        return _download_cache if _download_cache.enabled else None
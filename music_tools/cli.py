@@ -0,0 +1,206 @@
+"""
+Command-line interface
+Runs the YouTube → MP3 → stems pipeline without Streamlit.
+
+Usage:
+    python -m music_tools download URL [URL ...] [--out DIR] [--concurrency N]
+    python -m music_tools separate FILE [--out DIR] [--model NAME] [--two-stems STEM]
+    python -m music_tools run URL [--out DIR] [--model NAME] [--two-stems STEM]
+    python -m music_tools mix STEMS_DIR [STEMS_DIR ...] --preset karaoke [--gain vocals=0.5] [--format flac]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from music_tools.downloader import DownloadError
+
+# Pipeline modules are imported inside the commands so `--help` stays instant
+# and download-only runs never load the separation stack
+
+def cmd_download(args) -> int:
+    from music_tools.cache import get_download_cache
+    from music_tools.pipeline import download_many
+
+    os.makedirs(args.out, exist_ok=True)
+    cache = None if args.no_cache else get_download_cache()
+    downloaded, failures = download_many(args.urls, args.out, cache, args.concurrency)
+    for url in args.urls:
+        if url in downloaded:
+            print(downloaded[url].path)
+        else:
+            print(f"❌ {url}: {failures[url]}", file=sys.stderr)
+    return 1 if failures else 0
+
+def print_progress(fraction: float, message: str):
+    """Redraw a one-line status on the terminal"""
+    print(f"\r\033[K{message}", end="", file=sys.stderr, flush=True)
+
+def cmd_separate(args, input_path: str = None) -> int:
+    from music_tools.cache import get_separation_cache
+    from music_tools.cpu import get_cpu_quota, get_separation_threads, limit_threads
+    from music_tools.pipeline import StemConversionError, separate_to_mp3
+    from music_tools.separation import get_model_profile, output_stems, resolve_model
+
+    # Nothing else is queued behind a CLI run; "auto" only looks at the CPU limit
+    try:
+        model = resolve_model(args.model, 0, get_cpu_quota())
+        output_stems(get_model_profile(model).sources, args.two_stems)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    input_path = input_path or args.file
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    os.makedirs(args.out, exist_ok=True)
+    cache = None if args.no_cache else get_separation_cache()
+    limit_threads(get_separation_threads())
+    progress = print_progress if sys.stderr.isatty() else None
+    try:
+        stems = separate_to_mp3(input_path, args.out, base_name, cache=cache, progress=progress,
+                                model=model, two_stems=args.two_stems)
+    except StemConversionError as e:
+        for path in e.converted:
+            print(path)
+        for stem_name, error in e.failures.items():
+            print(f"❌ Could not convert {stem_name}: {error}", file=sys.stderr)
+        return 1
+    finally:
+        if progress:
+            print(file=sys.stderr)
+    for path in stems:
+        print(path)
+    return 0
+
+def cmd_run(args) -> int:
+    from music_tools.cache import get_download_cache
+    from music_tools.pipeline import download_audio
+
+    os.makedirs(args.out, exist_ok=True)
+    mp3_path = download_audio(args.url, args.out, None if args.no_cache else get_download_cache()).path
+    print(mp3_path)
+    return cmd_separate(args, mp3_path)
+
+def parse_gains(values: list[str]) -> dict[str, float]:
+    """ROLE=GAIN pairs, e.g. vocals=0 or drums=0.5"""
+    gains = {}
+    for value in values:
+        role, _, gain = value.partition("=")
+        try:
+            gains[role.strip().lower()] = float(gain)
+        except ValueError:
+            raise SystemExit(f"❌ Invalid gain {value!r}; expected STEM=GAIN")
+    return gains
+
+def cmd_mix(args) -> int:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from music_tools.cpu import get_cpu_quota
+    from music_tools.mixdown import (
+        MIX_DIR, MixError, find_stems, mix_base_name, mix_extension, preset_gains, render_mix, stem_role,
+    )
+
+    custom = parse_gains(args.gain)
+    if not args.preset and not custom:
+        print("❌ Pass at least one --preset or --gain", file=sys.stderr)
+        return 2
+    try:
+        extension = mix_extension(args.format)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    # One render per (folder, mix); each decodes its stems in parallel already
+    renders = []
+    missing = False
+    for folder in args.folders:
+        stems = find_stems(folder) if os.path.isdir(folder) else []
+        if not stems:
+            print(f"❌ {folder}: no stems found", file=sys.stderr)
+            missing = True
+            continue
+        out_dir = args.out or os.path.join(folder, MIX_DIR)
+        base_name = mix_base_name(stems)
+        try:
+            mixes = {preset: preset_gains(preset, stems) for preset in args.preset}
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+        if custom:
+            mixes["custom"] = {path: custom.get(stem_role(path), 1.0) for path in stems}
+        for name, gains in mixes.items():
+            renders.append((gains, os.path.join(out_dir, f"{base_name}_{name}.{extension}")))
+
+    def render(job):
+        gains, path = job
+        try:
+            return render_mix(gains, path, args.format), None
+        except MixError as e:
+            return None, f"{path}: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs or get_cpu_quota())) as pool:
+        results = list(pool.map(render, renders))
+    for result, error in results:
+        if error:
+            print(f"❌ {error}", file=sys.stderr)
+        else:
+            limited = f" (limited {result.gain_reduction_db:.1f} dB)" if result.gain_reduction_db >= 0.1 else ""
+            print(f"{result.path}{limited}")
+    return 1 if missing or any(error for _, error in results) else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m music_tools",
+                                     description="YouTube → MP3 → stems pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    download = subparsers.add_parser("download", help="download YouTube URLs as MP3")
+    download.add_argument("urls", nargs="+", metavar="url")
+    download.add_argument("--concurrency", type=int, default=None,
+                          help="simultaneous downloads (default: MUSIC_TOOLS_DOWNLOAD_CONCURRENCY or 4)")
+    download.set_defaults(func=cmd_download)
+
+    separate = subparsers.add_parser("separate", help="separate an audio file into MP3 stems")
+    separate.add_argument("file")
+    separate.set_defaults(func=cmd_separate)
+
+    run = subparsers.add_parser("run", help="download a YouTube URL and separate it into MP3 stems")
+    run.add_argument("url")
+    run.set_defaults(func=cmd_run)
+
+    mix = subparsers.add_parser("mix", help="render practice mixes (karaoke, drumless, ...) from stem folders")
+    mix.add_argument("folders", nargs="+", metavar="stems_dir")
+    mix.add_argument("--preset", action="append", default=[],
+                     help="karaoke, drumless, bassless or a-cappella; repeat for several")
+    mix.add_argument("--gain", action="append", default=[], metavar="STEM=GAIN",
+                     help="custom mix gain, e.g. vocals=0.3 (unlisted stems stay at 1); rendered as <song>_custom")
+    mix.add_argument("--format", default="mp3", help="wav, mp3, flac, opus or aac, optionally with a bitrate (opus:64k)")
+    mix.add_argument("--out", default=None, help="output folder (default: a mixes folder inside each stems folder)")
+    mix.add_argument("--jobs", type=int, default=None, help="mixes rendered at once (default: CPU quota)")
+    mix.set_defaults(func=cmd_mix)
+
+    for subparser in (download, separate, run):
+        subparser.add_argument("--out", default=os.getcwd(), help="output folder (default: current folder)")
+    for subparser in (download, separate, run):
+        subparser.add_argument("--no-cache", action="store_true", help="don't use the download/separation caches")
+    for subparser in (separate, run):
+        subparser.add_argument("--model", default=None,
+                               help="htdemucs, htdemucs_ft, htdemucs_6s, mdx_extra or auto "
+                                    "(default: MUSIC_TOOLS_SEPARATION_MODEL or htdemucs)")
+        subparser.add_argument("--two-stems", metavar="STEM", default=None,
+                               help="only write STEM and no_STEM, e.g. vocals for a karaoke track")
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        result = args.func(args)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ {e.cmd[0]} failed with exit code {e.returncode}", file=sys.stderr)
+        return 1
+    except (FileNotFoundError, DownloadError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return result if isinstance(result, int) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
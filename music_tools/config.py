@@ -0,0 +1,20 @@
+import os
+from typing import Optional
+
+# ─── Environment Settings ─────────────────────────────────────────────
+
+def get_int_env(name: str, default: int, minimum: Optional[int] = 1) -> int:
+    """Integer setting from the environment; default when unset or invalid, raised to minimum"""
+    try:
+        value = int(os.environ.get(name, default))
+    except ValueError:
+        value = default
+    return value if minimum is None else max(minimum, value)
+
+def get_float_env(name: str, default: float, minimum: Optional[float] = 0.0) -> float:
+    """Number setting from the environment; default when unset or invalid, raised to minimum"""
+    try:
+        value = float(os.environ.get(name, default))
+    except ValueError:
+        value = default
+    return value if minimum is None else max(minimum, value)
@@ -0,0 +1,85 @@
+import os
+import sys
+
+from music_tools.config import get_int_env
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Threads one separation may use; unset (or 0) means an even share of the CPU
+# quota between the separations that run at the same time
+SEPARATION_THREADS_ENV = "MUSIC_TOOLS_SEPARATION_THREADS"
+
+# Read by OpenMP, MKL, OpenBLAS and friends when they start, in this process
+# and in tools it launches (the demucs CLI, ffmpeg)
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+# ─── CPU Quota ─────────────────────────────────────────────
+
+def get_cpu_quota() -> int:
+    """Get the number of CPUs this process may use, honouring cgroup limits"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return max(1, int(int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1: quota of -1 means unlimited
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+# ─── Thread Limits ─────────────────────────────────────────────
+
+def get_separation_threads(concurrent_jobs: int = 1) -> int:
+    """Threads per separation when concurrent_jobs separations share the CPU quota"""
+    threads = get_int_env(SEPARATION_THREADS_ENV, 0, minimum=0)
+    if threads > 0:
+        return threads
+    return max(1, get_cpu_quota() // max(1, concurrent_jobs))
+
+def limit_threads(threads: int):
+    """Cap the math libraries of this process, and of the tools it starts, at threads
+
+    Thread pools size themselves from the host's core count, not the
+    container's quota; with several separations running that oversubscribes
+    the CPUs and the cgroup throttles all of them. Call before torch is
+    imported: OpenMP reads its limit once, when it starts.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        apply_torch_threads(torch)
+
+def get_thread_limit() -> int:
+    """Thread cap set by limit_threads, or the whole CPU quota when none was set"""
+    threads = get_int_env("OMP_NUM_THREADS", 0, minimum=0)
+    return threads if threads > 0 else get_cpu_quota()
+
+def apply_torch_threads(torch):
+    """Size torch's intra-op and inter-op pools to the thread limit"""
+    threads = get_thread_limit()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        pass  # only settable before torch's first parallel work
@@ -0,0 +1,143 @@
+import importlib.util
+import os
+import re
+import threading
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from music_tools.config import get_int_env
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# "auto" (in-process when yt_dlp is importable), "inprocess" or "subprocess"
+DOWNLOAD_BACKEND_ENV = "MUSIC_TOOLS_DOWNLOAD_BACKEND"
+
+# Maximum number of URLs fetched at the same time by pipeline.download_many
+DOWNLOAD_CONCURRENCY_ENV = "MUSIC_TOOLS_DOWNLOAD_CONCURRENCY"
+DEFAULT_DOWNLOAD_CONCURRENCY = 4
+
+AUDIO_FORMAT = "mp3"
+AUDIO_QUALITY = "0"
+OUTPUT_TEMPLATE = "%(title)s.%(ext)s"
+
+YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com")
+YOUTUBE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# ─── Errors ─────────────────────────────────────────────
+
+class DownloadError(Exception):
+    """Raised when yt-dlp could not fetch or convert a URL"""
+
+# ─── URL Helpers ─────────────────────────────────────────────
+
+def normalize_video_id(url: str) -> str:
+    """Stable identifier for a video, so every URL form of it maps to the same value"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().split(":")[0]
+    for prefix in ("www.", "m.", "music."):
+        host = host.removeprefix(prefix)
+    segments = [s for s in parts.path.split("/") if s]
+
+    video_id = None
+    if host == "youtu.be" and segments:
+        video_id = segments[0]
+    elif host in YOUTUBE_HOSTS:
+        if parts.path == "/watch":
+            video_id = parse_qs(parts.query).get("v", [None])[0]
+        elif len(segments) >= 2 and segments[0] in ("shorts", "embed", "live", "v"):
+            video_id = segments[1]
+    if video_id and YOUTUBE_ID_RE.match(video_id):
+        return f"youtube:{video_id}"
+
+    # Other sites: the URL itself, minus the fragment
+    query = f"?{parts.query}" if parts.query else ""
+    return f"url:{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}{query}"
+
+# ─── In-Process Downloader ─────────────────────────────────────────────
+
+class _SilentLogger:
+    """Swallows yt-dlp output; failures are raised as DownloadError instead"""
+
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+class YtDlpDownloader:
+    """yt-dlp loaded once and reused for every download"""
+
+    def __init__(self, params: Optional[dict] = None):
+        # Heavy imports are deferred until a downloader is actually needed
+        import yt_dlp
+
+        self._yt_dlp = yt_dlp
+        self.params = {
+            "format": "bestaudio/best",
+            "outtmpl": OUTPUT_TEMPLATE,
+            "noplaylist": True,
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+            "logger": _SilentLogger(),
+            "postprocessors": [{
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": AUDIO_FORMAT,
+                "preferredquality": AUDIO_QUALITY,
+            }],
+        }
+        self.params.update(params or {})
+        # YoutubeDL keeps per-download state, so each thread gets its own
+        # instance; extractors stay initialized across downloads
+        self._local = threading.local()
+
+    def _instance(self, output_dir: str):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl = self._yt_dlp.YoutubeDL(dict(self.params))
+            self._local.ydl = ydl
+        ydl.params["paths"] = {"home": output_dir, "temp": output_dir}
+        return ydl
+
+    def download(self, url: str, output_dir: str) -> str:
+        """Download one URL as MP3 into output_dir and return the file path"""
+        ydl = self._instance(output_dir)
+        try:
+            info = ydl.extract_info(url, download=True)
+        except self._yt_dlp.utils.DownloadError as e:
+            raise DownloadError(str(e)) from e
+        downloads = (info or {}).get("requested_downloads") or []
+        if not downloads or not os.path.exists(downloads[-1]["filepath"]):
+            raise DownloadError(f"yt-dlp produced no file for {url}")
+        return downloads[-1]["filepath"]
+
+_downloader: Optional[YtDlpDownloader] = None
+_downloader_lock = threading.Lock()
+
+def get_downloader() -> YtDlpDownloader:
+    """Get the process-wide downloader, creating it on first use"""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = YtDlpDownloader()
+        return _downloader
+
+def get_download_concurrency() -> int:
+    """Get the configured number of simultaneous downloads"""
+    return get_int_env(DOWNLOAD_CONCURRENCY_ENV, DEFAULT_DOWNLOAD_CONCURRENCY)
+
+def inprocess_available() -> bool:
+    """Check whether yt_dlp can be imported in this process"""
+    return importlib.util.find_spec("yt_dlp") is not None
+
+def get_download_backend() -> str:
+    """Resolve the configured download backend"""
+    backend = os.environ.get(DOWNLOAD_BACKEND_ENV, "auto").strip().lower()
+    if backend not in ("auto", "inprocess", "subprocess"):
+        backend = "auto"
+    if backend == "auto":
+        return "inprocess" if inprocess_available() else "subprocess"
+    return backend
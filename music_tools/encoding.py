@@ -0,0 +1,238 @@
+import os
+import struct
+import subprocess
+import tempfile
+import wave
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# ─── Configuration ─────────────────────────────────────────────
+
+MP3_BITRATE = "320k"
+
+# Rate that files are decoded at when the caller doesn't ask for one
+DECODE_SAMPLERATE = 44100
+
+# ─── Streaming Encoders ─────────────────────────────────────────────
+
+class PipeEncoder:
+    """ffmpeg encoder fed with float PCM over stdin; codec_args pick the output codec"""
+
+    def __init__(self, path: str, samplerate: int, channels: int, codec_args: list[str],
+                 scale: float = 1.0):
+        self.path = path
+        self.scale = scale
+        self.error: Optional[str] = None
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error",
+            "-f", "f32le", "-ar", str(samplerate), "-ac", str(channels), "-i", "pipe:0",
+            *codec_args, "-y", path,
+        ]
+        # stderr goes to a file so a chatty ffmpeg can never block our writes
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._process = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr
+            )
+        except OSError as e:
+            self._process = None
+            self.error = str(e)
+
+    def write(self, chunk: "np.ndarray"):
+        """Append a (channels, samples) block"""
+        import numpy as np
+
+        if self._process is None or self.error:
+            return
+        data = np.ascontiguousarray((chunk * self.scale).T, dtype="<f4")
+        try:
+            self._process.stdin.write(data.tobytes())
+        except BrokenPipeError:
+            self.error = "ffmpeg stopped reading its input"
+
+    def close(self) -> Optional[str]:
+        """Finish encoding and return an error message on failure"""
+        if self._process is None:
+            self._stderr.close()
+            return self.error
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._process.wait()
+        self._stderr.seek(0)
+        lines = self._stderr.read().decode(errors="replace").strip().splitlines()
+        self._stderr.close()
+        if returncode != 0:
+            self.error = lines[-1] if lines else f"ffmpeg exited with status {returncode}"
+        elif not os.path.exists(self.path):
+            self.error = "ffmpeg produced no output file"
+        return self.error
+
+class Mp3PipeEncoder(PipeEncoder):
+    """ffmpeg MP3 encoder fed with float PCM over stdin"""
+
+    def __init__(self, mp3_path: str, samplerate: int, channels: int, scale: float = 1.0):
+        super().__init__(mp3_path, samplerate, channels,
+                         ["-acodec", "libmp3lame", "-b:a", MP3_BITRATE], scale)
+
+class WavWriter:
+    """16-bit PCM WAV writer for (channels, samples) float blocks"""
+
+    def __init__(self, wav_path: str, samplerate: int, channels: int, scale: float = 1.0):
+        self.scale = scale
+        self._wav = wave.open(wav_path, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(samplerate)
+
+    def write(self, chunk: "np.ndarray"):
+        import numpy as np
+
+        data = np.clip(chunk.T * self.scale, -1.0, 1.0)
+        self._wav.writeframes((data * 32767).astype("<i2").tobytes())
+
+    def close(self) -> Optional[str]:
+        self._wav.close()
+        return None
+
+def rescale_factor(peak: float) -> float:
+    """Gain that keeps a signal within [-1, 1], like the demucs CLI's "rescale" clip mode"""
+    return 1.0 / max(1.01 * peak, 1.0)
+
+# ─── Streaming Decoders ─────────────────────────────────────────────
+
+class DecodeError(Exception):
+    """Raised when ffmpeg could not decode a file"""
+
+# (format tag, bits per sample) -> sample dtype and full-scale value
+WAV_SAMPLE_TYPES = {
+    (1, 16): ("<i2", 32768.0),
+    (1, 32): ("<i4", 2147483648.0),
+    (3, 32): ("<f4", 1.0),
+    (3, 64): ("<f8", 1.0),
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+@dataclass(frozen=True)
+class WavLayout:
+    """Where the samples of a PCM WAV file are and how they are stored"""
+    dtype: str
+    full_scale: float
+    channels: int
+    samplerate: int
+    offset: int
+    frames: int
+
+def wav_layout(path: str) -> Optional[WavLayout]:
+    """Sample layout of a PCM WAV file, or None when NumPy can't map it directly"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                return None
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+                if chunk_id == b"data":
+                    offset = f.tell()
+                    break
+                data = f.read(size + (size & 1))  # chunks are word-aligned
+                if chunk_id == b"fmt ":
+                    fmt = data[:size]
+            file_size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return None
+    if fmt is None or len(fmt) < 16:
+        return None
+    tag, channels, samplerate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    sample_type = WAV_SAMPLE_TYPES.get((tag, bits))
+    if sample_type is None or not channels or not samplerate:
+        return None
+    dtype, full_scale = sample_type
+    # Streamed writers may leave the size unset, so trust the file length instead
+    size = min(size, file_size - offset) if size else file_size - offset
+    frames = size // (channels * int(dtype[-1]))
+    return WavLayout(dtype, full_scale, channels, samplerate, offset, frames)
+
+class PcmReader:
+    """Reads an audio file as float32 (frames, channels) blocks without loading it whole
+
+    PCM WAV files already at the wanted rate and channel count are
+    memory-mapped; anything else is decoded by ffmpeg through a pipe.
+    """
+
+    def __init__(self, path: str, samplerate: Optional[int] = None, channels: Optional[int] = None):
+        self.path = path
+        layout = wav_layout(path)
+        if (layout is not None and samplerate in (None, layout.samplerate)
+                and channels in (None, layout.channels)):
+            self.layout: Optional[WavLayout] = layout
+            self.samplerate = layout.samplerate
+            self.channels = layout.channels
+        else:
+            self.layout = None
+            self.samplerate = samplerate or DECODE_SAMPLERATE
+            self.channels = channels or 2
+
+    def blocks(self, block_frames: int) -> Iterator["np.ndarray"]:
+        """Yield blocks of block_frames frames (the last one may be shorter)"""
+        if self.layout is not None:
+            return self._mapped_blocks(block_frames)
+        return self._decoded_blocks(block_frames)
+
+    def _mapped_blocks(self, block_frames: int) -> Iterator["np.ndarray"]:
+        import numpy as np
+
+        layout = self.layout
+        if not layout.frames:
+            return
+        pcm = np.memmap(self.path, dtype=layout.dtype, mode="r", offset=layout.offset,
+                        shape=(layout.frames, layout.channels))
+        scale = np.float32(1.0 / layout.full_scale)
+        for start in range(0, layout.frames, block_frames):
+            yield np.asarray(pcm[start:start + block_frames], dtype=np.float32) * scale
+        del pcm
+
+    def _decoded_blocks(self, block_frames: int) -> Iterator["np.ndarray"]:
+        import numpy as np
+
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error",
+            "-i", self.path, "-vn", "-f", "f32le",
+            "-ac", str(self.channels), "-ar", str(self.samplerate), "pipe:1",
+        ]
+        frame_bytes = self.channels * 4
+        # stderr goes to a file so a chatty ffmpeg can never block on it
+        with tempfile.TemporaryFile() as stderr:
+            try:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+            except OSError as e:
+                raise DecodeError(str(e)) from e
+            finished = False
+            try:
+                while True:
+                    data = process.stdout.read(block_frames * frame_bytes)
+                    if not data:
+                        break
+                    usable = len(data) - len(data) % frame_bytes
+                    yield np.frombuffer(data[:usable], dtype="<f4").reshape(-1, self.channels)
+                finished = True
+            finally:
+                if not finished:
+                    # Consumer stopped early or failed: don't wait for the rest of the file
+                    process.kill()
+                process.stdout.close()
+                returncode = process.wait()
+            if returncode != 0:
+                stderr.seek(0)
+                lines = stderr.read().decode(errors="replace").strip().splitlines()
+                raise DecodeError(lines[-1] if lines else f"ffmpeg exited with status {returncode}")
@@ -0,0 +1,175 @@
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from music_tools.cache import is_current, target_lock
+from music_tools.encoding import MP3_BITRATE
+from music_tools.metrics import run_process
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Formats the player may stream, best first; "name" or "name:bitrate" (e.g. "opus:64k")
+PLAYER_FORMATS_ENV = "MUSIC_TOOLS_PLAYER_FORMATS"
+DEFAULT_PLAYER_FORMATS = "opus,aac,mp3"
+
+# Transcodes are cached in this folder next to the stems they were made from
+TRANSCODE_DIR = ".transcodes"
+
+BITRATE_RE = re.compile(r"^\d{1,4}k$")
+
+# ─── Formats ─────────────────────────────────────────────
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg could not produce a requested format"""
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """An output codec, its container and the MIME type browsers know it by"""
+    name: str
+    extension: str
+    mime: str
+    codec: str
+    bitrate: Optional[str] = None
+    extra_args: tuple = ()
+
+    @property
+    def label(self) -> str:
+        """Name plus bitrate, unique per encoding setting"""
+        return f"{self.name}-{self.bitrate}" if self.bitrate else self.name
+
+    @property
+    def spec(self) -> str:
+        """The "name:bitrate" string get_format parses back into this format"""
+        return f"{self.name}:{self.bitrate}" if self.bitrate else self.name
+
+    @property
+    def content_type(self) -> str:
+        return self.mime.split(";")[0]
+
+    def ffmpeg_args(self) -> list[str]:
+        args = ["-vn", "-acodec", self.codec]
+        if self.bitrate:
+            args += ["-b:a", self.bitrate]
+        return args + list(self.extra_args)
+
+FORMATS = {
+    "mp3": AudioFormat("mp3", "mp3", "audio/mpeg", "libmp3lame", MP3_BITRATE),
+    "opus": AudioFormat("opus", "opus", 'audio/ogg; codecs="opus"', "libopus", "96k"),
+    # faststart puts the index first so playback can begin before the download ends
+    "aac": AudioFormat("aac", "m4a", 'audio/mp4; codecs="mp4a.40.2"', "aac", "160k",
+                       ("-movflags", "+faststart")),
+    "flac": AudioFormat("flac", "flac", "audio/flac", "flac"),
+}
+
+def get_format(spec: str) -> AudioFormat:
+    """Look up a format from "name" or "name:bitrate"; raises ValueError for invalid specs"""
+    name, _, bitrate = spec.strip().lower().partition(":")
+    if name not in FORMATS:
+        raise ValueError(f"Unknown audio format: {name}")
+    if bitrate and not BITRATE_RE.match(bitrate):
+        raise ValueError(f"Invalid bitrate: {bitrate}")
+    fmt = FORMATS[name]
+    if bitrate and fmt.bitrate:
+        fmt = replace(fmt, bitrate=bitrate)
+    return fmt
+
+def get_player_formats() -> list[AudioFormat]:
+    """Configured formats for browser playback, in order of preference"""
+    formats = []
+    for spec in os.environ.get(PLAYER_FORMATS_ENV, DEFAULT_PLAYER_FORMATS).split(","):
+        try:
+            formats.append(get_format(spec))
+        except ValueError:
+            continue
+    return formats or [FORMATS["mp3"]]
+
+# ─── Lazy Transcodes ─────────────────────────────────────────────
+
+def transcode_path(source_path: str, fmt: AudioFormat) -> str:
+    """Where the fmt version of a file is cached: <folder>/.transcodes/<name>.<label>.<ext>"""
+    folder, file_name = os.path.split(os.path.abspath(source_path))
+    stem = os.path.splitext(file_name)[0]
+    return os.path.join(folder, TRANSCODE_DIR, f"{stem}.{fmt.label}.{fmt.extension}")
+
+def output_name(source_path: str, fmt: AudioFormat) -> str:
+    """File name to offer for the fmt version of a file"""
+    return f"{os.path.splitext(os.path.basename(source_path))[0]}.{fmt.extension}"
+
+_probes: dict[tuple, tuple[Optional[str], Optional[int]]] = {}
+_probes_lock = threading.Lock()
+
+def probe_codec(path: str) -> tuple[Optional[str], Optional[int]]:
+    """Codec name and bitrate (bits/s) of a file's audio, via ffprobe; cached per mtime"""
+    try:
+        key = (os.path.abspath(path), os.path.getmtime(path))
+    except OSError:
+        return None, None
+    with _probes_lock:
+        if key in _probes:
+            return _probes[key]
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "a:0",
+           "-show_entries", "stream=codec_name,bit_rate", "-of", "default=nw=1", path]
+    try:
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    fields = dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+    bitrate = fields.get("bit_rate", "")
+    result = (fields.get("codec_name") or None, int(bitrate) if bitrate.isdigit() else None)
+    with _probes_lock:
+        _probes[key] = result
+    return result
+
+def is_format(source_path: str, fmt: AudioFormat) -> bool:
+    """Whether a file already is fmt: same container and codec, and same bitrate if fmt has one"""
+    if os.path.splitext(source_path)[1].lower() != f".{fmt.extension}":
+        return False
+    codec, bitrate = probe_codec(source_path)
+    if codec != fmt.name:
+        return False
+    if not fmt.bitrate:
+        return True
+    return bitrate is not None and round(bitrate / 1000) == int(fmt.bitrate[:-1])
+
+def transcode_file(source_path: str, target_path: str, fmt: AudioFormat):
+    """Encode a file into fmt with ffmpeg, raising TranscodeError on failure"""
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error",
+           "-i", source_path, *fmt.ffmpeg_args(), "-y", target_path]
+    try:
+        run_process(cmd, "ffmpeg", capture_output=True, text=True, format=fmt.label)
+    except subprocess.CalledProcessError as e:
+        lines = (e.stderr or "").strip().splitlines()
+        raise TranscodeError(lines[-1] if lines else f"ffmpeg exited with status {e.returncode}") from e
+    except OSError as e:
+        raise TranscodeError(str(e)) from e
+
+def get_transcode(source_path: str, fmt: AudioFormat) -> str:
+    """Path of a file in fmt, transcoding it the first time that format is requested"""
+    if is_format(source_path, fmt):
+        return source_path  # already in that format
+    target = transcode_path(source_path, fmt)
+    if is_current(target, source_path):
+        return target
+
+    # One transcode per target at a time; later requests wait and reuse it
+    with target_lock(target):
+        if is_current(target, source_path):
+            return target
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, partial = tempfile.mkstemp(prefix=".partial-", suffix=f".{fmt.extension}",
+                                           dir=os.path.dirname(target))
+            os.close(fd)
+        except OSError as e:
+            raise TranscodeError(f"Cannot write transcodes next to {source_path}: {e}") from e
+        try:
+            transcode_file(source_path, partial, fmt)
+            os.replace(partial, target)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    return target
@@ -0,0 +1,364 @@
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from music_tools.cache import get_cache_root, get_download_cache, get_separation_cache, link_or_copy
+from music_tools.cpu import get_cpu_quota
+from music_tools.downloader import DownloadError
+from music_tools.metrics import collect_spans, span
+from music_tools.pipeline import StemConversionError, download_audio, separate_to_mp3
+from music_tools.progress import ProgressCallback, scale_progress
+from music_tools.separation import DEFAULT_MODEL, resolve_model
+
+# ─── Configuration ─────────────────────────────────────────────
+
+JOBS_DB_ENV = "MUSIC_TOOLS_JOBS_DB"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# Columns added after the first release, created on older databases at startup
+MIGRATIONS = {
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "batch_id": "TEXT",
+    "parent_id": "TEXT",
+}
+
+# Interrupted jobs are retried (resuming from checkpoints) up to this many runs
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    worker_pid INTEGER,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    batch_id TEXT,
+    parent_id TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS supervisor (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pid INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+def get_jobs_db_path() -> str:
+    """Location of the job database shared by the app and the worker"""
+    return os.environ.get(JOBS_DB_ENV) or os.path.join(get_cache_root(), "jobs.sqlite3")
+
+# ─── Job Store ─────────────────────────────────────────────
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict
+    status: str
+    progress: float
+    message: str
+    result: Optional[dict]
+    error: Optional[str]
+    worker_pid: Optional[int]
+    cancel_requested: bool
+    attempts: int
+    batch_id: Optional[str]
+    parent_id: Optional[str]
+    created: float
+    updated: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            kind=row["kind"],
+            params=json.loads(row["params"]),
+            status=row["status"],
+            progress=row["progress"],
+            message=row["message"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            worker_pid=row["worker_pid"],
+            cancel_requested=bool(row["cancel_requested"]),
+            attempts=row["attempts"],
+            batch_id=row["batch_id"],
+            parent_id=row["parent_id"],
+            created=row["created"],
+            updated=row["updated"],
+        )
+
+class JobStore:
+    """SQLite-backed job queue shared between processes"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_jobs_db_path()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in MIGRATIONS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id: str, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, kind: str, params: dict, batch_id: Optional[str] = None,
+               parent_id: Optional[str] = None) -> str:
+        """Queue a new job and return its ID"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, message, batch_id, parent_id, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), QUEUED, "Waiting for a worker...",
+                 batch_id, parent_id, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def get_many(self, job_ids: list[str]) -> list[Job]:
+        """Fetch jobs in the order of the given IDs, skipping unknown ones"""
+        jobs = [self.get(job_id) for job_id in job_ids]
+        return [job for job in jobs if job is not None]
+
+    def list_jobs(self, statuses: tuple = (), batch_id: Optional[str] = None) -> list[Job]:
+        conditions = []
+        args: tuple = ()
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            args += tuple(statuses)
+        if batch_id is not None:
+            conditions.append("batch_id = ?")
+            args += (batch_id,)
+        query = "SELECT * FROM jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created", args).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def queue_depth(self, kinds: tuple = ()) -> int:
+        """Number of jobs (of the given kinds) waiting for or occupying a worker"""
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)"
+        args: tuple = (QUEUED, RUNNING)
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            args += tuple(kinds)
+        with self._connect() as conn:
+            row = conn.execute(query, args).fetchone()
+        return row[0]
+
+    def claim_next(self, worker_pid: int, kinds: tuple = ()) -> Optional[Job]:
+        """Atomically move the oldest queued job (of the given kinds) to running"""
+        query = "SELECT * FROM jobs WHERE status = ? AND cancel_requested = 0"
+        args: tuple = (QUEUED,)
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            args += tuple(kinds)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(query + " ORDER BY created LIMIT 1", args).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_pid = ?, message = ?, updated = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, worker_pid, "Starting...", time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        return self.get(row["id"])
+
+    def cancel_batch(self, batch_id: str):
+        """Cancel every unfinished job of a batch"""
+        for job in self.list_jobs((QUEUED, RUNNING), batch_id=batch_id):
+            self.request_cancel(job.id)
+
+    def set_progress(self, job_id: str, progress: float, message: str):
+        self._update(job_id, progress=max(0.0, min(1.0, progress)), message=message)
+
+    def finish(self, job_id: str, result: dict):
+        self._update(job_id, status=DONE, progress=1.0, message="Done", result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        self._update(job_id, status=FAILED, message="Failed", error=error)
+
+    def requeue_or_fail(self, job_id: str, error: str):
+        """Put an interrupted job back in the queue, unless it has run out of attempts"""
+        job = self.get(job_id)
+        if job is None:
+            return
+        if job.attempts < MAX_ATTEMPTS and not job.cancel_requested:
+            self._update(job_id, status=QUEUED, worker_pid=None,
+                         message=f"Resuming after interruption ({error})...")
+        else:
+            self.fail(job_id, error)
+
+    def mark_cancelled(self, job_id: str):
+        self._update(job_id, status=CANCELLED, message="Cancelled")
+
+    def request_cancel(self, job_id: str):
+        """Cancel a queued job now, or flag a running one for the supervisor to stop"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated = ? WHERE id = ? AND status = ?",
+                (CANCELLED, "Cancelled", time.time(), job_id, QUEUED),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, message = ?, updated = ? "
+                "WHERE id = ? AND status = ?",
+                ("Cancelling...", time.time(), job_id, RUNNING),
+            )
+
+    # ─── Supervisor heartbeat ─────────────────────────────────
+
+    def register_supervisor(self, pid: int, stale_after: float) -> bool:
+        """Become the active supervisor unless a live one already exists"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT pid, heartbeat FROM supervisor WHERE id = 1").fetchone()
+            if row and row["pid"] != pid and time.time() - row["heartbeat"] < stale_after:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO supervisor (id, pid, heartbeat) VALUES (1, ?, ?)",
+                (pid, time.time()),
+            )
+            conn.execute("COMMIT")
+        return True
+
+    def supervisor_heartbeat(self) -> Optional[float]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT heartbeat FROM supervisor WHERE id = 1").fetchone()
+        return row["heartbeat"] if row else None
+
+# ─── Job Execution ─────────────────────────────────────────────
+
+def run_download_job(params: dict, progress: ProgressCallback) -> dict:
+    """Download a YouTube URL to MP3 and place it in the save folder"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        progress(0.05, "Downloading and converting to MP3...")
+        mp3_path = download_audio(params["url"], tmpdir, cache=get_download_cache()).path
+        progress(0.9, "Saving MP3...")
+        local_mp3_path = os.path.join(params["save_dir"], os.path.basename(mp3_path))
+        link_or_copy(mp3_path, local_mp3_path)
+    return {"mp3_path": local_mp3_path}
+
+def run_separate_job(params: dict, progress: ProgressCallback) -> dict:
+    """Separate an MP3 into stems and convert them to MP3 in the save folder"""
+    input_path = params["input_path"]
+    save_dir = params["save_dir"]
+    model = params.get("model", DEFAULT_MODEL)
+    two_stems = params.get("two_stems")
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    os.makedirs(save_dir, exist_ok=True)
+    progress(0.05, f"Separating stems with {model}...")
+    failures = {}
+    try:
+        stems = separate_to_mp3(input_path, save_dir, base_name, cache=get_separation_cache(),
+                                progress=scale_progress(progress, 0.05, 0.95), model=model,
+                                two_stems=two_stems)
+    except StemConversionError as e:
+        stems, failures = e.converted, e.failures
+    if not stems:
+        raise RuntimeError("No stem files were created")
+    # NumPy is only loaded once a job actually needs it, so the worker starts instantly
+    from music_tools.waveform import WaveformError, get_peaks
+
+    progress(0.95, "Computing waveforms...")
+    for stem in stems:
+        try:
+            get_peaks(stem)
+        except WaveformError:
+            pass  # the player falls back to a plain progress bar
+    return {"stems": stems, "failures": failures, "save_dir": save_dir, "model": model}
+
+JOB_RUNNERS = {
+    "download": run_download_job,
+    "separate": run_separate_job,
+}
+
+TOOL_ERRORS = {
+    "download": "Error downloading from YouTube. Check the URL and try again.",
+    "separate": "Error running Demucs. Make sure Demucs is installed.",
+}
+
+def run_job(store: JobStore, job: Job):
+    """Execute a claimed job and record its outcome"""
+    runner = JOB_RUNNERS.get(job.kind)
+    if runner is None:
+        store.fail(job.id, f"Unknown job type: {job.kind}")
+        return
+
+    def progress(fraction: float, message: str):
+        store.set_progress(job.id, fraction, message)
+
+    params = job.params
+    try:
+        if job.kind == "separate":
+            # "auto" is settled when the job starts, against the queue as it is then
+            params = dict(params, model=resolve_model(params.get("model"),
+                                                      store.queue_depth(("separate",)),
+                                                      get_cpu_quota()))
+        with collect_spans() as spans:
+            with span(f"job.{job.kind}", job_id=job.id):
+                result = runner(params, progress)
+        result["timings"] = [current.to_dict() for current in spans]
+    except (subprocess.CalledProcessError, DownloadError):
+        store.fail(job.id, TOOL_ERRORS[job.kind])
+    except Exception as e:
+        store.fail(job.id, f"{type(e).__name__}: {e}")
+    else:
+        store.finish(job.id, result)
+        # Batch downloads continue straight into separation, one folder per track
+        if job.kind == "download" and job.params.get("stems_dir"):
+            track_name = os.path.splitext(os.path.basename(result["mp3_path"]))[0]
+            store.submit(
+                "separate",
+                {"input_path": result["mp3_path"],
+                 "save_dir": os.path.join(job.params["stems_dir"], track_name),
+                 "model": job.params.get("model"),
+                 "two_stems": job.params.get("two_stems")},
+                batch_id=job.batch_id,
+                parent_id=job.id,
+            )
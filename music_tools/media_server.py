@@ -0,0 +1,315 @@
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from music_tools.config import get_int_env
+from music_tools.formats import AudioFormat, TranscodeError, get_format, get_transcode, output_name
+from music_tools.metrics import render_prometheus
+
+# ─── Configuration ─────────────────────────────────────────────
+
+MEDIA_HOST_ENV = "MUSIC_TOOLS_MEDIA_HOST"
+MEDIA_PORT_ENV = "MUSIC_TOOLS_MEDIA_PORT"
+MEDIA_URL_ENV = "MUSIC_TOOLS_MEDIA_URL"
+
+# "stream" (stems served by URL) or "inline" (base64 data URIs in the page)
+PLAYER_MODE_ENV = "MUSIC_TOOLS_PLAYER_MODE"
+
+# "auto" (/metrics served whenever the media server runs, i.e. in stream mode),
+# "on" (start the media server for /metrics even in inline mode) or "off"
+METRICS_ENDPOINT_ENV = "MUSIC_TOOLS_METRICS_ENDPOINT"
+
+DEFAULT_MEDIA_HOST = "0.0.0.0"
+DEFAULT_MEDIA_PORT = 8502
+
+CHUNK_SIZE = 256 * 1024
+# Compressed audio doesn't shrink any further, so archives just store it
+ZIP_COMPRESSION = zipfile.ZIP_STORED
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# ─── Request Handler ─────────────────────────────────────────────
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serves registered files with HTTP range support, streamed ZIPs of them and /metrics"""
+
+    server: "MediaServer"
+
+    def log_message(self, format, *args):
+        pass  # keep the Streamlit console quiet
+
+    def _resolve(self) -> Optional[str]:
+        # /media/<token>/<filename>
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "media":
+            return None
+        path = self.server.lookup(parts[1])
+        if path is None or os.path.basename(path) != unquote(parts[2]):
+            return None
+        return path if os.path.isfile(path) else None
+
+    def _resolve_bundle(self) -> Optional[tuple[str, list[str]]]:
+        # /zip/<token>/<name>.zip
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "zip":
+            return None
+        bundle = self.server.lookup_bundle(parts[1])
+        if bundle is None or bundle[0] != unquote(parts[2]):
+            return None
+        return bundle
+
+    def _wants_attachment(self) -> bool:
+        return parse_qs(urlsplit(self.path).query).get("download") == ["1"]
+
+    def _requested_format(self) -> Optional[AudioFormat]:
+        # ?format=opus serves (and on first use creates) a transcoded copy
+        spec = parse_qs(urlsplit(self.path).query).get("format", [""])[0]
+        return get_format(spec) if spec else None
+
+    def _send_attachment_header(self, file_name: str):
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(file_name)}")
+
+    def _send_cors_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "Content-Length, Content-Range, Accept-Ranges")
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header("Access-Control-Allow-Headers", "Range")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool):
+        if self.path.startswith("/zip/"):
+            self._serve_zip(send_body)
+            return
+        if urlsplit(self.path).path == "/metrics" and get_metrics_endpoint() != "off":
+            self._serve_metrics(send_body)
+            return
+        path = self._resolve()
+        if path is None:
+            self.send_error(404)
+            return
+        try:
+            fmt = self._requested_format()
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        file_name = os.path.basename(path)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if fmt is not None:
+            file_name = output_name(path, fmt)
+            try:
+                path = get_transcode(path, fmt)
+            except TranscodeError as e:
+                self.send_error(500, str(e))
+                return
+            content_type = fmt.content_type
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header:
+            match = RANGE_RE.match(range_header.strip())
+            if not match or not any(match.groups()):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start = max(0, size - int(last))
+            if start > end or start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "private, max-age=3600")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if self._wants_attachment():
+            self._send_attachment_header(file_name)
+        self._send_cors_headers()
+        self.end_headers()
+        if not send_body:
+            return
+
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the browser cancelled the request while seeking
+
+    def _serve_metrics(self, send_body: bool):
+        # Pipeline stage totals for Prometheus to scrape
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _serve_zip(self, send_body: bool):
+        bundle = self._resolve_bundle()
+        if bundle is None:
+            self.send_error(404)
+            return
+        zip_name, paths = bundle
+        try:
+            fmt = self._requested_format()
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        # Size isn't known up front: the archive is written straight to the
+        # socket and the connection closes when it is complete
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self._send_attachment_header(zip_name)
+        self._send_cors_headers()
+        self.end_headers()
+        if not send_body:
+            return
+
+        try:
+            with zipfile.ZipFile(self.wfile, "w", compression=ZIP_COMPRESSION) as archive:
+                for path in paths:
+                    if not os.path.isfile(path):
+                        continue
+                    name = os.path.basename(path)
+                    if fmt is not None:
+                        name = output_name(path, fmt)
+                        try:
+                            path = get_transcode(path, fmt)
+                        except TranscodeError:
+                            continue  # the archive is already streaming; leave the file out
+                    info = zipfile.ZipInfo.from_file(path, name)
+                    info.compress_type = ZIP_COMPRESSION
+                    with open(path, "rb") as src, archive.open(info, "w") as dest:
+                        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                            dest.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # download cancelled
+
+# ─── Server ─────────────────────────────────────────────
+
+class MediaServer(ThreadingHTTPServer):
+    """Background HTTP server for stem files, addressed by unguessable tokens"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int):
+        super().__init__((host, port), MediaRequestHandler)
+        self._files: dict[str, str] = {}
+        self._tokens: dict[str, str] = {}
+        self._bundles: dict[str, tuple[str, list[str]]] = {}
+        self._bundle_tokens: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def register(self, path: str) -> str:
+        """Make a file available and return its URL path"""
+        path = os.path.abspath(path)
+        with self._lock:
+            token = self._tokens.get(path)
+            if token is None:
+                token = secrets.token_urlsafe(16)
+                self._tokens[path] = token
+                self._files[token] = path
+        return f"/media/{token}/{quote(os.path.basename(path))}"
+
+    def register_bundle(self, paths: list[str], zip_name: str) -> str:
+        """Make a set of files downloadable as one streamed ZIP and return its URL path"""
+        paths = [os.path.abspath(path) for path in paths]
+        key = (zip_name, tuple(paths))
+        with self._lock:
+            token = self._bundle_tokens.get(key)
+            if token is None:
+                token = secrets.token_urlsafe(16)
+                self._bundle_tokens[key] = token
+                self._bundles[token] = (zip_name, paths)
+        return f"/zip/{token}/{quote(zip_name)}"
+
+    def lookup(self, token: str) -> Optional[str]:
+        with self._lock:
+            return self._files.get(token)
+
+    def lookup_bundle(self, token: str) -> Optional[tuple[str, list[str]]]:
+        with self._lock:
+            return self._bundles.get(token)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="media-server", daemon=True)
+        thread.start()
+
+_server: Optional[MediaServer] = None
+_server_lock = threading.Lock()
+
+def get_media_server() -> MediaServer:
+    """Start the process-wide media server on first use"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            host = os.environ.get(MEDIA_HOST_ENV, DEFAULT_MEDIA_HOST)
+            port = get_int_env(MEDIA_PORT_ENV, DEFAULT_MEDIA_PORT, minimum=0)
+            try:
+                _server = MediaServer(host, port)
+            except OSError:
+                # Port taken (e.g. a second app instance): use any free port
+                _server = MediaServer(host, 0)
+            _server.start()
+        return _server
+
+def get_public_media_url() -> Optional[str]:
+    """Externally visible base URL for the media server, if configured"""
+    url = os.environ.get(MEDIA_URL_ENV, "").strip()
+    return url.rstrip("/") or None
+
+def get_player_mode() -> str:
+    """How the player receives stem audio: stream by URL or inline data URIs"""
+    mode = os.environ.get(PLAYER_MODE_ENV, "stream").strip().lower()
+    return mode if mode in ("stream", "inline") else "stream"
+
+def get_metrics_endpoint() -> str:
+    """Whether the media server serves /metrics: auto, on or off"""
+    mode = os.environ.get(METRICS_ENDPOINT_ENV, "auto").strip().lower()
+    return mode if mode in ("auto", "on", "off") else "auto"
+
+def media_server_needed() -> bool:
+    """Whether the app should start the media server at launch: stream mode or /metrics on"""
+    return get_player_mode() == "stream" or get_metrics_endpoint() == "on"
@@ -0,0 +1,415 @@
+import json
+import os
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterator, Optional
+
+from music_tools.cache import get_cache_root
+from music_tools.config import get_float_env
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# JSON-lines file every finished span is appended to; "off" disables it
+METRICS_LOG_ENV = "MUSIC_TOOLS_METRICS_LOG"
+METRICS_LOG_MAX_MB_ENV = "MUSIC_TOOLS_METRICS_LOG_MAX_MB"
+DEFAULT_METRICS_LOG_MAX_MB = 50
+
+METRICS_DB_FILE = "metrics.sqlite3"
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# ─── Resource Snapshots ─────────────────────────────────────────────
+
+def _cpu_seconds() -> float:
+    """CPU time of this process plus its reaped subprocesses"""
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def _peak_rss() -> int:
+    """High-water mark of this process's resident memory, in bytes"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+def _io_bytes() -> tuple[int, int]:
+    """Bytes read and written so far by this process and its reaped subprocesses"""
+    counters = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                counters[name] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters.get("rchar", 0), counters.get("wchar", 0)
+
+# ─── Spans ─────────────────────────────────────────────
+
+@dataclass
+class Span:
+    """Timing and resource use of one pipeline stage or subprocess
+
+    CPU time and bytes are process-wide deltas (including subprocesses that
+    finished inside the span), so stages running concurrently overlap.
+    Subprocess spans report that process's own CPU time and peak RSS;
+    other spans report the process's memory high-water mark.
+    """
+    name: str
+    parent: Optional[str]
+    depth: int
+    started: float
+    wall: float = 0.0
+    cpu: Optional[float] = None
+    peak_rss: Optional[int] = None
+    read_bytes: int = 0
+    write_bytes: int = 0
+    ok: bool = True
+    attrs: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("music_tools_span", default=None)
+_collector: ContextVar[Optional[list]] = ContextVar("music_tools_spans", default=None)
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Measure a block of work and record it when the block exits"""
+    parent = _current_span.get()
+    current = Span(name, parent.name if parent else None,
+                   parent.depth + 1 if parent else 0, time.time(), attrs=attrs)
+    token = _current_span.set(current)
+    cpu_start = _cpu_seconds()
+    read_start, write_start = _io_bytes()
+    wall_start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.ok = False
+        raise
+    finally:
+        _current_span.reset(token)
+        current.wall = time.perf_counter() - wall_start
+        if current.cpu is None:
+            current.cpu = _cpu_seconds() - cpu_start
+        if current.peak_rss is None:
+            current.peak_rss = _peak_rss()
+        read_end, write_end = _io_bytes()
+        current.read_bytes = read_end - read_start
+        current.write_bytes = write_end - write_start
+        record(current)
+
+@contextmanager
+def collect_spans() -> Iterator[list[Span]]:
+    """Gather every span finished inside the block, including those of bound worker threads"""
+    spans: list[Span] = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+def bind_context(fn: Callable) -> Callable:
+    """Wrap fn so spans it records in another thread nest under the caller's"""
+    collector = _collector.get()
+    parent = _current_span.get()
+
+    def wrapper(*args, **kwargs):
+        collector_token = _collector.set(collector)
+        span_token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(span_token)
+            _collector.reset(collector_token)
+    return wrapper
+
+class ProcessStalled(subprocess.SubprocessError):
+    """Raised when a process produced no output for longer than its stall timeout"""
+
+    def __init__(self, cmd: list[str], timeout: float):
+        self.cmd = cmd
+        self.timeout = timeout
+        super().__init__(f"{os.path.basename(cmd[0])} produced no output for {timeout:g}s and was killed")
+
+LINE_BREAK_RE = re.compile(rb"[\r\n]")
+
+# Seconds to keep reading a stalled process's pipes after killing it
+STALLED_READER_GRACE = 5.0
+
+def _drain(pipe, chunks: Optional[list], on_line: Optional[Callable[[str], None]], activity: list):
+    """Read a pipe to EOF, keeping chunks if wanted and passing on each \\r or \\n terminated line"""
+    pending = b""
+    while True:
+        data = pipe.read1(65536)
+        if not data:
+            break
+        activity[0] = time.monotonic()
+        if chunks is not None:
+            chunks.append(data)
+        if on_line is not None:
+            # Progress bars redraw with \r, so treat it as a line break too
+            *lines, pending = LINE_BREAK_RE.split(pending + data)
+            for line in lines:
+                if line:
+                    on_line(line.decode(errors="replace"))
+    if on_line is not None and pending:
+        on_line(pending.decode(errors="replace"))
+
+def _decode(data: bytes) -> str:
+    """Decode captured output the way text=True would, with universal newlines"""
+    return data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+def run_process(cmd: list[str], name: Optional[str] = None, check: bool = True,
+                capture_output: bool = False, text: bool = False,
+                stdout=None, stderr=None, on_line: Optional[Callable[[str], None]] = None,
+                stall_timeout: Optional[float] = None, **attrs) -> subprocess.CompletedProcess:
+    """subprocess.run recorded as a span with the child's own CPU time and peak RSS
+
+    on_line receives every line the process writes to stdout or stderr as it
+    arrives. With a stall_timeout, a process that writes nothing for that many
+    seconds is killed and ProcessStalled is raised.
+    """
+    if capture_output:
+        stdout = stderr = subprocess.PIPE
+    keep = {"stdout": stdout == subprocess.PIPE, "stderr": stderr == subprocess.PIPE}
+    if on_line is not None or stall_timeout:
+        # Output has to be read to be followed, even when the caller doesn't keep it
+        stdout = stderr = subprocess.PIPE
+    with span(name or os.path.basename(cmd[0]), **attrs) as current:
+        process = subprocess.Popen(cmd, stdout=stdout, stderr=stderr)
+        chunks: dict[str, list] = {key: [] for key, wanted in keep.items() if wanted}
+        activity = [time.monotonic()]
+        # Drain pipes in threads so a chatty process never blocks on a full pipe
+        readers = [
+            threading.Thread(target=_drain, args=(pipe, chunks.get(key), on_line, activity), daemon=True)
+            for key, pipe in (("stdout", process.stdout), ("stderr", process.stderr)) if pipe
+        ]
+        for reader in readers:
+            reader.start()
+        exited = threading.Event()
+        stalled = threading.Event()
+        watchdog = None
+        if stall_timeout:
+            def watch():
+                while not exited.wait(min(1.0, stall_timeout)):
+                    if time.monotonic() - activity[0] > stall_timeout:
+                        stalled.set()
+                        # Only the tool itself: the worker's process group must survive
+                        os.kill(process.pid, signal.SIGKILL)
+                        return
+            watchdog = threading.Thread(target=watch, daemon=True)
+            watchdog.start()
+        try:
+            if hasattr(os, "waitid"):
+                # Wait without reaping so the watchdog can never signal a recycled pid
+                os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+            exited.set()
+            if watchdog is not None:
+                watchdog.join()
+            if hasattr(os, "wait4"):
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                current.cpu = usage.ru_utime + usage.ru_stime
+                current.peak_rss = usage.ru_maxrss * RSS_UNIT
+            else:
+                process.wait()
+        except BaseException:
+            exited.set()
+            if process.returncode is None:
+                process.kill()
+                process.wait()
+            raise
+        finally:
+            # A killed tool's own children may still hold its pipes open; don't wait on them
+            for reader in readers:
+                reader.join(timeout=STALLED_READER_GRACE if stalled.is_set() else None)
+            if not any(reader.is_alive() for reader in readers):
+                for pipe in (process.stdout, process.stderr):
+                    if pipe:
+                        pipe.close()
+        if stalled.is_set():
+            current.attrs["stalled"] = True
+            raise ProcessStalled(cmd, stall_timeout)
+        output = {key: b"".join(parts) for key, parts in chunks.items()}
+        if text:
+            output = {key: _decode(data) for key, data in output.items()}
+        result = subprocess.CompletedProcess(cmd, process.returncode,
+                                             output.get("stdout"), output.get("stderr"))
+        if check:
+            result.check_returncode()
+        return result
+
+# ─── In-Process Stall Watchdog ─────────────────────────────────────────────
+
+# Share of one CPU that watched work must keep busy to count as alive between
+# milestones, so a long inference that reports nothing isn't taken for a hang
+BUSY_CPU_SHARE = 0.1
+
+class WorkStalled(RuntimeError):
+    """Raised when in-process work made no progress for longer than its stall timeout"""
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        super().__init__(f"{name} made no progress for {timeout:g}s and was abandoned")
+
+class StallWatchdog:
+    """Stall timeout for work done in this process, which can't be killed like a tool
+
+    run() executes the work in a daemon thread. The work calls beat() at each
+    milestone; when neither a beat nor CPU use is seen for stall_timeout
+    seconds the caller gets WorkStalled and the thread is left to finish (or
+    hang) on its own, its result dropped.
+    """
+
+    def __init__(self, name: str, stall_timeout: Optional[float]):
+        self.name = name
+        self.stall_timeout = stall_timeout
+        self._activity = time.monotonic()
+
+    def beat(self):
+        """Record a milestone"""
+        self._activity = time.monotonic()
+
+    def run(self, fn: Callable, *args):
+        """fn(*args), raising WorkStalled if it stops making progress"""
+        if not self.stall_timeout:
+            return fn(*args)
+        outcome = {}
+
+        def work():
+            try:
+                outcome["result"] = fn(*args)
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=bind_context(work), daemon=True)
+        self.beat()
+        thread.start()
+        checked, cpu = time.monotonic(), time.process_time()
+        while True:
+            thread.join(min(1.0, self.stall_timeout))
+            if not thread.is_alive():
+                break
+            now, now_cpu = time.monotonic(), time.process_time()
+            if now_cpu - cpu >= BUSY_CPU_SHARE * (now - checked):
+                self.beat()
+            checked, cpu = now, now_cpu
+            if now - self._activity > self.stall_timeout:
+                raise WorkStalled(self.name, self.stall_timeout)
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+# ─── Sinks ─────────────────────────────────────────────
+
+def get_metrics_log_path() -> Optional[str]:
+    """JSON-lines span log, or None when disabled"""
+    path = os.environ.get(METRICS_LOG_ENV, "").strip()
+    if path.lower() in ("off", "0", "none"):
+        return None
+    return path or os.path.join(get_cache_root(), "metrics.jsonl")
+
+def _get_log_max_bytes() -> int:
+    return int(get_float_env(METRICS_LOG_MAX_MB_ENV, DEFAULT_METRICS_LOG_MAX_MB) * 1024 * 1024)
+
+def _append_log(current: Span):
+    path = get_metrics_log_path()
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Keep one previous file, like a minimal logrotate
+    if os.path.exists(path) and os.path.getsize(path) > _get_log_max_bytes():
+        os.replace(path, path + ".1")
+    line = json.dumps(dict(current.to_dict(), pid=os.getpid())) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+def _connect_metrics_db() -> sqlite3.Connection:
+    os.makedirs(get_cache_root(), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(get_cache_root(), METRICS_DB_FILE), timeout=30,
+                           isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS stages (name TEXT PRIMARY KEY, runs INTEGER NOT NULL, "
+        "failures INTEGER NOT NULL, wall REAL NOT NULL, cpu REAL NOT NULL, "
+        "read_bytes INTEGER NOT NULL, write_bytes INTEGER NOT NULL, peak_rss INTEGER NOT NULL)"
+    )
+    return conn
+
+def _aggregate(current: Span):
+    # Totals live on disk so the app, workers and CLI report through one endpoint
+    with _connect_metrics_db() as conn:
+        conn.execute(
+            "INSERT INTO stages VALUES (?, 1, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+            "runs = runs + 1, failures = failures + excluded.failures, wall = wall + excluded.wall, "
+            "cpu = cpu + excluded.cpu, read_bytes = read_bytes + excluded.read_bytes, "
+            "write_bytes = write_bytes + excluded.write_bytes, "
+            "peak_rss = MAX(peak_rss, excluded.peak_rss)",
+            (current.name, 0 if current.ok else 1, current.wall, current.cpu,
+             current.read_bytes, current.write_bytes, current.peak_rss),
+        )
+
+def record(current: Span):
+    """Hand a finished span to the active collector, the JSON-lines log and the totals"""
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(current)
+    try:
+        _append_log(current)
+        _aggregate(current)
+    except (OSError, sqlite3.Error):
+        pass  # metrics must never fail a job
+
+# ─── Prometheus Exposition ─────────────────────────────────────────────
+
+# (metric name, column, type, help)
+PROMETHEUS_METRICS = [
+    ("music_tools_stage_runs_total", "runs", "counter", "Completed runs of a pipeline stage"),
+    ("music_tools_stage_failures_total", "failures", "counter", "Runs of a pipeline stage that raised"),
+    ("music_tools_stage_wall_seconds_total", "wall", "counter", "Wall-clock time spent in a stage"),
+    ("music_tools_stage_cpu_seconds_total", "cpu", "counter", "CPU time spent in a stage"),
+    ("music_tools_stage_read_bytes_total", "read_bytes", "counter", "Bytes read during a stage"),
+    ("music_tools_stage_written_bytes_total", "write_bytes", "counter", "Bytes written during a stage"),
+    ("music_tools_stage_peak_rss_bytes", "peak_rss", "gauge", "Largest peak RSS seen for a stage"),
+]
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def get_stage_totals() -> list[dict]:
+    """Aggregated metrics of every stage recorded so far"""
+    try:
+        with _connect_metrics_db() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute("SELECT * FROM stages ORDER BY name")]
+    except (OSError, sqlite3.Error):
+        return []
+
+def render_prometheus() -> str:
+    """Stage totals in the Prometheus text exposition format"""
+    totals = get_stage_totals()
+    lines = []
+    for metric, column, kind, description in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for row in totals:
+            lines.append(f'{metric}{{stage="{_label(row["name"])}"}} {row[column]}')
+    return "\n".join(lines) + "\n"
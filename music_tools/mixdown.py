@@ -0,0 +1,226 @@
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from music_tools.encoding import DecodeError, PcmReader, PipeEncoder, WavWriter
+from music_tools.formats import get_format
+from music_tools.metrics import span
+from music_tools.separation import stem_source
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Rendered mixes go in this folder inside the stems folder, so they are never taken for stems
+MIX_DIR = "mixes"
+
+MIX_SAMPLERATE = 44100
+MIX_CHANNELS = 2
+BLOCK_FRAMES = 10 * MIX_SAMPLERATE
+
+# Peak limiter: output never exceeds the ceiling; gain recovers over the release time
+LIMITER_CEILING_DB = -1.0
+LIMITER_RELEASE_SECONDS = 0.1
+# Gain is decided per window and ramped linearly across the window before it,
+# which doubles as the limiter's lookahead
+LIMITER_WINDOW = 64
+
+STEM_EXTENSIONS = (".mp3", ".wav", ".flac", ".m4a", ".ogg", ".opus")
+
+# name -> (gain of stems not listed, gains by stem role)
+MIX_PRESETS = {
+    "karaoke": (1.0, {"vocals": 0.0}),
+    "drumless": (1.0, {"drums": 0.0}),
+    "bassless": (1.0, {"bass": 0.0}),
+    "a-cappella": (0.0, {"vocals": 1.0}),
+}
+
+class MixError(Exception):
+    """Raised when a mix could not be rendered"""
+
+@dataclass
+class MixResult:
+    """A rendered mix and how hard the limiter had to work"""
+    path: str
+    duration: float
+    peak: float  # highest absolute sample of the summed stems, before limiting
+    gain_reduction_db: float
+
+# ─── Stem Selection ─────────────────────────────────────────────
+
+def find_stems(folder: str) -> list[str]:
+    """Audio files directly inside a stems folder"""
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if not f.startswith(".") and f.lower().endswith(STEM_EXTENSIONS)
+                  and os.path.isfile(os.path.join(folder, f)))
+
+def stem_role(path: str) -> str:
+    """Which instrument a stem file holds, from the suffix after the song name ("song_vocals.mp3" -> "vocals")
+
+    Two-stem accompaniments ("song_no_vocals") are everything except that
+    role. The song title is never searched, so "Basshunter_other" is "other".
+    """
+    return stem_source(path) or os.path.splitext(os.path.basename(path))[0].lower()
+
+def preset_gains(preset: str, stem_paths: list[str]) -> dict[str, float]:
+    """Per-stem gains for a named preset"""
+    if preset not in MIX_PRESETS:
+        raise ValueError(f"Unknown mix preset: {preset} (choose from {', '.join(MIX_PRESETS)})")
+    default, gains = MIX_PRESETS[preset]
+    return {path: gains.get(stem_role(path), default) for path in stem_paths}
+
+def mix_base_name(stem_paths: list[str]) -> str:
+    """Song name shared by a set of stems ("song_vocals", "song_drums" -> "song")"""
+    names = [os.path.splitext(os.path.basename(path))[0] for path in stem_paths]
+    return os.path.commonprefix(names).rstrip("_- .") or "mix"
+
+# ─── Limiter ─────────────────────────────────────────────
+
+class Limiter:
+    """Streaming peak limiter for (frames, channels) float blocks
+
+    Each window's gain is the most it may be without exceeding the ceiling,
+    recovering towards unity at the release rate. Gain is interpolated
+    linearly between window boundaries, taking the lower of the two windows
+    at each boundary, so every sample stays under the ceiling. The last
+    window of each block is held back until the next block decides its end.
+    """
+
+    def __init__(self, samplerate: int, ceiling_db: float = LIMITER_CEILING_DB,
+                 release_seconds: float = LIMITER_RELEASE_SECONDS):
+        self.ceiling = 10 ** (ceiling_db / 20)
+        self.release = 1 - math.exp(-LIMITER_WINDOW / (release_seconds * samplerate))
+        self.gain = 1.0  # gain of the window before the pending one
+        self.boundary: Optional[float] = None  # gain at the start of the pending samples
+        self.min_gain = 1.0
+        self._pending: Optional[np.ndarray] = None
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Limit a block, returning the samples that are final so far"""
+        if self._pending is not None:
+            block = np.concatenate([self._pending, block])
+        windows = len(block) // LIMITER_WINDOW
+        if windows < 2:
+            self._pending = block
+            return block[:0]
+        # Hold back the last full window and any partial one after it
+        ready = (windows - 1) * LIMITER_WINDOW
+        self._pending = block[ready:]
+        gains = self._window_gains(block[:windows * LIMITER_WINDOW].reshape(windows, -1))
+        out = self._apply(block[:ready], gains[:-1], gains[-1])
+        self.gain = gains[-2]
+        self.boundary = min(gains[-2], gains[-1])
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Limit and return whatever is still held back"""
+        block, self._pending = self._pending, None
+        if block is None or not len(block):
+            return np.zeros((0, MIX_CHANNELS), dtype=np.float32)
+        windows = -(-len(block) // LIMITER_WINDOW)
+        padded = np.zeros((windows * LIMITER_WINDOW,) + block.shape[1:], dtype=block.dtype)
+        padded[:len(block)] = block
+        gains = self._window_gains(padded.reshape(windows, -1))
+        return self._apply(padded, gains, gains[-1])[:len(block)]
+
+    def _window_gains(self, windows: np.ndarray) -> np.ndarray:
+        peaks = np.abs(windows).max(axis=1)
+        required = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-9))
+        gains = np.empty(len(required))
+        gain = self.gain
+        # The release recursion is inherently sequential, but only runs once per window
+        for i, limit in enumerate(required.tolist()):
+            gain = min(limit, gain + (1.0 - gain) * self.release)
+            gains[i] = gain
+        return gains
+
+    def _apply(self, samples: np.ndarray, gains: np.ndarray, next_gain: float) -> np.ndarray:
+        # Window i ramps from its start boundary to the next one; both are <= its own gain
+        start = gains[0] if self.boundary is None else self.boundary
+        boundaries = np.concatenate([[start], np.minimum(gains[:-1], gains[1:]),
+                                     [min(gains[-1], next_gain)]])
+        ramp = np.arange(LIMITER_WINDOW) / LIMITER_WINDOW
+        curve = boundaries[:-1, None] + (boundaries[1:] - boundaries[:-1])[:, None] * ramp
+        self.min_gain = min(self.min_gain, float(gains.min()))
+        return samples * curve.reshape(-1, 1).astype(np.float32)
+
+# ─── Rendering ─────────────────────────────────────────────
+
+def open_writer(path: str, fmt: str):
+    """Streaming writer for (channels, samples) blocks in WAV or a format spec such as opus:64k"""
+    if fmt == "wav":
+        return WavWriter(path, MIX_SAMPLERATE, MIX_CHANNELS)
+    return PipeEncoder(path, MIX_SAMPLERATE, MIX_CHANNELS, get_format(fmt).ffmpeg_args())
+
+def mix_extension(fmt: str) -> str:
+    """File extension of a mix in fmt, raising ValueError for unknown formats"""
+    return "wav" if fmt == "wav" else get_format(fmt).extension
+
+def render_mix(gains: dict[str, float], output_path: str, fmt: str = "mp3",
+               limit: bool = True) -> MixResult:
+    """Sum stems with per-stem gains, limit the peaks and encode the result
+
+    gains maps stem files to linear gains (1.0 = as separated); muted stems
+    are never decoded. Stems are read and mixed ten seconds at a time, so
+    memory use doesn't depend on track length.
+    """
+    active = {path: gain for path, gain in gains.items() if gain > 0}
+    if not active:
+        raise MixError("Every stem is muted")
+    try:
+        mix_extension(fmt)  # reject unknown formats before any work starts
+    except ValueError as e:
+        raise MixError(str(e)) from e
+
+    folder = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(folder, exist_ok=True)
+    # Written under a temporary name so a half-finished mix is never served
+    fd, partial = tempfile.mkstemp(prefix=".partial-", suffix=os.path.splitext(output_path)[1],
+                                   dir=folder)
+    os.close(fd)
+    streams = [PcmReader(path, MIX_SAMPLERATE, MIX_CHANNELS).blocks(BLOCK_FRAMES) for path in active]
+    weights = [np.float32(gain) for gain in active.values()]
+    limiter = Limiter(MIX_SAMPLERATE) if limit else None
+    writer = open_writer(partial, fmt)
+    frames = 0
+    peak = 0.0
+    try:
+        with span("mixdown", stems=len(active), format=fmt), \
+                ThreadPoolExecutor(max_workers=len(streams)) as pool:
+            while True:
+                # Every decoder fills its next block at the same time
+                blocks = list(pool.map(lambda stream: next(stream, None), streams))
+                if all(block is None for block in blocks):
+                    break
+                # Stems can differ in length by a few frames; the missing tail is silence
+                length = max(len(block) for block in blocks if block is not None)
+                mix = np.zeros((length, MIX_CHANNELS), dtype=np.float32)
+                for block, weight in zip(blocks, weights):
+                    if block is not None:
+                        mix[:len(block)] += block * weight
+                frames += length
+                peak = max(peak, float(np.abs(mix).max()))
+                writer.write((limiter.process(mix) if limiter else np.clip(mix, -1.0, 1.0)).T)
+            if limiter:
+                writer.write(limiter.flush().T)
+    except DecodeError as e:
+        writer.close()
+        os.remove(partial)
+        raise MixError(str(e)) from e
+    except BaseException:
+        writer.close()
+        os.remove(partial)
+        raise
+    finally:
+        for stream in streams:
+            stream.close()
+    error = writer.close()
+    if error:
+        os.remove(partial)
+        raise MixError(error)
+    os.replace(partial, output_path)
+    gain_reduction = max(0.0, -20 * math.log10(limiter.min_gain)) if limiter else 0.0
+    return MixResult(output_path, frames / MIX_SAMPLERATE, peak, gain_reduction)
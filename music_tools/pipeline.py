@@ -0,0 +1,467 @@
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from music_tools.cache import DownloadCache, SeparationCache, link_or_copy
+from music_tools.config import get_int_env
+from music_tools.cpu import get_thread_limit
+from music_tools.downloader import (
+    AUDIO_FORMAT,
+    AUDIO_QUALITY,
+    DownloadError,
+    get_download_backend,
+    get_download_concurrency,
+    get_downloader,
+    normalize_video_id,
+)
+from music_tools.encoding import MP3_BITRATE, Mp3PipeEncoder, rescale_factor
+from music_tools.metrics import ProcessStalled, StallWatchdog, bind_context, run_process, span
+from music_tools.progress import (
+    FfmpegProgress,
+    ProgressCallback,
+    ProgressReporter,
+    demucs_progress,
+    get_stall_timeout,
+    scale_progress,
+    wav_duration,
+)
+from music_tools.separation import (
+    DEFAULT_MODEL,
+    SEPARATION_PARAMS,
+    DemucsEngine,
+    combine_sources,
+    get_engine,
+    get_model_profile,
+    get_separation_backend,
+    output_stems,
+)
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Number of concurrent ffmpeg processes used when transcoding stems.
+# Unset (or 0) means the thread cap of this process: its share of the CPU quota
+# in a separation worker (see cpu.limit_threads), the whole quota elsewhere.
+TRANSCODE_WORKERS_ENV = "MUSIC_TOOLS_TRANSCODE_WORKERS"
+
+# "stream" pipes separated audio straight into ffmpeg (in-process engine only);
+# "files" writes WAV stems to disk and converts them afterwards
+PIPELINE_MODE_ENV = "MUSIC_TOOLS_PIPELINE_MODE"
+
+PCM_CHUNK_FRAMES = 441000
+
+# Part of the separate-to-MP3 progress bar given to separation; transcoding gets the rest
+SEPARATION_SHARE = 0.85
+
+# ─── Errors ─────────────────────────────────────────────
+
+class StemConversionError(Exception):
+    """Raised when one or more stems could not be converted"""
+
+    def __init__(self, failures: dict[str, str], converted: list[str]):
+        self.failures = failures
+        self.converted = converted
+        names = ", ".join(sorted(failures))
+        super().__init__(f"Failed to convert {len(failures)} stem(s): {names}")
+
+# ─── Results ─────────────────────────────────────────────
+
+@dataclass
+class DownloadResult:
+    """An MP3 produced (or reused) by download_audio"""
+    path: str
+    url: str
+    video_id: str
+    cached: bool = False
+
+@dataclass
+class SeparationResult:
+    """Stems produced (or reused) by separate_stems"""
+    folder: str
+    stems: dict[str, str]  # stem name -> WAV path
+    model: str
+    cached: bool = False
+
+def _stem_files(folder: str) -> dict[str, str]:
+    """Map stem names to the WAV files of a known stems folder"""
+    stems = {os.path.splitext(f)[0]: os.path.join(folder, f)
+             for f in sorted(os.listdir(folder)) if f.endswith(".wav")}
+    if not stems:
+        raise FileNotFoundError(f"No stems found in {folder}")
+    return stems
+
+# ─── System Helpers ─────────────────────────────────────────────
+
+def get_transcode_workers() -> int:
+    """Get the configured ffmpeg worker count"""
+    workers = get_int_env(TRANSCODE_WORKERS_ENV, 0, minimum=0)
+    return workers if workers > 0 else get_thread_limit()
+
+def get_pipeline_mode() -> str:
+    """Configured separation-to-MP3 pipeline mode"""
+    mode = os.environ.get(PIPELINE_MODE_ENV, "stream").strip().lower()
+    return mode if mode in ("stream", "files") else "stream"
+
+def validate_and_create_path(path_str: str) -> tuple[bool, str]:
+    """Validate and create directory if needed"""
+    try:
+        path = Path(path_str)
+        if not path.exists():
+            path.mkdir(parents=True, exist_ok=True)
+            return True, f"Created directory: {path}"
+        elif not path.is_dir():
+            return False, f"Path exists but is not a directory: {path}"
+        else:
+            return True, f"Using existing directory: {path}"
+    except Exception as e:
+        return False, f"Error with path: {e}"
+
+# ─── Pipeline Stages ─────────────────────────────────────────────
+
+def download_audio(youtube_url: str, output_dir: str,
+                   cache: Optional[DownloadCache] = None) -> DownloadResult:
+    """Download YouTube audio and convert to MP3, reusing cached downloads when possible"""
+    video_id = normalize_video_id(youtube_url)
+    with span("download", video_id=video_id) as current:
+        if cache is not None:
+            key = cache.make_key(video_id, AUDIO_FORMAT, AUDIO_QUALITY)
+            cached = cache.get(key)
+            if cached:
+                current.attrs["cached"] = True
+                mp3_path = os.path.join(output_dir, os.path.basename(cached))
+                link_or_copy(cached, mp3_path)
+                return DownloadResult(mp3_path, youtube_url, video_id, cached=True)
+
+        mp3_path = _run_download(youtube_url, output_dir)
+        if cache is not None:
+            cache.put(key, mp3_path, {"url": youtube_url})
+        return DownloadResult(mp3_path, youtube_url, video_id)
+
+def download_many(urls: list[str], output_dir: str, cache: Optional[DownloadCache] = None,
+                  max_workers: Optional[int] = None) -> tuple[dict[str, DownloadResult], dict[str, str]]:
+    """Download URLs concurrently, returning (url -> result, url -> error)"""
+    if max_workers is None:
+        max_workers = get_download_concurrency()
+    max_workers = max(1, min(max_workers, len(urls) or 1))
+
+    def fetch(url):
+        try:
+            return download_audio(url, output_dir, cache), None
+        except (DownloadError, subprocess.CalledProcessError, FileNotFoundError) as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(bind_context(fetch), urls))
+
+    downloaded = {url: result for url, (result, _) in zip(urls, results) if result}
+    failures = {url: error for url, (_, error) in zip(urls, results) if error}
+    return downloaded, failures
+
+def _run_download(youtube_url: str, output_dir: str) -> str:
+    """Fetch a URL with yt-dlp in-process or via the CLI and return the MP3 path"""
+    if get_download_backend() == "inprocess":
+        with span("yt-dlp"):
+            return get_downloader().download(youtube_url, output_dir)
+
+    output_template = os.path.join(output_dir, "%(title)s.%(ext)s")
+    # yt-dlp prints the final path once post-processing has moved the file into place
+    cmd = [
+        "yt-dlp", "-x", "--audio-format", AUDIO_FORMAT, "--audio-quality", AUDIO_QUALITY,
+        "--print", "after_move:filepath", "-o", output_template, youtube_url
+    ]
+    result = run_process(cmd, "yt-dlp", stdout=subprocess.PIPE, text=True)
+    lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+    if not lines or not os.path.exists(lines[-1]):
+        raise FileNotFoundError("MP3 not found after download")
+    return lines[-1]
+
+def separate_stems(input_audio_path: str, output_dir: str,
+                   engine: Optional[DemucsEngine] = None,
+                   cache: Optional[SeparationCache] = None,
+                   progress: Optional[ProgressCallback] = None,
+                   model: str = DEFAULT_MODEL,
+                   two_stems: Optional[str] = None) -> SeparationResult:
+    """Separate audio into stems using Demucs, reusing cached results when possible
+
+    model is ignored when an engine is given; the engine's model is used.
+    With two_stems (e.g. "vocals") only <stem> and no_<stem> are written.
+    """
+    model_name = engine.model_name if engine is not None else model
+    _check_two_stems(model_name, engine, two_stems)
+    with span("separate", model=model_name, two_stems=two_stems) as current:
+        if cache is not None:
+            key = cache.make_key(input_audio_path, model_name, _separation_params(two_stems))
+            cached = cache.get(key)
+            if cached:
+                current.attrs["cached"] = True
+                return SeparationResult(cached, _stem_files(cached), model_name, cached=True)
+
+        stems_folder = _run_separation(input_audio_path, output_dir, engine, progress, model_name,
+                                       two_stems)
+        if cache is not None:
+            stems_folder = cache.put(key, stems_folder, {"model": model_name,
+                                                         "source": os.path.basename(input_audio_path)})
+        return SeparationResult(stems_folder, _stem_files(stems_folder), model_name)
+
+def _separation_params(two_stems: Optional[str]) -> dict:
+    """Settings that identify a separation's output, for cache keys"""
+    # Full separations keep the keys they had before two-stem mode existed
+    return dict(SEPARATION_PARAMS, two_stems=two_stems) if two_stems else SEPARATION_PARAMS
+
+def _check_two_stems(model_name: str, engine: Optional[DemucsEngine], two_stems: Optional[str]):
+    """Raise ValueError before any work starts when the model has no such source"""
+    if two_stems is not None:
+        sources = engine.sources if engine is not None else get_model_profile(model_name).sources
+        output_stems(sources, two_stems)
+
+def demucs_stems_folder(output_dir: str, model_name: str, input_audio_path: str) -> str:
+    """Where Demucs puts the stems of a track: <output_dir>/<model>/<track>/"""
+    track_name = os.path.splitext(os.path.basename(input_audio_path))[0]
+    return os.path.join(output_dir, model_name, track_name)
+
+def _run_separation(input_audio_path: str, output_dir: str,
+                    engine: Optional[DemucsEngine] = None,
+                    progress: Optional[ProgressCallback] = None,
+                    model: str = DEFAULT_MODEL,
+                    two_stems: Optional[str] = None) -> str:
+    """Run Demucs in-process or via the CLI and return the stems folder"""
+    reporter = ProgressReporter(progress, "Separating stems")
+    reporter.begin()
+    engine = _resolve_engine(engine, model)  # None when torch/demucs are missing: use the CLI
+    if engine is not None:
+        # numpy is only needed alongside an in-process engine
+        from music_tools.segmented import SegmentedSeparation, should_segment
+
+        if not should_segment(input_audio_path, engine):
+            # One pass that reports nothing until it ends; the watchdog stands in for the CLI's
+            watchdog = StallWatchdog("Demucs", get_stall_timeout())
+            with span("demucs.inference"):
+                stems_folder = watchdog.run(engine.separate, input_audio_path, output_dir, two_stems)
+            reporter.update(1.0, force=True)
+            return stems_folder
+        segmented = SegmentedSeparation(engine, input_audio_path)
+        segmented.run(lambda fraction, _: reporter.update(fraction, force=True))
+        stems_folder = demucs_stems_folder(output_dir, engine.model_name, input_audio_path)
+        os.makedirs(stems_folder, exist_ok=True)
+        with span("encode", format="wav"):
+            segmented.write(stems_folder, "wav", two_stems)
+        segmented.cleanup()
+        return stems_folder
+
+    # Pin the output layout so the stems folder is known without scanning
+    cmd = ["demucs", "-n", model, "--out", output_dir, "--filename", "{track}/{stem}.{ext}"]
+    if two_stems is not None:
+        cmd += ["--two-stems", two_stems]
+    cmd.append(input_audio_path)
+    run_process(cmd, "demucs", on_line=demucs_progress(reporter), stall_timeout=get_stall_timeout(),
+                model=model)
+
+    stems_folder = demucs_stems_folder(output_dir, model, input_audio_path)
+    if os.path.isdir(stems_folder):
+        return stems_folder
+    raise FileNotFoundError("Stems not found in expected structure")
+
+def _transcode_to_mp3(wav_path: str, mp3_path: str,
+                      on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
+    """Run ffmpeg for a single stem, returning an error message on failure"""
+    cmd = ["ffmpeg", "-nostats", "-progress", "pipe:1",
+           "-i", wav_path, "-acodec", "libmp3lame", "-b:a", MP3_BITRATE, "-y", mp3_path]
+    on_line = FfmpegProgress(on_progress, wav_duration(wav_path)) if on_progress else None
+    try:
+        run_process(cmd, "ffmpeg", capture_output=True, text=True, on_line=on_line,
+                    stall_timeout=get_stall_timeout(),
+                    stem=os.path.splitext(os.path.basename(wav_path))[0])
+    except ProcessStalled as e:
+        return str(e)
+    except subprocess.CalledProcessError as e:
+        lines = (e.stderr or "").strip().splitlines()
+        return lines[-1] if lines else f"ffmpeg exited with status {e.returncode}"
+    except OSError as e:
+        return str(e)
+    if not os.path.exists(mp3_path):
+        return "ffmpeg produced no output file"
+    return None
+
+def convert_stems_to_mp3(stems_folder: str, output_dir: str, base_name: str,
+                         max_workers: Optional[int] = None,
+                         progress: Optional[ProgressCallback] = None) -> list[str]:
+    """Convert WAV stems to MP3, running up to max_workers ffmpeg processes at once"""
+    wav_files = sorted(f for f in os.listdir(stems_folder) if f.endswith('.wav'))
+    if max_workers is None:
+        max_workers = get_transcode_workers()
+    max_workers = max(1, min(max_workers, len(wav_files) or 1))
+
+    jobs = []
+    for file in wav_files:
+        wav_path = os.path.join(stems_folder, file)
+        stem_name = os.path.splitext(file)[0]
+        mp3_filename = f"{base_name}_{stem_name}.mp3"
+        jobs.append((stem_name, wav_path, os.path.join(output_dir, mp3_filename)))
+
+    reporter = ProgressReporter(progress, "Converting to MP3")
+    reporter.begin()
+    # Overall progress is the mean of the per-stem fractions
+    done = [0.0] * len(jobs)
+
+    def transcode(index):
+        def on_progress(fraction):
+            done[index] = fraction
+            reporter.update(sum(done) / len(done))
+        return _transcode_to_mp3(jobs[index][1], jobs[index][2], on_progress)
+
+    with span("transcode", stems=len(jobs), workers=max_workers):
+        if max_workers == 1:
+            errors = [transcode(index) for index in range(len(jobs))]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                errors = list(pool.map(bind_context(transcode), range(len(jobs))))
+    reporter.update(1.0, force=True)
+
+    # Results are collected in stem-name order regardless of completion order
+    mp3_files = []
+    failures = {}
+    for (stem_name, _, mp3_path), error in zip(jobs, errors):
+        if error is None:
+            mp3_files.append(mp3_path)
+        else:
+            failures[stem_name] = error
+
+    if failures:
+        raise StemConversionError(failures, mp3_files)
+    return mp3_files
+
+def _encode_pcm_to_mp3(source, samplerate: int, mp3_path: str) -> Optional[str]:
+    """Pipe a (channels, samples) float tensor into ffmpeg, returning an error message on failure"""
+    channels, frames = source.shape
+    encoder = Mp3PipeEncoder(mp3_path, samplerate, channels,
+                             scale=rescale_factor(source.abs().max().item()))
+    # Interleave and send a few seconds at a time so no full-length copy is made
+    for start in range(0, frames, PCM_CHUNK_FRAMES):
+        encoder.write(source[:, start:start + PCM_CHUNK_FRAMES].numpy())
+    return encoder.close()
+
+def _stream_stems_to_mp3(engine: DemucsEngine, input_audio_path: str, output_dir: str,
+                         max_workers: Optional[int] = None,
+                         progress: Optional[ProgressCallback] = None,
+                         two_stems: Optional[str] = None) -> dict[str, str]:
+    """Separate in memory and encode each stem to <output_dir>/<stem>.mp3"""
+    from music_tools.segmented import SegmentedSeparation, should_segment
+
+    names = output_stems(engine.sources, two_stems)
+    paths = {name: os.path.join(output_dir, f"{name}.mp3") for name in names}
+
+    if should_segment(input_audio_path, engine):
+        # Long input: bounded-memory windows, encoded while they are stitched together
+        reporter = ProgressReporter(progress, "Separating stems")
+        reporter.begin()
+        segmented = SegmentedSeparation(engine, input_audio_path)
+        segmented.run(lambda fraction, _: reporter.update(fraction, force=True))
+        with span("encode", format="mp3"):
+            failures = segmented.write(output_dir, "mp3", two_stems)
+        if failures:
+            converted = [paths[name] for name in sorted(names) if name not in failures]
+            raise StemConversionError(failures, converted)
+        segmented.cleanup()
+        return paths
+
+    # Short input: one inference pass, then every stem encoded from memory. Milestones
+    # (inference done, each stem encoded) drive the progress bar and the stall watchdog
+    separating = ProgressReporter(scale_progress(progress, 0.0, SEPARATION_SHARE), "Separating stems")
+    encoding = ProgressReporter(scale_progress(progress, SEPARATION_SHARE, 1.0), "Encoding stems")
+    watchdog = StallWatchdog("Demucs", get_stall_timeout())
+    if max_workers is None:
+        max_workers = get_transcode_workers()
+    max_workers = max(1, min(max_workers, len(names)))
+    encoded = []
+
+    def encode(stem):
+        source, name = stem
+        error = _encode_pcm_to_mp3(source, engine.samplerate, paths[name])
+        encoded.append(name)
+        watchdog.beat()
+        encoding.update(len(encoded) / len(names), force=True)
+        return error
+
+    def separate_and_encode():
+        separating.begin()
+        with span("demucs.inference"):
+            sources = combine_sources(engine.separate_tensors(input_audio_path), engine.sources, two_stems)
+        watchdog.beat()
+        separating.update(1.0, force=True)
+        # (tensor, stem name) per encode; the tensors are released when this function returns
+        stems = list(zip(sources, names))
+        encoding.begin()
+        with span("encode", format="mp3", stems=len(names)):
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                return list(pool.map(bind_context(encode), stems))
+
+    errors = watchdog.run(separate_and_encode)
+
+    failures = {name: error for name, error in zip(names, errors) if error is not None}
+    if failures:
+        converted = [paths[name] for name in sorted(names) if name not in failures]
+        raise StemConversionError(failures, converted)
+    return paths
+
+def _resolve_engine(engine: Optional[DemucsEngine],
+                    model: str = DEFAULT_MODEL) -> Optional[DemucsEngine]:
+    """Use the given engine, or the shared in-process one for model when configured"""
+    if engine is None and get_separation_backend() == "inprocess":
+        try:
+            engine = get_engine(model)
+        except ImportError:
+            engine = None
+    return engine
+
+def separate_to_mp3(input_audio_path: str, output_dir: str, base_name: str,
+                    engine: Optional[DemucsEngine] = None,
+                    cache: Optional[SeparationCache] = None,
+                    max_workers: Optional[int] = None,
+                    progress: Optional[ProgressCallback] = None,
+                    model: str = DEFAULT_MODEL,
+                    two_stems: Optional[str] = None) -> list[str]:
+    """Separate a file and save <base_name>_<stem>.mp3 files in output_dir"""
+    engine = _resolve_engine(engine, model) if get_pipeline_mode() == "stream" else None
+    if engine is None:
+        # WAV stems on disk, then a separate transcoding pass
+        with tempfile.TemporaryDirectory() as tmpdir:
+            separation = separate_stems(input_audio_path, tmpdir, engine, cache,
+                                        scale_progress(progress, 0.0, SEPARATION_SHARE), model,
+                                        two_stems)
+            return convert_stems_to_mp3(separation.folder, output_dir, base_name, max_workers,
+                                        scale_progress(progress, SEPARATION_SHARE, 1.0))
+
+    _check_two_stems(engine.model_name, engine, two_stems)
+    # Cached entries for this mode hold the finished MP3s rather than WAVs
+    params = dict(_separation_params(two_stems), output="mp3", bitrate=MP3_BITRATE)
+    key = None
+    stems_folder = None
+    if cache is not None:
+        key = cache.make_key(input_audio_path, engine.model_name, params)
+        stems_folder = cache.get(key)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if stems_folder is None:
+            try:
+                _stream_stems_to_mp3(engine, input_audio_path, tmpdir, max_workers, progress, two_stems)
+            except StemConversionError as e:
+                converted = []
+                for path in e.converted:
+                    target = os.path.join(output_dir, f"{base_name}_{os.path.basename(path)}")
+                    link_or_copy(path, target)
+                    converted.append(target)
+                raise StemConversionError(e.failures, converted)
+            stems_folder = tmpdir
+            if cache is not None:
+                stems_folder = cache.put(key, tmpdir, {"model": engine.model_name,
+                                                       "source": os.path.basename(input_audio_path)})
+
+        mp3_files = []
+        for file in sorted(f for f in os.listdir(stems_folder) if f.endswith(".mp3")):
+            target = os.path.join(output_dir, f"{base_name}_{file}")
+            link_or_copy(os.path.join(stems_folder, file), target)
+            mp3_files.append(target)
+    return mp3_files
@@ -0,0 +1,1144 @@
+import base64
+import html
+import json
+import mimetypes
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from music_tools.config import get_int_env
+from music_tools.formats import AudioFormat, get_player_formats
+from music_tools.separation import stem_source
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# "media" (<audio> per stem, range-streamed so playback starts at once) or
+# "webaudio" (sample-locked mixing through one AudioContext, after every stem is
+# fetched and decoded)
+PLAYER_ENGINE_ENV = "MUSIC_TOOLS_PLAYER_ENGINE"
+
+# Memory budget for encoded stem payloads and rendered player HTML
+PLAYER_CACHE_MB_ENV = "MUSIC_TOOLS_PLAYER_CACHE_MB"
+DEFAULT_PLAYER_CACHE_MB = 512
+
+# Waveform levels with more peaks than this stay on disk; lanes are at most a few thousand pixels wide
+PLAYER_MAX_PEAKS = 8192
+
+# Iframe height: master controls plus one row per stem; compact view scrolls past its cap
+PLAYER_BASE_HEIGHT = 260
+PLAYER_STEM_HEIGHT = 150
+PLAYER_COMPACT_MAX_HEIGHT = 600
+
+# ─── Bounded Memo Cache ─────────────────────────────────────────────
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total length of its string values"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: str):
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            if len(value) > self.max_bytes:
+                return  # never cache something larger than the whole budget
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], str]) -> str:
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._items),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+def get_player_engine() -> str:
+    """Configured playback engine for the stem player"""
+    engine = os.environ.get(PLAYER_ENGINE_ENV, "media").strip().lower()
+    return engine if engine in ("webaudio", "media") else "media"
+
+def _get_cache_budget() -> int:
+    return get_int_env(PLAYER_CACHE_MB_ENV, DEFAULT_PLAYER_CACHE_MB, minimum=0) * 1024 * 1024
+
+# One budget shared by payloads and HTML across all sessions in this process
+player_cache = LRUCache(_get_cache_budget())
+
+# ─── Stem Payloads ─────────────────────────────────────────────
+
+def audio_mime_type(file_name):
+    """MIME type for an audio file, defaulting to MP3"""
+    return mimetypes.guess_type(file_name)[0] or "audio/mpeg"
+
+def file_cache_key(path: str) -> tuple:
+    """Identify a file's current contents by path, mtime and size"""
+    stat = os.stat(path)
+    return ("file", os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def encode_file_data_uri(path: str) -> str:
+    """Base64 data URI for a file on disk, memoized until the file changes"""
+    def encode():
+        audio_base64 = ""
+        if os.path.getsize(path):
+            # Encode straight from the page cache instead of reading a copy first
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                audio_base64 = base64.b64encode(data).decode("ascii")
+        return f"data:{audio_mime_type(path)};base64,{audio_base64}"
+    return player_cache.get_or_create(("payload",) + file_cache_key(path), encode)
+
+def encode_peaks_json(path: str) -> Optional[str]:
+    """Waveform overview of a file as player JSON, memoized until the file changes
+
+    None when no peaks could be extracted.
+    """
+    from music_tools.waveform import WaveformError, get_peaks
+
+    def encode():
+        try:
+            peaks = get_peaks(path)
+        except (WaveformError, OSError):
+            return ""  # remembered, so a broken file isn't decoded on every rerun
+        if not peaks.frames:
+            return ""
+        levels = [{"samplesPerPeak": spp, "data": base64.b64encode(data.tobytes()).decode("ascii")}
+                  for spp, data in peaks.levels.items() if len(data) <= PLAYER_MAX_PEAKS]
+        return json.dumps({"duration": peaks.duration, "levels": levels})
+    return player_cache.get_or_create(("peaks",) + file_cache_key(path), encode) or None
+
+# ─── Player HTML ─────────────────────────────────────────────
+
+# Streamed files are served by the media server next to Streamlit; expects
+# mediaBase and mediaPort constants in the surrounding script
+RESOLVE_MEDIA_URL_JS = """
+            function resolveMediaUrl(src) {
+                if (!src.startsWith('/media/') && !src.startsWith('/zip/')) return src;
+                if (mediaBase) return mediaBase + src;
+                let host = 'localhost';
+                try {
+                    host = window.parent.location.hostname || host;
+                } catch (err) {}
+                return `http://${host}:${mediaPort}${src}`;
+            }
+"""
+
+def render_player_html(stems_data: dict, source_keys: list, media_port: Optional[int] = None,
+                       media_base: Optional[str] = None, engine: Optional[str] = None,
+                       formats: Optional[list[AudioFormat]] = None,
+                       peaks: Optional[dict] = None) -> str:
+    """Player HTML memoized by the identity of its sources rather than their contents"""
+    engine = engine or get_player_engine()
+    formats = formats if formats is not None else get_player_formats()
+    # Peaks are derived from the sources, so which stems have them is all the key needs
+    key = ("html", tuple(source_keys), tuple(stems_data), media_port, media_base, engine,
+           tuple(fmt.label for fmt in formats), tuple(sorted(peaks or {})))
+    return player_cache.get_or_create(
+        key, lambda: create_audio_player_html(stems_data, media_port, media_base, engine, formats, peaks)
+    )
+
+def create_download_links_html(links: list, media_port: Optional[int] = None,
+                               media_base: Optional[str] = None) -> str:
+    """Download buttons for (label, media URL) pairs, fetched from disk on click"""
+    anchors = "".join(
+        f'<a class="download-link" data-src="{html.escape(src)}" download>{html.escape(label)}</a>'
+        for label, src in links
+    )
+    return f"""
+    <style>
+        body {{ margin: 0; font-family: "Source Sans Pro", sans-serif; }}
+        .download-links {{ display: flex; flex-wrap: wrap; gap: 8px; }}
+        .download-link {{
+            padding: 8px 14px; border: 1px solid rgba(49, 51, 63, 0.2); border-radius: 8px;
+            color: rgb(49, 51, 63); background: white; text-decoration: none; font-size: 14px;
+        }}
+        .download-link:hover {{ border-color: #ff4b4b; color: #ff4b4b; }}
+    </style>
+    <div class="download-links">{anchors}</div>
+    <script>
+        const mediaBase = {json.dumps(media_base)};
+        const mediaPort = {json.dumps(media_port)};
+        {RESOLVE_MEDIA_URL_JS}
+        document.querySelectorAll('.download-link').forEach(link => {{
+            link.href = resolveMediaUrl(link.dataset.src);
+        }});
+    </script>
+    """
+
+def player_height(stem_count: int, expanded: bool) -> int:
+    """Iframe height for a player with stem_count stems"""
+    height = PLAYER_BASE_HEIGHT + stem_count * PLAYER_STEM_HEIGHT
+    return height if expanded else min(height, PLAYER_COMPACT_MAX_HEIGHT)
+
+def get_stem_icon(stem_name):
+    """Get appropriate icon for stem type"""
+    stem_name_lower = stem_name.lower()
+    source = stem_source(stem_name)
+    if source is not None and source.startswith('no_'):
+        return "🎼"  # two-stem accompaniment
+    elif 'vocal' in stem_name_lower:
+        return "🎤"
+    elif 'drum' in stem_name_lower:
+        return "🥁"
+    elif 'bass' in stem_name_lower:
+        return "🎸"
+    elif 'guitar' in stem_name_lower:
+        return "🪕"
+    elif 'piano' in stem_name_lower:
+        return "🎹"
+    elif 'other' in stem_name_lower:
+        return "🎵"
+    else:
+        return "🎶"
+
+def create_audio_player_html(stems_data, media_port=None, media_base=None, engine="media",
+                             formats=None, peaks=None):
+    """Create HTML audio player with synchronized playback
+    
+    stems_data maps stem names to audio sources: data URIs, or /media/...
+    paths served by the media server on media_port (or under media_base).
+    engine is "webaudio" (sample-locked AudioContext mixing) or "media"
+    (one <audio> element per stem). Served stems are requested in the first
+    of formats the browser can play, falling back to the original file.
+    peaks maps stem names to encode_peaks_json output, drawn as clickable
+    waveform lanes; stems without peaks get a plain progress bar.
+    """
+    player_formats = [{"name": fmt.spec, "mime": fmt.mime}
+                      for fmt in (formats or [])]
+    peaks = peaks or {}
+    audio_elements = []
+    for i, (name, src) in enumerate(stems_data.items()):
+        audio_elements.append(f"""
+            <audio id="audio_{i}" preload="auto" data-src="{src}"></audio>
+        """)
+    
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+                         .player-container {{
+                 font-family: Arial, sans-serif;
+                 background: #1e1e1e;
+                 padding: 20px;
+                 border-radius: 10px;
+                 color: white;
+                 outline: none;
+                 border: 2px solid transparent;
+                 transition: border-color 0.3s ease;
+             }}
+             .player-container:focus {{
+                 border-color: #4CAF50;
+                 box-shadow: 0 0 15px rgba(76, 175, 80, 0.3);
+             }}
+             .keyboard-hint {{
+                 position: absolute;
+                 top: 10px;
+                 right: 10px;
+                 background: rgba(76, 175, 80, 0.8);
+                 color: white;
+                 padding: 5px 10px;
+                 border-radius: 15px;
+                 font-size: 12px;
+                 opacity: 0;
+                 transition: opacity 0.3s ease;
+             }}
+             .player-container:focus .keyboard-hint {{
+                 opacity: 1;
+             }}
+            .master-controls {{
+                text-align: center;
+                margin-bottom: 30px;
+                padding: 20px;
+                background: #2d2d2d;
+                border-radius: 8px;
+            }}
+            .master-controls button {{
+                background: #4CAF50;
+                color: white;
+                border: none;
+                padding: 10px 20px;
+                margin: 0 5px;
+                border-radius: 5px;
+                cursor: pointer;
+                font-size: 16px;
+            }}
+            .master-controls button:hover {{ background: #45a049; }}
+            .master-controls button.stop {{ background: #f44336; }}
+            .master-controls button.stop:hover {{ background: #da190b; }}
+            .stems-container {{
+                display: flex;
+                flex-direction: column;
+                gap: 15px;
+                margin-top: 20px;
+            }}
+            .stem-control {{
+                background: #2d2d2d;
+                padding: 20px;
+                border-radius: 12px;
+                border: 2px solid #444;
+                display: flex;
+                align-items: center;
+                gap: 20px;
+                transition: border-color 0.3s ease;
+            }}
+            .stem-control:hover {{ border-color: #4CAF50; }}
+            .stem-icon {{
+                font-size: 32px;
+                min-width: 50px;
+                text-align: center;
+            }}
+            .stem-info {{
+                flex: 1;
+                min-width: 0;
+            }}
+            .stem-name {{
+                font-weight: bold;
+                margin-bottom: 8px;
+                color: #4CAF50;
+                font-size: 18px;
+            }}
+            .stem-controls {{
+                display: flex;
+                flex-direction: column;
+                gap: 12px;
+                min-width: 250px;
+            }}
+            .control-row {{
+                display: flex;
+                align-items: center;
+                gap: 10px;
+            }}
+            .control-label {{
+                width: 70px;
+                font-size: 13px;
+                color: #ccc;
+                font-weight: 500;
+            }}
+            input[type="range"] {{
+                flex: 1;
+                height: 6px;
+                -webkit-appearance: none;
+                background: #444;
+                border-radius: 3px;
+                outline: none;
+            }}
+            input[type="range"]::-webkit-slider-thumb {{
+                -webkit-appearance: none;
+                width: 18px;
+                height: 18px;
+                background: #4CAF50;
+                border-radius: 50%;
+                cursor: pointer;
+            }}
+            .volume-value {{
+                min-width: 50px;
+                text-align: right;
+                font-size: 13px;
+                color: #4CAF50;
+                font-weight: 500;
+            }}
+            .control-buttons {{
+                display: flex;
+                gap: 10px;
+                margin: 8px 0 0 0;
+            }}
+            .control-buttons button {{
+                flex: 1;
+                padding: 8px 12px;
+                border: none;
+                border-radius: 6px;
+                cursor: pointer;
+                font-size: 13px;
+                font-weight: 500;
+                transition: all 0.2s ease;
+            }}
+            .mute-btn {{ background: #ff9800; color: white; }}
+            .mute-btn.active {{ background: #f44336; }}
+            .solo-btn {{ background: #2196F3; color: white; }}
+            .solo-btn.active {{ background: #4CAF50; }}
+            .time-display {{
+                text-align: center;
+                margin: 15px 0;
+                font-family: monospace;
+                font-size: 18px;
+                color: #4CAF50;
+            }}
+            .progress-bar {{
+                width: 100%;
+                height: 8px;
+                background: #444;
+                border-radius: 4px;
+                overflow: hidden;
+                margin: 10px 0;
+                cursor: pointer;
+            }}
+                         .progress-fill {{
+                 height: 100%;
+                 background: #4CAF50;
+                 width: 0%;
+                 transition: width 0.1s;
+             }}
+             .stem-progress {{
+                 margin-top: 8px;
+             }}
+             .progress-bar-small {{
+                 width: 100%;
+                 height: 4px;
+                 background: #444;
+                 border-radius: 2px;
+                 overflow: hidden;
+             }}
+             .progress-fill-small {{
+                 height: 100%;
+                 background: #4CAF50;
+                 width: 0%;
+                 transition: width 0.1s;
+             }}
+             .waveform-lane {{
+                 position: relative;
+                 height: 56px;
+                 margin-top: 4px;
+                 background: #252525;
+                 border-radius: 4px;
+                 overflow: hidden;
+                 cursor: pointer;
+             }}
+             .waveform-lane canvas {{
+                 position: absolute;
+                 top: 0;
+                 left: 0;
+             }}
+             .waveform-played {{
+                 position: absolute;
+                 top: 0;
+                 left: 0;
+                 height: 100%;
+                 width: 0%;
+                 overflow: hidden;
+                 transition: width 0.1s;
+             }}
+             .loading-status {{
+                 font-size: 13px;
+                 color: #ccc;
+                 min-height: 1em;
+             }}
+             .fullscreen-btn {{
+                 background: #9C27B0;
+                 color: white;
+                 margin-left: 10px;
+             }}
+             .fullscreen-btn:hover {{
+                 background: #7B1FA2;
+             }}
+        </style>
+    </head>
+    <body>
+                 <div class="player-container" tabindex="0">
+             <div class="keyboard-hint">⌨️ Keyboard controls active</div>
+             {''.join(audio_elements)}
+            
+            <div class="master-controls">
+                <h3>Master Controls</h3>
+                <button onclick="playAll()">▶️ Play</button>
+                <button onclick="pauseAll()">⏸️ Pause</button>
+                <button onclick="stopAll()" class="stop">⏹️ Stop</button>
+                <button onclick="toggleFullscreen()" class="fullscreen-btn">🔳 Fullscreen</button>
+                
+                <div class="control-row" style="max-width: 350px; margin: 15px auto; gap: 15px;">
+                    <span class="control-label" style="width: 80px;">Master:</span>
+                    <input type="range" id="masterVolume" min="0" max="100" value="100" 
+                           oninput="setMasterVolume(this.value)">
+                    <span class="volume-value" id="masterVolumeValue">100%</span>
+                </div>
+                
+                <div class="time-display">
+                    <span id="currentTime">00:00</span> / <span id="totalTime">00:00</span>
+                </div>
+                <div class="loading-status" id="loadingStatus"></div>
+                
+                <div class="progress-bar" onclick="seekTo(event)">
+                    <div class="progress-fill" id="progressFill"></div>
+                </div>
+            </div>
+            
+            <div class="stems-container">
+    """
+    
+    for i, name in enumerate(stems_data.keys()):
+        icon = get_stem_icon(name)
+        clean_name = name.replace('_', ' ').title()
+        if peaks.get(name):
+            # Grey waveform with a green copy revealed up to the playhead; click to seek
+            lane = f"""
+                        <div class="waveform-lane" id="lane_{i}" onclick="seekTo(event)">
+                            <canvas id="waveformBase_{i}"></canvas>
+                            <div class="waveform-played" id="stemProgress_{i}">
+                                <canvas id="waveformPlayed_{i}"></canvas>
+                            </div>
+                        </div>"""
+            progress_bar = ""
+        else:
+            lane = ""
+            progress_bar = f"""
+                        <div class="stem-progress">
+                            <div class="progress-bar-small">
+                                <div class="progress-fill-small" id="stemProgress_{i}"></div>
+                            </div>
+                        </div>"""
+        html_content += f"""
+                <div class="stem-control">
+                    <div class="stem-icon">{icon}</div>
+                    <div class="stem-info">
+                        <div class="stem-name">{clean_name}</div>{lane}
+                    </div>
+                    <div class="stem-controls">
+                        <div class="control-row">
+                            <span class="control-label">Volume:</span>
+                            <input type="range" id="volume_{i}" min="0" max="100" value="100" 
+                                   oninput="setStemVolume({i}, this.value)">
+                            <span class="volume-value" id="volumeValue_{i}">100%</span>
+                        </div>
+                        <div class="control-buttons">
+                            <button class="mute-btn" id="muteBtn_{i}" onclick="toggleMute({i})">
+                                🔇 Mute
+                            </button>
+                            <button class="solo-btn" id="soloBtn_{i}" onclick="toggleSolo({i})">
+                                🎯 Solo
+                            </button>
+                        </div>{progress_bar}
+                    </div>
+                </div>
+        """
+    
+    html_content += f"""
+            </div>
+        </div>
+        
+        <script>
+            const audioElements = [{', '.join([f'document.getElementById("audio_{i}")' for i in range(len(stems_data))])}];
+            const mediaBase = {json.dumps(media_base)};
+            const mediaPort = {json.dumps(media_port)};
+            const playerEngine = {json.dumps(engine)};
+            const playerFormats = {json.dumps(player_formats)};
+            const stemPeaks = [{', '.join(peaks.get(name) or 'null' for name in stems_data)}].map(decodePeaks);
+            
+            {RESOLVE_MEDIA_URL_JS}
+            
+            // First configured format this browser can decode; the media server
+            // transcodes (and caches) it on first request
+            const playerFormat = (() => {{
+                const probe = document.createElement('audio');
+                const format = playerFormats.find(format => probe.canPlayType(format.mime) !== '');
+                return format ? format.name : null;
+            }})();
+            
+            // Levels arrive finest first as base64 (min, max) int8 pairs
+            function decodePeaks(peaks) {{
+                if (!peaks) return null;
+                return {{
+                    duration: peaks.duration,
+                    levels: peaks.levels.map(level => {{
+                        const bytes = Uint8Array.from(atob(level.data), c => c.charCodeAt(0));
+                        return {{ samplesPerPeak: level.samplesPerPeak, data: new Int8Array(bytes.buffer) }};
+                    }}),
+                }};
+            }}
+            
+            // One vertical scale for every lane, so quiet stems look quiet
+            const peakScale = Math.max(1, ...stemPeaks.filter(Boolean).map(peaks => {{
+                const coarsest = peaks.levels[peaks.levels.length - 1];
+                return coarsest ? Math.max(...coarsest.data.map(Math.abs)) : 1;
+            }}));
+            
+            function drawWaveform(index) {{
+                const peaks = stemPeaks[index];
+                const lane = document.getElementById(`lane_${{index}}`);
+                if (!peaks || !lane || !peaks.levels.length) return;
+                const ratio = window.devicePixelRatio || 1;
+                const width = lane.clientWidth;
+                const height = lane.clientHeight;
+                const columns = Math.max(1, Math.floor(width * ratio));
+                // Coarsest level that still has a peak for every pixel column
+                const level = [...peaks.levels].reverse().find(level => level.data.length / 2 >= columns)
+                    || peaks.levels[0];
+                const count = level.data.length / 2;
+                [['waveformBase_', '#666'], ['waveformPlayed_', '#4CAF50']].forEach(([prefix, color]) => {{
+                    const canvas = document.getElementById(prefix + index);
+                    canvas.width = columns;
+                    canvas.height = Math.max(1, Math.floor(height * ratio));
+                    canvas.style.width = width + 'px';
+                    canvas.style.height = height + 'px';
+                    const context = canvas.getContext('2d');
+                    context.fillStyle = color;
+                    const middle = canvas.height / 2;
+                    const scale = middle / peakScale;
+                    for (let x = 0; x < columns; x++) {{
+                        const from = Math.floor(x * count / columns);
+                        const to = Math.max(from + 1, Math.floor((x + 1) * count / columns));
+                        let low = 127;
+                        let high = -127;
+                        for (let j = from; j < to && j < count; j++) {{
+                            low = Math.min(low, level.data[2 * j]);
+                            high = Math.max(high, level.data[2 * j + 1]);
+                        }}
+                        if (high < low) continue;
+                        context.fillRect(x, middle - high * scale, 1, Math.max(1, (high - low) * scale));
+                    }}
+                }});
+            }}
+            
+            function drawWaveforms() {{
+                stemPeaks.forEach((_, index) => drawWaveform(index));
+            }}
+            
+            function stemUrl(src) {{
+                if (!playerFormat || !src.startsWith('/media/')) return resolveMediaUrl(src);
+                return resolveMediaUrl(src) + '?format=' + encodeURIComponent(playerFormat);
+            }}
+            
+            // One <audio> element per stem, kept aligned by assigning currentTime
+            function createMediaElementMixer(elements) {{
+                const mixer = {{
+                    trackCount: elements.length,
+                    onTimeUpdate: null,
+                    onReady: null,
+                    onPlay: null,
+                    onEnded: null,
+                    play() {{
+                        const currentTime = elements[0].currentTime;
+                        elements.forEach(audio => {{
+                            audio.currentTime = currentTime;
+                            audio.play();
+                        }});
+                    }},
+                    pause() {{
+                        elements.forEach(audio => audio.pause());
+                    }},
+                    seek(time) {{
+                        elements.forEach(audio => {{
+                            audio.currentTime = time;
+                        }});
+                    }},
+                    setTrackVolume(index, volume) {{
+                        elements[index].volume = volume;
+                    }},
+                    getCurrentTime(index = 0) {{
+                        return elements[index].currentTime;
+                    }},
+                    getDuration(index = 0) {{
+                        return elements[index].duration || 0;
+                    }},
+                }};
+                elements.forEach((audio, i) => {{
+                    audio.src = stemUrl(audio.dataset.src);
+                    audio.addEventListener('error', () => {{
+                        // Transcode unavailable: play the original file instead
+                        const original = resolveMediaUrl(audio.dataset.src);
+                        if (audio.src !== original) audio.src = original;
+                    }});
+                    audio.addEventListener('loadedmetadata', () => {{
+                        if (i === 0 && mixer.onReady) mixer.onReady();
+                    }});
+                    audio.addEventListener('timeupdate', () => {{
+                        if (mixer.onTimeUpdate) mixer.onTimeUpdate(i);
+                    }});
+                    audio.addEventListener('playing', () => {{
+                        if (i === 0 && mixer.onPlay) mixer.onPlay();
+                    }});
+                    audio.addEventListener('ended', () => {{
+                        if (i === 0 && mixer.onEnded) mixer.onEnded();
+                    }});
+                }});
+                return mixer;
+            }}
+            
+            // Every stem decoded once into an AudioBuffer and started on the same
+            // AudioContext clock, so stems stay sample-locked; volume, mute and solo
+            // are per-stem GainNodes
+            function createWebAudioMixer(elements) {{
+                const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+                const context = new AudioContextClass();
+                const gains = elements.map(() => {{
+                    const gain = context.createGain();
+                    gain.connect(context.destination);
+                    return gain;
+                }});
+                const buffers = elements.map(() => null);
+                let nodes = [];
+                let startedAt = 0;
+                let offset = 0;
+                let playing = false;
+                // Play pressed while the stems are still decoding: start once they are
+                let pendingPlay = false;
+                let timer = null;
+                
+                const mixer = {{
+                    trackCount: elements.length,
+                    onTimeUpdate: null,
+                    onReady: null,
+                    onPlay: null,
+                    onEnded: null,
+                    ready: false,
+                    play() {{
+                        if (!mixer.ready) {{
+                            pendingPlay = true;
+                            return;
+                        }}
+                        if (playing) return;
+                        context.resume();
+                        if (offset >= mixer.getDuration()) offset = 0;
+                        const when = context.currentTime + 0.05;
+                        nodes = buffers.map((buffer, i) => {{
+                            const node = context.createBufferSource();
+                            node.buffer = buffer;
+                            node.connect(gains[i]);
+                            if (offset < buffer.duration) node.start(when, offset);
+                            return node;
+                        }});
+                        startedAt = when - offset;
+                        playing = true;
+                        timer = setInterval(tick, 100);
+                        if (mixer.onPlay) mixer.onPlay();
+                    }},
+                    pause() {{
+                        pendingPlay = false;
+                        if (!playing) return;
+                        offset = mixer.getCurrentTime();
+                        stopNodes();
+                    }},
+                    seek(time) {{
+                        const wasPlaying = playing;
+                        if (playing) stopNodes();
+                        offset = Math.max(0, Math.min(mixer.getDuration(), time));
+                        if (wasPlaying) mixer.play();
+                        tick();
+                    }},
+                    setTrackVolume(index, volume) {{
+                        gains[index].gain.setTargetAtTime(volume, context.currentTime, 0.01);
+                    }},
+                    getCurrentTime(index) {{
+                        const current = playing ? Math.max(0, context.currentTime - startedAt) : offset;
+                        return Math.min(current, mixer.getDuration(index));
+                    }},
+                    getDuration(index) {{
+                        if (index === undefined) {{
+                            return Math.max(0, ...buffers.map(buffer => buffer ? buffer.duration : 0));
+                        }}
+                        return buffers[index] ? buffers[index].duration : 0;
+                    }},
+                }};
+                
+                function stopNodes() {{
+                    nodes.forEach(node => {{
+                        try {{ node.stop(); }} catch (err) {{}}
+                    }});
+                    nodes = [];
+                    playing = false;
+                    clearInterval(timer);
+                }}
+                
+                function tick() {{
+                    if (playing && context.currentTime - startedAt >= mixer.getDuration()) {{
+                        offset = mixer.getDuration();
+                        stopNodes();
+                        if (mixer.onEnded) mixer.onEnded();
+                    }}
+                    if (mixer.onTimeUpdate) {{
+                        for (let i = 0; i < mixer.trackCount; i++) mixer.onTimeUpdate(i);
+                    }}
+                }}
+                
+                const status = document.getElementById('loadingStatus');
+                status.textContent = '⏳ Decoding stems...';
+                function decode(url) {{
+                    return fetch(url)
+                        .then(response => {{
+                            if (!response.ok) throw new Error(`HTTP ${{response.status}}`);
+                            return response.arrayBuffer();
+                        }})
+                        .then(data => context.decodeAudioData(data));
+                }}
+                Promise.all(elements.map((audio, i) => {{
+                    const url = stemUrl(audio.dataset.src);
+                    const original = resolveMediaUrl(audio.dataset.src);
+                    // Transcode unavailable or undecodable: use the original file instead
+                    return decode(url)
+                        .catch(err => url === original ? Promise.reject(err) : decode(original))
+                        .then(buffer => {{ buffers[i] = buffer; }});
+                }})).then(() => {{
+                    mixer.ready = true;
+                    status.textContent = '';
+                    if (mixer.onReady) mixer.onReady();
+                    if (pendingPlay) {{
+                        pendingPlay = false;
+                        mixer.play();
+                    }}
+                }}).catch(err => {{
+                    status.textContent = '⚠️ Could not decode stems: ' + err;
+                }});
+                return mixer;
+            }}
+            
+            const useWebAudio = playerEngine === 'webaudio' && (window.AudioContext || window.webkitAudioContext);
+            const mixer = useWebAudio ? createWebAudioMixer(audioElements) : createMediaElementMixer(audioElements);
+            let isPlaying = false;
+            let soloedTrack = -1;
+            const mutedTracks = new Set();
+            
+            mixer.onReady = () => updateTimeDisplay();
+            mixer.onTimeUpdate = (i) => {{
+                updateStemProgress(i);
+                if (i === 0) {{
+                    updateTimeDisplay();
+                    updateProgressBar();
+                }}
+            }};
+            // Set once playback has really started, which may be after the stems load
+            mixer.onPlay = () => {{
+                isPlaying = true;
+            }};
+            mixer.onEnded = () => {{
+                isPlaying = false;
+            }};
+            
+            function playAll() {{
+                mixer.play();
+            }}
+            
+            function pauseAll() {{
+                mixer.pause();
+                isPlaying = false;
+            }}
+            
+            function stopAll() {{
+                mixer.pause();
+                mixer.seek(0);
+                isPlaying = false;
+                updateTimeDisplay();
+                updateProgressBar();
+            }}
+            
+            function setMasterVolume(value) {{
+                const volume = value / 100;
+                for (let i = 0; i < mixer.trackCount; i++) {{
+                    if (!mutedTracks.has(i) && (soloedTrack === -1 || soloedTrack === i)) {{
+                        const stemVolume = document.getElementById(`volume_${{i}}`).value / 100;
+                        mixer.setTrackVolume(i, volume * stemVolume);
+                    }}
+                }}
+                document.getElementById('masterVolumeValue').textContent = value + '%';
+            }}
+            
+            function setStemVolume(index, value) {{
+                const volume = value / 100;
+                const masterVolume = document.getElementById('masterVolume').value / 100;
+                if (!mutedTracks.has(index) && (soloedTrack === -1 || soloedTrack === index)) {{
+                    mixer.setTrackVolume(index, volume * masterVolume);
+                }}
+                document.getElementById(`volumeValue_${{index}}`).textContent = value + '%';
+            }}
+            
+            function toggleMute(index) {{
+                const btn = document.getElementById(`muteBtn_${{index}}`);
+                if (mutedTracks.has(index)) {{
+                    mutedTracks.delete(index);
+                    btn.classList.remove('active');
+                    btn.textContent = '🔇 Mute';
+                    if (soloedTrack === -1 || soloedTrack === index) {{
+                        const stemVolume = document.getElementById(`volume_${{index}}`).value / 100;
+                        const masterVolume = document.getElementById('masterVolume').value / 100;
+                        mixer.setTrackVolume(index, stemVolume * masterVolume);
+                    }}
+                }} else {{
+                    mutedTracks.add(index);
+                    btn.classList.add('active');
+                    btn.textContent = '🔊 Unmute';
+                    mixer.setTrackVolume(index, 0);
+                }}
+            }}
+            
+            function toggleSolo(index) {{
+                const btn = document.getElementById(`soloBtn_${{index}}`);
+                if (soloedTrack === index) {{
+                    soloedTrack = -1;
+                    btn.classList.remove('active');
+                    btn.textContent = '🎯 Solo';
+                    for (let i = 0; i < mixer.trackCount; i++) {{
+                        if (!mutedTracks.has(i)) {{
+                            const stemVolume = document.getElementById(`volume_${{i}}`).value / 100;
+                            const masterVolume = document.getElementById('masterVolume').value / 100;
+                            mixer.setTrackVolume(i, stemVolume * masterVolume);
+                        }}
+                    }}
+                }} else {{
+                    if (soloedTrack !== -1) {{
+                        const prevBtn = document.getElementById(`soloBtn_${{soloedTrack}}`);
+                        prevBtn.classList.remove('active');
+                        prevBtn.textContent = '🎯 Solo';
+                    }}
+                    soloedTrack = index;
+                    btn.classList.add('active');
+                    btn.textContent = '🔇 Unsolo';
+                    for (let i = 0; i < mixer.trackCount; i++) {{
+                        if (i === index && !mutedTracks.has(i)) {{
+                            const stemVolume = document.getElementById(`volume_${{i}}`).value / 100;
+                            const masterVolume = document.getElementById('masterVolume').value / 100;
+                            mixer.setTrackVolume(i, stemVolume * masterVolume);
+                        }} else {{
+                            mixer.setTrackVolume(i, 0);
+                        }}
+                    }}
+                }}
+            }}
+            
+            function updateTimeDisplay() {{
+                const current = mixer.getCurrentTime();
+                const total = mixer.getDuration();
+                document.getElementById('currentTime').textContent = formatTime(current);
+                document.getElementById('totalTime').textContent = formatTime(total);
+            }}
+            
+            function updateProgressBar() {{
+                const current = mixer.getCurrentTime();
+                const total = mixer.getDuration();
+                const progress = total > 0 ? (current / total) * 100 : 0;
+                document.getElementById('progressFill').style.width = progress + '%';
+            }}
+            
+            function updateStemProgress(index) {{
+                const current = mixer.getCurrentTime(index);
+                const total = mixer.getDuration(index);
+                const progress = total > 0 ? (current / total) * 100 : 0;
+                const progressElement = document.getElementById(`stemProgress_${{index}}`);
+                if (progressElement) {{
+                    progressElement.style.width = progress + '%';
+                }}
+            }}
+            
+            function seekTo(event) {{
+                if (mixer.getDuration()) {{
+                    const progressBar = event.currentTarget;
+                    const rect = progressBar.getBoundingClientRect();
+                    const clickX = event.clientX - rect.left;
+                    const percentage = clickX / rect.width;
+                    mixer.seek(percentage * mixer.getDuration());
+                }}
+            }}
+            
+            function formatTime(seconds) {{
+                const mins = Math.floor(seconds / 60);
+                const secs = Math.floor(seconds % 60);
+                return `${{mins.toString().padStart(2, '0')}}:${{secs.toString().padStart(2, '0')}}`;
+            }}
+            
+            function toggleFullscreen() {{
+                const container = document.querySelector('.player-container');
+                if (!document.fullscreenElement) {{
+                    container.requestFullscreen().catch(err => {{
+                        console.log('Error attempting to enable fullscreen:', err);
+                    }});
+                }} else {{
+                    document.exitFullscreen();
+                }}
+            }}
+            
+            // Handle fullscreen changes
+            document.addEventListener('fullscreenchange', () => {{
+                const container = document.querySelector('.player-container');
+                if (document.fullscreenElement) {{
+                    container.style.padding = '40px';
+                    container.style.height = '100vh';
+                    container.style.overflowY = 'auto';
+                }} else {{
+                    container.style.padding = '20px';
+                    container.style.height = 'auto';
+                    container.style.overflowY = 'visible';
+                }}
+                drawWaveforms();
+            }});
+            window.addEventListener('resize', drawWaveforms);
+            
+            // Keyboard Controls
+            document.addEventListener('keydown', (event) => {{
+                const key = event.key.toLowerCase();
+                const ctrlKey = event.ctrlKey || event.metaKey;
+                
+                // Don't interfere if user is typing in an input field
+                if (event.target.tagName === 'INPUT' || event.target.tagName === 'TEXTAREA') {{
+                    return;
+                }}
+                
+                switch(key) {{
+                    case ' ':
+                    case 'spacebar':
+                        event.preventDefault();
+                        if (isPlaying) {{
+                            pauseAll();
+                        }} else {{
+                            playAll();
+                        }}
+                        break;
+                        
+                    case 's':
+                    case 'escape':
+                        event.preventDefault();
+                        stopAll();
+                        break;
+                        
+                    case 'f':
+                        if (!ctrlKey) {{
+                            event.preventDefault();
+                            toggleFullscreen();
+                        }}
+                        break;
+                        
+                    case 'arrowleft':
+                        event.preventDefault();
+                        seekRelative(-10);
+                        break;
+                        
+                    case 'arrowright':
+                        event.preventDefault();
+                        seekRelative(10);
+                        break;
+                        
+                    case 'arrowup':
+                        event.preventDefault();
+                        adjustMasterVolume(5);
+                        break;
+                        
+                    case 'arrowdown':
+                        event.preventDefault();
+                        adjustMasterVolume(-5);
+                        break;
+                        
+                    case 'm':
+                        event.preventDefault();
+                        toggleMasterMute();
+                        break;
+                        
+                    case '1':
+                    case '2':
+                    case '3':
+                    case '4':
+                    case '5':
+                    case '6':
+                    case '7':
+                    case '8':
+                    case '9':
+                        event.preventDefault();
+                        const stemIndex = parseInt(key) - 1;
+                        if (stemIndex < mixer.trackCount) {{
+                            toggleSolo(stemIndex);
+                        }}
+                        break;
+                        
+                    case '!':
+                    case '@':
+                    case '#':
+                    case '$':
+                    case '%':
+                    case '^':
+                    case '&':
+                    case '*':
+                    case '(':
+                        event.preventDefault();
+                        const shiftKeys = {{'!': 0, '@': 1, '#': 2, '$': 3, '%': 4, '^': 5, '&': 6, '*': 7, '(': 8}};
+                        const muteIndex = shiftKeys[key];
+                        if (muteIndex < mixer.trackCount) {{
+                            toggleMute(muteIndex);
+                        }}
+                        break;
+                }}
+            }});
+            
+            // Helper functions for keyboard controls
+            function seekRelative(seconds) {{
+                if (mixer.getDuration()) {{
+                    const newTime = Math.max(0, Math.min(mixer.getDuration(), mixer.getCurrentTime() + seconds));
+                    mixer.seek(newTime);
+                }}
+            }}
+            
+            function adjustMasterVolume(delta) {{
+                const masterVolumeSlider = document.getElementById('masterVolume');
+                const currentValue = parseInt(masterVolumeSlider.value);
+                const newValue = Math.max(0, Math.min(100, currentValue + delta));
+                masterVolumeSlider.value = newValue;
+                setMasterVolume(newValue);
+            }}
+            
+            let masterMuted = false;
+            let previousMasterVolume = 100;
+            
+            function toggleMasterMute() {{
+                const masterVolumeSlider = document.getElementById('masterVolume');
+                
+                if (masterMuted) {{
+                    masterVolumeSlider.value = previousMasterVolume;
+                    setMasterVolume(previousMasterVolume);
+                    masterMuted = false;
+                }} else {{
+                    previousMasterVolume = masterVolumeSlider.value;
+                    masterVolumeSlider.value = 0;
+                    setMasterVolume(0);
+                    masterMuted = true;
+                }}
+            }}
+            
+            // Initialize player focus
+            const playerContainer = document.querySelector('.player-container');
+            
+            setTimeout(() => {{
+                playerContainer.focus();
+            }}, 100);
+            
+            playerContainer.addEventListener('click', () => {{
+                playerContainer.focus();
+            }});
+            
+            setTimeout(() => {{
+                playerContainer.style.borderColor = '#4CAF50';
+                setTimeout(() => {{
+                    if (document.activeElement !== playerContainer) {{
+                        playerContainer.style.borderColor = 'transparent';
+                    }}
+                }}, 3000);
+            }}, 500);
+            
+            drawWaveforms();
+            updateTimeDisplay();
+        </script>
+    </body>
+    </html>
+    """
+    return html_content
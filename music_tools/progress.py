@@ -0,0 +1,123 @@
+import re
+import threading
+import time
+import wave
+from typing import Callable, Optional
+
+from music_tools.config import get_float_env
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Tools that report progress are killed after this many seconds without output; 0 disables
+STALL_TIMEOUT_ENV = "MUSIC_TOOLS_STALL_TIMEOUT"
+DEFAULT_STALL_TIMEOUT = 600.0
+
+# Minimum time between progress updates passed on to the callback
+UPDATE_INTERVAL = 0.5
+
+ProgressCallback = Callable[[float, str], None]
+
+def get_stall_timeout() -> Optional[float]:
+    """Configured idle timeout for tool processes, or None when disabled"""
+    timeout = get_float_env(STALL_TIMEOUT_ENV, DEFAULT_STALL_TIMEOUT)
+    return timeout if timeout > 0 else None
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+# ─── Progress Reporting ─────────────────────────────────────────────
+
+def scale_progress(callback: Optional[ProgressCallback], start: float,
+                   end: float) -> Optional[ProgressCallback]:
+    """Callback that maps a stage's 0..1 onto [start, end] of the overall progress"""
+    if callback is None:
+        return None
+    return lambda fraction, message: callback(start + fraction * (end - start), message)
+
+class ProgressReporter:
+    """Turns a stage's fraction done into throttled "<label> 45% · ETA 1:05" updates
+
+    Updates may arrive from several threads at once; each one passed on can be
+    a database write, so at most one per UPDATE_INTERVAL gets through.
+    """
+
+    def __init__(self, callback: Optional[ProgressCallback], label: str):
+        self.callback = callback
+        self.label = label
+        self._started = time.monotonic()
+        self._last_update = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Announce the stage and start its ETA clock"""
+        self._started = time.monotonic()
+        if self.callback is not None:
+            self.callback(0.0, f"{self.label}...")
+
+    def update(self, fraction: float, force: bool = False):
+        if self.callback is None:
+            return
+        fraction = max(0.0, min(1.0, fraction))
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_update < UPDATE_INTERVAL:
+                return
+            self._last_update = now
+        message = f"{self.label} {fraction:.0%}"
+        elapsed = now - self._started
+        if 0 < fraction < 1 and elapsed > 1:
+            message += f" · ETA {format_duration(elapsed * (1 - fraction) / fraction)}"
+        self.callback(fraction, message)
+
+# ─── Tool Output Parsers ─────────────────────────────────────────────
+
+# tqdm bar as printed by the demucs CLI: " 45%|████▌     | 52.6/117.0 [00:10<00:12, ...]"
+TQDM_PERCENT_RE = re.compile(r"(\d{1,3})%\|")
+
+def demucs_progress(reporter: ProgressReporter) -> Callable[[str], None]:
+    """Line handler that forwards the demucs CLI's progress bar"""
+    def on_line(line: str):
+        match = TQDM_PERCENT_RE.search(line)
+        if match:
+            reporter.update(int(match.group(1)) / 100)
+    return on_line
+
+def wav_duration(path: str) -> Optional[float]:
+    """Length of a PCM WAV file in seconds, from its header"""
+    try:
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / wav.getframerate() or None
+    except (OSError, EOFError, wave.Error):
+        return None
+
+FFMPEG_DURATION_RE = re.compile(r"Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)")
+
+class FfmpegProgress:
+    """Line handler for ffmpeg's "-progress pipe:1" key=value output
+
+    The input duration comes from the caller, or from the "Duration:" line
+    ffmpeg logs at the default log level.
+    """
+
+    def __init__(self, on_fraction: Callable[[float], None], duration: Optional[float] = None):
+        self.on_fraction = on_fraction
+        self.duration = duration
+
+    def __call__(self, line: str):
+        key, _, value = line.strip().partition("=")
+        if key == "out_time_us" and self.duration:
+            try:
+                self.on_fraction(min(1.0, int(value) / 1e6 / self.duration))
+            except ValueError:
+                pass  # "N/A" before the first packet
+        elif key == "progress" and value == "end":
+            self.on_fraction(1.0)
+        elif self.duration is None:
+            match = FFMPEG_DURATION_RE.search(line)
+            if match:
+                hours, minutes, seconds = match.groups()
+                self.duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds) or None
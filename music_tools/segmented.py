@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from typing import Optional
+
+import numpy as np
+
+from music_tools.cache import get_cache_root, hash_file
+from music_tools.config import get_int_env
+from music_tools.encoding import Mp3PipeEncoder, WavWriter, rescale_factor
+from music_tools.metrics import run_process, span
+from music_tools.progress import ProgressCallback
+from music_tools.separation import SEPARATION_PARAMS, DemucsEngine, combine_sources, output_stems
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# "auto" segments only tracks that would not fit the memory budget in one pass
+SEGMENT_MODE_ENV = "MUSIC_TOOLS_SEGMENT_MODE"
+SEPARATION_MEMORY_MB_ENV = "MUSIC_TOOLS_SEPARATION_MEMORY_MB"
+
+DEFAULT_SEPARATION_MEMORY_MB = 2048
+OVERLAP_SECONDS = 5.0
+MIN_SEGMENT_SECONDS = 30.0
+WRITE_CHUNK_SECONDS = 10.0
+
+# Peak memory of a Demucs pass that grows with track length, in multiples of
+# (input + all separated sources). With split=True the model runs on fixed
+# ~8 s chunks, so its activations don't grow with length; what does is the
+# normalized and padded copies of the input and the output accumulator next to
+# the rescaled result, about twice the raw tensors. At the 2048 MB default a
+# four-source model separates up to ~10 min in one pass (~7.5 min at 1536 MB).
+MEMORY_OVERHEAD = 2
+
+MANIFEST_FILE = "manifest.json"
+
+# ─── Segment Planning ─────────────────────────────────────────────
+
+def get_memory_budget() -> int:
+    """Configured peak memory for one separation, in bytes"""
+    return get_int_env(SEPARATION_MEMORY_MB_ENV, DEFAULT_SEPARATION_MEMORY_MB) * 1024 * 1024
+
+def get_segment_seconds(engine: DemucsEngine) -> float:
+    """Longest segment that keeps a Demucs pass within the memory budget"""
+    channels = engine.model.audio_channels
+    bytes_per_second = engine.samplerate * channels * 4 * (1 + len(engine.sources)) * MEMORY_OVERHEAD
+    return max(MIN_SEGMENT_SECONDS, get_memory_budget() / bytes_per_second)
+
+def probe_duration(path: str) -> Optional[float]:
+    """Duration of an audio file in seconds, via ffprobe"""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path]
+    try:
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        return float(output.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def should_segment(input_audio_path: str, engine: DemucsEngine) -> bool:
+    """Decide whether a file needs segmented separation"""
+    mode = os.environ.get(SEGMENT_MODE_ENV, "auto").strip().lower()
+    if mode == "always":
+        return True
+    if mode == "never":
+        return False
+    duration = probe_duration(input_audio_path)
+    return duration is not None and duration > get_segment_seconds(engine)
+
+def plan_segments(total_frames: int, segment_frames: int, overlap_frames: int) -> list[tuple[int, int]]:
+    """Overlapping [start, end) windows covering the whole track"""
+    if total_frames <= segment_frames:
+        return [(0, total_frames)]
+    hop = segment_frames - overlap_frames
+    segments = []
+    start = 0
+    while True:
+        end = min(start + segment_frames, total_frames)
+        segments.append((start, end))
+        if end >= total_frames:
+            return segments
+        start += hop
+
+# ─── Segmented Separation ─────────────────────────────────────────────
+
+class SegmentedSeparation:
+    """Separates a long file in overlapping windows with on-disk checkpoints
+
+    The input is decoded once to raw PCM and memory-mapped; each finished
+    window is saved under the checkpoint folder, so a restarted job only
+    separates the windows that are missing. Outputs are assembled with
+    linear crossfades over the overlaps and streamed to the stem writers.
+    """
+
+    def __init__(self, engine: DemucsEngine, input_audio_path: str,
+                 checkpoint_root: Optional[str] = None, segment_seconds: Optional[float] = None):
+        self.engine = engine
+        self.input_audio_path = input_audio_path
+        self.samplerate = engine.samplerate
+        self.channels = engine.model.audio_channels
+        self.segment_seconds = segment_seconds or get_segment_seconds(engine)
+        self.overlap_seconds = min(OVERLAP_SECONDS, self.segment_seconds / 4)
+
+        key = hashlib.sha256(json.dumps({
+            "audio": hash_file(input_audio_path),
+            "model": engine.model_name,
+            "params": SEPARATION_PARAMS,
+            "segment": self.segment_seconds,
+            "overlap": self.overlap_seconds,
+        }, sort_keys=True).encode()).hexdigest()
+        root = checkpoint_root or os.path.join(get_cache_root(), "segments")
+        self.checkpoint_dir = os.path.join(root, key)
+        self.raw_path = os.path.join(self.checkpoint_dir, "input.f32")
+        self.manifest_path = os.path.join(self.checkpoint_dir, MANIFEST_FILE)
+        self.manifest: dict = {}
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"segment_{index:05d}.npy")
+
+    def _decode_input(self):
+        """Decode the input once to interleaved float32 PCM at the model's rate"""
+        partial = self.raw_path + ".partial"
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error",
+            "-i", self.input_audio_path, "-vn",
+            "-f", "f32le", "-ac", str(self.channels), "-ar", str(self.samplerate),
+            "-y", partial,
+        ]
+        run_process(cmd, "ffmpeg.decode", capture_output=True)
+        os.replace(partial, self.raw_path)
+
+    def _load_input(self) -> np.memmap:
+        return np.memmap(self.raw_path, dtype="<f4", mode="r").reshape(-1, self.channels)
+
+    def _prepare(self):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            return
+
+        if not os.path.exists(self.raw_path):
+            self._decode_input()
+        pcm = self._load_input()
+
+        # Normalise every window with whole-track statistics so levels match at the joins
+        total, total_sq, count = 0.0, 0.0, 0
+        step = int(WRITE_CHUNK_SECONDS * self.samplerate)
+        for start in range(0, len(pcm), step):
+            mono = np.asarray(pcm[start:start + step], dtype=np.float64).mean(axis=1)
+            total += mono.sum()
+            total_sq += np.square(mono).sum()
+            count += len(mono)
+        mean = total / max(count, 1)
+        std = float(np.sqrt(max(total_sq / max(count, 1) - mean ** 2, 0.0)))
+
+        segments = plan_segments(
+            len(pcm),
+            int(self.segment_seconds * self.samplerate),
+            int(self.overlap_seconds * self.samplerate),
+        )
+        self.manifest = {
+            "frames": len(pcm),
+            "mean": mean,
+            "std": std,
+            "segments": segments,
+            "sources": self.engine.sources,
+        }
+        with open(self.manifest_path + ".partial", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_path + ".partial", self.manifest_path)
+
+    def run(self, progress: Optional[ProgressCallback] = None):
+        """Separate every window that has no checkpoint yet"""
+        import torch
+
+        self._prepare()
+        pcm = self._load_input()
+        segments = self.manifest["segments"]
+        for index, (start, end) in enumerate(segments):
+            path = self._segment_path(index)
+            if os.path.exists(path):
+                continue  # finished before an interruption
+            if progress:
+                progress(index / len(segments), f"Separating segment {index + 1}/{len(segments)}...")
+            with span("demucs.inference", segment=index):
+                wav = torch.from_numpy(np.ascontiguousarray(pcm[start:end].T))
+                sources = self.engine.separate_waveform(wav, self.manifest["mean"], self.manifest["std"])
+            partial = path + ".partial.npy"
+            np.save(partial, sources.numpy().astype(np.float32))
+            os.replace(partial, path)
+            del wav, sources
+        if progress:
+            progress(1.0, "Segments separated")
+
+    def _iter_output(self):
+        """Yield (sources, channels, n) blocks of the crossfaded full-length output"""
+        segments = self.manifest["segments"]
+        chunk = int(WRITE_CHUNK_SECONDS * self.samplerate)
+        tail = None
+        for index, (start, end) in enumerate(segments):
+            block = np.load(self._segment_path(index), mmap_mode="r")
+            body_start = 0
+            if tail is not None:
+                overlap = tail.shape[-1]
+                fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+                yield tail * (1.0 - fade_in) + block[..., :overlap] * fade_in
+                body_start = overlap
+            if index + 1 < len(segments):
+                next_start = segments[index + 1][0]
+                body_end = next_start - start
+                tail = np.array(block[..., body_end:])
+            else:
+                body_end = block.shape[-1]
+                tail = None
+            for offset in range(body_start, body_end, chunk):
+                yield np.asarray(block[..., offset:min(offset + chunk, body_end)])
+
+    def _peaks(self, two_stems: Optional[str] = None) -> list[float]:
+        """Per-stem peak level; crossfades can never exceed the larger input"""
+        sources = self.manifest["sources"]
+        peaks = [0.0] * len(output_stems(sources, two_stems))
+        for index in range(len(self.manifest["segments"])):
+            block = np.load(self._segment_path(index), mmap_mode="r")
+            for i, stem in enumerate(combine_sources(block, sources, two_stems)):
+                peaks[i] = max(peaks[i], float(np.abs(stem).max()))
+        return peaks
+
+    def write(self, output_dir: str, fmt: str = "wav", two_stems: Optional[str] = None) -> dict[str, str]:
+        """Assemble the stems into <output_dir>/<stem>.<fmt>, returning errors by stem"""
+        sources = self.manifest["sources"]
+        names = output_stems(sources, two_stems)
+        writer_class = Mp3PipeEncoder if fmt == "mp3" else WavWriter
+        writers = [
+            writer_class(os.path.join(output_dir, f"{name}.{fmt}"), self.samplerate, self.channels,
+                         scale=rescale_factor(peak))
+            for name, peak in zip(names, self._peaks(two_stems))
+        ]
+        try:
+            for block in self._iter_output():
+                for writer, stem in zip(writers, combine_sources(block, sources, two_stems)):
+                    writer.write(stem)
+        finally:
+            errors = [writer.close() for writer in writers]
+        return {name: error for name, error in zip(names, errors) if error}
+
+    def cleanup(self):
+        """Remove the checkpoints once the output has been written"""
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
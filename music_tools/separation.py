@@ -0,0 +1,226 @@
+import gc
+import importlib.util
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from music_tools.config import get_int_env
+from music_tools.cpu import apply_torch_threads
+from music_tools.metrics import span
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# "auto" (in-process when demucs is importable), "inprocess" or "subprocess"
+SEPARATION_BACKEND_ENV = "MUSIC_TOOLS_SEPARATION_BACKEND"
+
+DEFAULT_MODEL = "htdemucs"
+
+# Model used when a job doesn't pick one: a name from MODELS (default: DEFAULT_MODEL),
+# or "auto" to opt in to load-dependent model choice
+SEPARATION_MODEL_ENV = "MUSIC_TOOLS_SEPARATION_MODEL"
+AUTO_MODEL = "auto"
+
+# "auto" runs the fine-tuned model, but drops to the fast one once this many
+# jobs are queued or running, or when fewer CPUs than this are available
+AUTO_QUEUE_DEPTH_ENV = "MUSIC_TOOLS_AUTO_MODEL_QUEUE_DEPTH"
+AUTO_MIN_CPUS_ENV = "MUSIC_TOOLS_AUTO_MODEL_MIN_CPUS"
+DEFAULT_AUTO_QUEUE_DEPTH = 3
+DEFAULT_AUTO_MIN_CPUS = 4
+QUALITY_MODEL = "htdemucs_ft"
+FAST_MODEL = DEFAULT_MODEL
+
+# Settings that affect separation output (also part of the cache key)
+SEPARATION_PARAMS = {"shifts": 1, "split": True, "overlap": 0.25}
+
+# ─── Models ─────────────────────────────────────────────
+
+FOUR_SOURCES = ("drums", "bass", "other", "vocals")
+SIX_SOURCES = FOUR_SOURCES + ("guitar", "piano")
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """A separation model and what it costs to run on CPU
+
+    cost is CPU time relative to htdemucs and memory_mb the peak resident
+    memory for a 4-minute song. Both are unmeasured estimates (from each
+    model's size and passes per source), not bench results; replace them with
+    the output of benchmarks/bench_models.py, recording the machine it ran on.
+    """
+    name: str
+    label: str
+    sources: tuple[str, ...]
+    cost: float
+    memory_mb: int
+    description: str
+
+MODELS = {
+    "htdemucs": ModelProfile(
+        "htdemucs", "Fast (htdemucs)", FOUR_SOURCES, 1.0, 1500,
+        "Hybrid Transformer Demucs; good quality at the lowest cost"),
+    "htdemucs_ft": ModelProfile(
+        "htdemucs_ft", "Fine-tuned (htdemucs_ft)", FOUR_SOURCES, 4.0, 1700,
+        "One fine-tuned htdemucs per source; the cleanest stems, about 4x slower"),
+    "htdemucs_6s": ModelProfile(
+        "htdemucs_6s", "6 stems (htdemucs_6s)", SIX_SOURCES, 1.1, 1800,
+        "Also splits guitar and piano out of \"other\"; piano is still rough"),
+    "mdx_extra": ModelProfile(
+        "mdx_extra", "MDX (mdx_extra)", FOUR_SOURCES, 2.5, 2000,
+        "Bag of four Demucs v3 models from the MDX challenge"),
+}
+
+def get_model_profile(name: str) -> ModelProfile:
+    """Profile of a known model, raising ValueError for unknown names"""
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown separation model: {name} "
+                         f"(choose from {AUTO_MODEL}, {', '.join(MODELS)})") from None
+
+def get_default_model() -> str:
+    """Configured model for jobs that don't choose one ("auto" or a model name)"""
+    model = os.environ.get(SEPARATION_MODEL_ENV, DEFAULT_MODEL).strip().lower()
+    return model if model == AUTO_MODEL or model in MODELS else DEFAULT_MODEL
+
+def resolve_model(requested: Optional[str], queue_depth: int, cpus: int) -> str:
+    """Concrete model for a job; "auto" (or None: the configured default) is settled by load"""
+    model = requested or get_default_model()
+    if model != AUTO_MODEL:
+        return get_model_profile(model).name
+    if (queue_depth >= get_int_env(AUTO_QUEUE_DEPTH_ENV, DEFAULT_AUTO_QUEUE_DEPTH)
+            or cpus < get_int_env(AUTO_MIN_CPUS_ENV, DEFAULT_AUTO_MIN_CPUS)):
+        return FAST_MODEL
+    return QUALITY_MODEL
+
+# ─── Two-Stem Output ─────────────────────────────────────────────
+
+# Stem files are <song>_<source>.<ext>, or <song>_no_<source> for a two-stem
+# accompaniment; only this suffix counts, never the song title before it
+STEM_SUFFIX_RE = re.compile(rf"(?:^|_)((?:no_)?(?:{'|'.join(SIX_SOURCES)}))(?:\.\w+)?$")
+
+def stem_source(file_name: str) -> Optional[str]:
+    """Source named by a stem file's suffix ("Piano_no_vocals.mp3" -> "no_vocals"), if any"""
+    match = STEM_SUFFIX_RE.search(os.path.basename(file_name).lower())
+    return match.group(1) if match else None
+
+def output_stems(sources: list[str], two_stems: Optional[str] = None) -> list[str]:
+    """Stems written for a model's sources: all of them, or <stem> and no_<stem>"""
+    if two_stems is None:
+        return list(sources)
+    if two_stems not in sources:
+        raise ValueError(f"Cannot split off {two_stems} (choose from {', '.join(sources)})")
+    return [two_stems, f"no_{two_stems}"]
+
+def combine_sources(separated, sources: list[str], two_stems: Optional[str] = None) -> list:
+    """Per-stem audio in output_stems order, from a (sources, ...) tensor or array
+
+    The model always estimates every source; in two-stem mode the others are
+    summed into one accompaniment, so only two stems are encoded and stored.
+    """
+    if two_stems is None:
+        return list(separated)
+    index = sources.index(two_stems)
+    rest = [i for i in range(len(sources)) if i != index]
+    return [separated[index], separated[rest].sum(0)]
+
+# ─── In-Process Demucs Engine ─────────────────────────────────────────────
+
+class DemucsEngine:
+    """Demucs model loaded once and reused for every separation"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, device: str = "cpu"):
+        # Heavy imports are deferred until an engine is actually needed
+        import torch
+        from demucs.pretrained import get_model
+
+        apply_torch_threads(torch)
+        self.model_name = model_name
+        self.device = device
+        self.model = get_model(model_name)
+        self.model.to(device)
+        self.model.eval()
+        self._torch = torch
+
+    @property
+    def sources(self) -> list[str]:
+        return list(self.model.sources)
+
+    @property
+    def samplerate(self) -> int:
+        return self.model.samplerate
+
+    def separate_tensors(self, input_audio_path: str):
+        """Run the model on a file and return a (sources, channels, samples) tensor"""
+        from demucs.audio import AudioFile
+
+        wav = AudioFile(input_audio_path).read(
+            streams=0,
+            samplerate=self.model.samplerate,
+            channels=self.model.audio_channels,
+        )
+        return self.separate_waveform(wav)
+
+    def separate_waveform(self, wav, mean: Optional[float] = None, std: Optional[float] = None):
+        """Separate a (channels, samples) tensor; mean/std default to the tensor's own"""
+        from demucs.apply import apply_model
+
+        if mean is None or std is None:
+            ref = wav.mean(0)
+            mean, std = ref.mean().item(), ref.std().item()
+        wav = (wav - mean) / (std + 1e-8)
+
+        with self._torch.no_grad():
+            sources = apply_model(
+                self.model, wav[None], device=self.device,
+                progress=False, **SEPARATION_PARAMS,
+            )[0]
+        return (sources * (std + 1e-8) + mean).cpu()
+
+    def separate(self, input_audio_path: str, output_dir: str, two_stems: Optional[str] = None) -> str:
+        """Separate a file into <output_dir>/<model>/<track>/<stem>.wav"""
+        from demucs.audio import save_audio
+
+        names = output_stems(self.sources, two_stems)
+        sources = combine_sources(self.separate_tensors(input_audio_path), self.sources, two_stems)
+
+        # Same layout as the demucs CLI so callers don't care which backend ran
+        track_name = os.path.splitext(os.path.basename(input_audio_path))[0]
+        stems_folder = os.path.join(output_dir, self.model_name, track_name)
+        os.makedirs(stems_folder, exist_ok=True)
+        for source, name in zip(sources, names):
+            save_audio(source, os.path.join(stems_folder, f"{name}.wav"),
+                       samplerate=self.model.samplerate)
+        return stems_folder
+
+_engine: Optional[DemucsEngine] = None
+_engine_lock = threading.Lock()
+
+def get_engine(model_name: str = DEFAULT_MODEL) -> DemucsEngine:
+    """Get the process-wide engine for a model, loading it on first use
+
+    Only one model is kept loaded: asking for another releases the current
+    one before the new one loads, so two models never share the memory limit.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.model_name != model_name:
+            if _engine is not None:
+                _engine = None
+                gc.collect()
+            with span("demucs.load", model=model_name):
+                _engine = DemucsEngine(model_name)
+        return _engine
+
+def inprocess_available() -> bool:
+    """Check whether demucs can be imported in this process"""
+    return importlib.util.find_spec("demucs") is not None
+
+def get_separation_backend() -> str:
+    """Resolve the configured separation backend"""
+    backend = os.environ.get(SEPARATION_BACKEND_ENV, "auto").strip().lower()
+    if backend not in ("auto", "inprocess", "subprocess"):
+        backend = "auto"
+    if backend == "auto":
+        return "inprocess" if inprocess_available() else "subprocess"
+    return backend
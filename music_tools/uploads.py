@@ -0,0 +1,47 @@
+import hashlib
+import os
+import tempfile
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Uploads are written in slices of this size, so spooling never copies the whole file
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# ─── Upload Spooling ─────────────────────────────────────────────
+
+def upload_id(uploaded_file) -> str:
+    """Identify an uploaded file by Streamlit's per-upload ID"""
+    return getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+
+def create_upload_dir() -> str:
+    """Private temporary folder for one session's uploads"""
+    return tempfile.mkdtemp(prefix="music_tools_upload_")
+
+def spool_upload(uploaded_file, upload_dir: str) -> str:
+    """Write an upload to a unique path under upload_dir once and return that path"""
+    folder = os.path.join(upload_dir, hashlib.sha1(upload_id(uploaded_file).encode()).hexdigest()[:16])
+    path = os.path.join(folder, os.path.basename(uploaded_file.name))
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(folder, exist_ok=True)
+    # Write under a temporary name and rename, so a concurrent rerun never sees half a file
+    fd, partial = tempfile.mkstemp(prefix=".upload-", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(uploaded_file, "getbuffer"):
+                # Slices of the upload's own buffer: no intermediate copies
+                buffer = uploaded_file.getbuffer()
+                for start in range(0, len(buffer), SPOOL_CHUNK_SIZE):
+                    f.write(buffer[start:start + SPOOL_CHUNK_SIZE])
+                del buffer
+            else:
+                uploaded_file.seek(0)
+                for chunk in iter(lambda: uploaded_file.read(SPOOL_CHUNK_SIZE), b""):
+                    f.write(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return path
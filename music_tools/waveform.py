@@ -0,0 +1,123 @@
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from music_tools.cache import is_current, target_lock
+from music_tools.encoding import DecodeError, PcmReader
+from music_tools.metrics import span
+
+# ─── Configuration ─────────────────────────────────────────────
+
+PEAKS_DIR = ".peaks"
+
+# Finest level: one min/max pair per this many frames (~5.8 ms at 44.1 kHz)
+BASE_SAMPLES_PER_PEAK = 256
+# Each coarser level merges this many peaks of the previous one
+LEVEL_FACTOR = 4
+# Coarsening stops once a level has no more than this many peaks
+MIN_PEAKS = 256
+
+# Files are read this many frames at a time, so memory use is independent of length
+BLOCK_FRAMES = BASE_SAMPLES_PER_PEAK * 4096
+
+class WaveformError(Exception):
+    """Raised when peaks could not be extracted from a file"""
+
+# ─── Peak Data ─────────────────────────────────────────────
+
+@dataclass
+class Peaks:
+    """Min/max overview of a file at several resolutions
+
+    levels maps samples per peak to an (n, 2) int8 array of (min, max)
+    pairs scaled to ±127, finest first.
+    """
+    samplerate: int
+    frames: int
+    levels: dict[int, np.ndarray]
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.samplerate if self.samplerate else 0.0
+
+    def save(self, path: str):
+        # np.savez appends .npz to names that lack it, so the partial keeps the suffix
+        partial = path[:-len(".npz")] + ".partial.npz"
+        np.savez(partial, samplerate=self.samplerate, frames=self.frames,
+                 **{f"level_{spp}": peaks for spp, peaks in self.levels.items()})
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Peaks":
+        with np.load(path) as data:
+            levels = {int(name[len("level_"):]): data[name]
+                      for name in data.files if name.startswith("level_")}
+            return cls(int(data["samplerate"]), int(data["frames"]), dict(sorted(levels.items())))
+
+# ─── Extraction ─────────────────────────────────────────────
+
+def _quantize(lows: np.ndarray, highs: np.ndarray) -> np.ndarray:
+    pairs = np.stack([lows, highs], axis=1)
+    return np.clip(np.round(pairs * 127), -127, 127).astype(np.int8)
+
+def compute_peaks(path: str) -> Peaks:
+    """Stream a file block by block and reduce it to multi-resolution min/max peaks"""
+    reader = PcmReader(path)
+    spp = BASE_SAMPLES_PER_PEAK
+    lows, highs = [], []
+    frames = 0
+    carry = None
+    try:
+        for block in reader.blocks(BLOCK_FRAMES):
+            frames += len(block)
+            if carry is not None:
+                block = np.concatenate([carry, block])
+            whole = len(block) - len(block) % spp
+            if whole:
+                # Min and max over every frame and channel of each bucket at once
+                buckets = block[:whole].reshape(whole // spp, -1)
+                lows.append(buckets.min(axis=1))
+                highs.append(buckets.max(axis=1))
+            carry = block[whole:] if whole < len(block) else None
+    except DecodeError as e:
+        raise WaveformError(str(e)) from e
+    if carry is not None:
+        lows.append(np.array([carry.min()], dtype=np.float32))
+        highs.append(np.array([carry.max()], dtype=np.float32))
+
+    low = np.concatenate(lows) if lows else np.zeros(0, dtype=np.float32)
+    high = np.concatenate(highs) if highs else np.zeros(0, dtype=np.float32)
+    levels = {spp: _quantize(low, high)}
+    while len(low) > MIN_PEAKS:
+        pad = -len(low) % LEVEL_FACTOR
+        low = np.pad(low, (0, pad), mode="edge").reshape(-1, LEVEL_FACTOR).min(axis=1)
+        high = np.pad(high, (0, pad), mode="edge").reshape(-1, LEVEL_FACTOR).max(axis=1)
+        spp *= LEVEL_FACTOR
+        levels[spp] = _quantize(low, high)
+    return Peaks(reader.samplerate, frames, levels)
+
+# ─── Peak Files ─────────────────────────────────────────────
+
+def peaks_path(source_path: str) -> str:
+    """Where the peaks of a file are kept: <folder>/.peaks/<name>.npz"""
+    folder, file_name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(folder, PEAKS_DIR, f"{os.path.splitext(file_name)[0]}.npz")
+
+def get_peaks(source_path: str) -> Peaks:
+    """Peaks of a file, extracted and saved beside it the first time they are needed"""
+    target = peaks_path(source_path)
+    with target_lock(target):
+        if is_current(target, source_path):
+            try:
+                return Peaks.load(target)
+            except (OSError, ValueError, KeyError):
+                pass  # unreadable file: extract again
+        with span("peaks", file=os.path.basename(source_path)):
+            peaks = compute_peaks(source_path)
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            peaks.save(target)
+        except OSError:
+            pass  # read-only folder: the peaks are still usable this time
+        return peaks
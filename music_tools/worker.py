@@ -0,0 +1,188 @@
+"""
+Background job worker
+Runs queued download/separation jobs outside the Streamlit process.
+
+Usage: python -m music_tools.worker [--workers N] [--threads N] [--download-workers N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from music_tools.config import get_int_env
+from music_tools.cpu import get_separation_threads, limit_threads
+from music_tools.jobs import JOBS_DB_ENV, RUNNING, JobStore, run_job
+
+# ─── Configuration ─────────────────────────────────────────────
+
+# Separations are CPU/memory bound, downloads are network bound, so each
+# stage gets its own pool
+JOB_WORKERS_ENV = "MUSIC_TOOLS_JOB_WORKERS"
+DEFAULT_JOB_WORKERS = 2
+DOWNLOAD_WORKERS_ENV = "MUSIC_TOOLS_DOWNLOAD_WORKERS"
+DEFAULT_DOWNLOAD_WORKERS = 3
+
+POLL_INTERVAL = 0.5
+HEARTBEAT_STALE_AFTER = 10.0
+
+def get_job_workers() -> int:
+    """Get the configured number of separations run at the same time"""
+    return get_int_env(JOB_WORKERS_ENV, DEFAULT_JOB_WORKERS)
+
+def get_download_workers() -> int:
+    """Get the configured number of downloads run at the same time"""
+    return get_int_env(DOWNLOAD_WORKERS_ENV, DEFAULT_DOWNLOAD_WORKERS)
+
+# ─── Worker Process ─────────────────────────────────────────────
+
+def worker_loop(db_path: str, supervisor_pid: int, kinds: tuple = (), threads: Optional[int] = None):
+    """Claim and run jobs of the given kinds one at a time until killed or orphaned"""
+    # Own process group so cancelling a job also stops ffmpeg/demucs children
+    if hasattr(os, "setsid"):
+        os.setsid()
+    if threads:
+        # Before any job imports torch, so its thread pools start at this size
+        limit_threads(threads)
+    store = JobStore(db_path)
+    pid = os.getpid()
+    while os.getppid() == supervisor_pid:
+        job = store.claim_next(pid, kinds)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(store, job)
+
+def kill_worker(process: multiprocessing.Process):
+    """Stop a worker process and everything it spawned"""
+    if process.pid and hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    else:
+        process.kill()
+    process.join(timeout=5)
+
+# ─── Supervisor ─────────────────────────────────────────────
+
+class Supervisor:
+    """Keeps a fixed pool of worker processes per job kind alive and handles cancellation"""
+
+    def __init__(self, store: JobStore, pools: dict[str, int], threads: Optional[dict[str, int]] = None):
+        self.store = store
+        self.pools = pools
+        self.threads = threads or {}  # per-process thread cap by job kind
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: dict[int, multiprocessing.Process] = {}
+        self.process_kinds: dict[int, str] = {}
+
+    def spawn(self, kind: str):
+        process = self.context.Process(target=worker_loop,
+                                       args=(self.store.path, os.getpid(), (kind,), self.threads.get(kind)),
+                                       daemon=True)
+        process.start()
+        self.processes[process.pid] = process
+        self.process_kinds[process.pid] = kind
+
+    def pool_size(self, kind: str) -> int:
+        return sum(1 for k in self.process_kinds.values() if k == kind)
+
+    def recover_orphans(self):
+        """Requeue jobs left running by a previous supervisor that has gone away"""
+        for job in self.store.list_jobs((RUNNING,)):
+            if job.worker_pid not in self.processes:
+                self.store.requeue_or_fail(job.id, "Interrupted: the worker was restarted")
+
+    def reap_and_cancel(self):
+        running = {job.worker_pid: job for job in self.store.list_jobs((RUNNING,))}
+        for pid, process in list(self.processes.items()):
+            job = running.get(pid)
+            if job is not None and job.cancel_requested:
+                kill_worker(process)
+                self.store.mark_cancelled(job.id)
+            elif not process.is_alive():
+                if job is not None:
+                    self.store.requeue_or_fail(job.id, f"Worker exited unexpectedly (code {process.exitcode})")
+            else:
+                continue
+            del self.processes[pid]
+            del self.process_kinds[pid]
+
+    def run(self):
+        pid = os.getpid()
+        if not self.store.register_supervisor(pid, HEARTBEAT_STALE_AFTER):
+            print("Another worker supervisor is already running.")
+            return
+        self.recover_orphans()
+        try:
+            while True:
+                self.reap_and_cancel()
+                for kind, size in self.pools.items():
+                    while self.pool_size(kind) < size:
+                        self.spawn(kind)
+                self.store.register_supervisor(pid, HEARTBEAT_STALE_AFTER)
+                time.sleep(POLL_INTERVAL)
+        finally:
+            for process in list(self.processes.values()):
+                kill_worker(process)
+
+def worker_alive(store: JobStore) -> bool:
+    """Check whether a supervisor has reported in recently"""
+    heartbeat = store.supervisor_heartbeat()
+    return heartbeat is not None and time.time() - heartbeat < HEARTBEAT_STALE_AFTER
+
+_spawned: Optional[subprocess.Popen] = None
+_spawned_at = 0.0
+
+def ensure_worker_running(store: JobStore) -> Optional[subprocess.Popen]:
+    """Start a detached supervisor if none is alive"""
+    global _spawned, _spawned_at
+    if worker_alive(store):
+        return None
+    # Give a supervisor we just launched time to report its first heartbeat
+    if _spawned is not None and _spawned.poll() is None and time.time() - _spawned_at < HEARTBEAT_STALE_AFTER:
+        return _spawned
+    env = dict(os.environ)
+    env[JOBS_DB_ENV] = store.path
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, env.get("PYTHONPATH")]))
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    _spawned = subprocess.Popen(
+        [sys.executable, "-m", "music_tools.worker"],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **kwargs,
+    )
+    _spawned_at = time.time()
+    return _spawned
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background jobs for Music Tools Suite")
+    parser.add_argument("--workers", type=int, default=get_job_workers(),
+                        help="number of separations to run at the same time")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="threads per separation (default: MUSIC_TOOLS_SEPARATION_THREADS, "
+                             "or the CPU quota divided by --workers)")
+    parser.add_argument("--download-workers", type=int, default=get_download_workers(),
+                        help="number of downloads to run at the same time")
+    args = parser.parse_args()
+    # Turn SIGTERM into a normal exit so worker processes are cleaned up
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    pools = {"download": max(1, args.download_workers), "separate": max(1, args.workers)}
+    # Separations split the CPU quota between them instead of each sizing itself to the host
+    threads = {"separate": args.threads or get_separation_threads(pools["separate"])}
+    Supervisor(JobStore(), pools, threads).run()
+
+if __name__ == "__main__":
+    main()